@@ -0,0 +1,161 @@
+# async_engine.py
+# 프로세스 전역에 하나뿐인 asyncio 이벤트 루프(전용 스레드)에서 Agent.run()을 await 하는 실행 엔진.
+# UI 핸들러는 작업을 제출하고 JobHandle을 받아 완료를 기다리거나(비동기) 폴링한다.
+# run_sync()처럼 실행마다 스레드/이벤트 루프를 새로 만들지 않으므로
+# 한 서버 프로세스에서 여러 세션을 동시에 처리할 수 있다.
+import asyncio
+import threading
+import uuid
+import time
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+# ====== 작업 핸들 ======
+class JobHandle:
+    """제출된 작업의 상태/결과/진행 메시지 조회용 핸들"""
+
+    def __init__(self, job_id: str, name: str = ""):
+        self.job_id = job_id
+        self.name = name
+        self.submitted_at = time.time()
+        self.future: Optional[Future] = None
+        self._progress: List[str] = []
+        self._progress_lock = threading.Lock()
+
+    def report(self, message: str) -> None:
+        """작업 쪽에서 진행 메시지 기록 (progress_callback 대용)"""
+        with self._progress_lock:
+            self._progress.append(message)
+
+    def drain_progress(self) -> List[str]:
+        """아직 읽지 않은 진행 메시지를 꺼내 반환"""
+        with self._progress_lock:
+            messages, self._progress = self._progress, []
+        return messages
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def status(self) -> str:
+        if self.future is None:
+            return "pending"
+        if self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            return "running"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """완료까지 블로킹 대기 (동기 코드용)"""
+        return self.future.result(timeout)
+
+    async def wait_async(self) -> Any:
+        """다른 이벤트 루프(예: Gradio async 핸들러)에서 스레드 점유 없이 대기"""
+        return await asyncio.wrap_future(self.future)
+
+    def cancel(self) -> bool:
+        return self.future.cancel() if self.future is not None else False
+
+
+# ====== 실행 엔진 ======
+class ExecutionEngine:
+    """전용 스레드의 장수명 이벤트 루프에서 코루틴 작업을 실행"""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="agent-engine", daemon=True)
+        self._jobs: Dict[str, JobHandle] = {}
+        self._jobs_lock = threading.Lock()
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coro_fn: Callable[..., Any], *args, progress: bool = False, name: str = "", **kwargs) -> JobHandle:
+        """
+        코루틴 함수를 엔진 루프에 제출.
+        progress=True 이면 progress_callback=handle.report 를 넘겨 진행 메시지를 핸들에 쌓는다.
+        """
+        handle = JobHandle(uuid.uuid4().hex[:12], name or getattr(coro_fn, "__name__", ""))
+        if progress:
+            kwargs["progress_callback"] = handle.report
+        handle.future = asyncio.run_coroutine_threadsafe(coro_fn(*args, **kwargs), self._loop)
+        with self._jobs_lock:
+            self._jobs[handle.job_id] = handle
+            self._prune_locked()
+        return handle
+
+    def run(self, coro_fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """동기 호출부 호환: 제출 후 완료까지 대기"""
+        return self.submit(coro_fn, *args, **kwargs).result()
+
+    async def stream(self, agen_fn: Callable[..., AsyncIterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        비동기 제너레이터를 엔진 루프에서 실행하고, 항목을 호출 측 루프(예: Gradio)로 전달.
+        호출 측이 중간에 소비를 멈추면 엔진 쪽 작업도 취소한다.
+        """
+        consumer = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for item in agen_fn(*args, **kwargs):
+                    consumer.call_soon_threadsafe(queue.put_nowait, (False, item))
+            except Exception as e:
+                consumer.call_soon_threadsafe(queue.put_nowait, (True, e))
+            finally:
+                consumer.call_soon_threadsafe(queue.put_nowait, (True, None))
+
+        handle = self.submit(pump, name=getattr(agen_fn, "__name__", ""))
+        try:
+            while True:
+                end, item = await queue.get()
+                if end:
+                    if item is not None:
+                        raise item
+                    return
+                yield item
+        finally:
+            if not handle.done():
+                handle.cancel()
+
+    def get_job(self, job_id: Optional[str]) -> Optional[JobHandle]:
+        if not job_id:
+            return None
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def active_jobs(self) -> int:
+        with self._jobs_lock:
+            return sum(1 for h in self._jobs.values() if not h.done())
+
+    def _prune_locked(self, keep: int = 256) -> None:
+        # 완료된 오래된 핸들만 정리 (실행 중인 작업은 유지)
+        if len(self._jobs) <= keep:
+            return
+        finished = sorted((h for h in self._jobs.values() if h.done()), key=lambda h: h.submitted_at)
+        for h in finished[: len(self._jobs) - keep]:
+            self._jobs.pop(h.job_id, None)
+
+
+_engine: Optional[ExecutionEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ExecutionEngine:
+    """프로세스 전역 엔진 (최초 호출 시 루프 스레드 시작)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ExecutionEngine()
+        return _engine
+
+
+def get_job(job_id: Optional[str]) -> Optional[JobHandle]:
+    return get_engine().get_job(job_id)
@@ -0,0 +1,296 @@
+# auth_state.py
+# 로그인된 브라우저 storage state(쿠키 + 로컬 스토리지)를 계정 × 도메인 그룹별로 암호화해 보관하고
+# 다음 실행의 새 컨텍스트에 주입해 로그인(MFA) 스텝을 건너뛴다.
+# - auth_state/<계정>__<그룹>.state : Fernet 암호화 (cryptography 필요, 없으면 저장/주입하지 않음)
+# - 키: AUTH_STATE_KEY(urlsafe base64 32바이트, 필수). 키를 디스크에 만들지 않으며 없으면 저장/주입하지 않음
+# - 계정: make_browser(account=...)로 명시한 사용자 (배치 --account). 계정이 없는 세션(UI)은 저장/주입하지 않음
+# - 그룹: make_browser()의 허용 도메인 집합 (같은 SSO를 쓰는 Outlook/Teams/SharePoint 스크립트가 공유)
+# - 스텝의 auth: 블록 → 저장된 세션이 있으면 probe URL로 이동해 로그인 화면으로 튕기지 않는지 확인 후 스텝 생략
+# - 로그인 스텝 이후 스텝이 끝날 때마다(최소 AUTH_STATE_REFRESH_S 간격) 현재 상태를 다시 저장
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except Exception:
+    Fernet = None
+    InvalidToken = Exception
+
+from browser_support import step_page, restore_storage_state
+
+# ====== 설정 및 상수 ======
+AUTH_STATE_ENABLED = os.environ.get("AUTH_STATE", "1").lower() not in ("0", "false", "off")
+AUTH_STATE_DIR = Path(os.environ.get("AUTH_STATE_DIR", "./auth_state"))
+AUTH_STATE_MAX_AGE_S = float(os.environ.get("AUTH_STATE_MAX_AGE_S", str(7 * 24 * 3600)))
+AUTH_STATE_REFRESH_S = float(os.environ.get("AUTH_STATE_REFRESH_S", "600"))
+AUTH_PROBE_TIMEOUT_S = float(os.environ.get("AUTH_PROBE_TIMEOUT_S", "10"))
+# 이 문자열이 URL에 있으면 로그인 화면으로 본다 (소문자 비교)
+LOGIN_URL_MARKERS = tuple(
+    m.strip().lower() for m in os.environ.get(
+        "AUTH_LOGIN_URL_MARKERS", "login.microsoftonline.com,login.live.com,/login,/signin,/oauth2/"
+    ).split(",") if m.strip()
+)
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+_lock = threading.Lock()
+_fernet = None
+_bindings: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()   # browser → (계정, 그룹)
+_injected: "weakref.WeakSet" = weakref.WeakSet()                       # 상태를 주입한 Playwright 컨텍스트
+_last_saved: Dict[Tuple[str, str], float] = {}
+_stats: Dict[str, Any] = {
+    "saves": 0,
+    "injects": 0,
+    "probes": 0,
+    "probe_live": 0,       # 저장된 세션이 유효해 로그인 스텝 생략
+    "probe_expired": 0,
+    "probe_s_total": 0.0,
+    "probe_errors": 0,     # 네트워크 오류 등으로 확인하지 못함 (저장본 유지)
+    "decrypt_errors": 0,
+}
+
+
+def can_encrypt() -> bool:
+    """암호화 키(AUTH_STATE_KEY)와 cryptography 가 있는지 (체크포인트 storage state 암호화도 같은 키)"""
+    return Fernet is not None and bool(os.environ.get("AUTH_STATE_KEY"))
+
+
+def available() -> bool:
+    return AUTH_STATE_ENABLED and can_encrypt()
+
+
+def _cipher():
+    """Fernet 인스턴스 (키: AUTH_STATE_KEY, 잘못된 키면 ValueError)"""
+    global _fernet
+    with _lock:
+        if _fernet is None:
+            _fernet = Fernet(os.environ["AUTH_STATE_KEY"].encode("ascii"))
+        return _fernet
+
+
+def encrypt_json(data: Any) -> Optional[bytes]:
+    """JSON 직렬화 후 암호화 (키가 없으면 None → 호출부는 저장하지 않음)"""
+    if not can_encrypt():
+        return None
+    try:
+        cipher = _cipher()
+    except ValueError:
+        return None
+    return cipher.encrypt(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+
+def decrypt_json(token: bytes) -> Optional[Any]:
+    """encrypt_json 의 역 (키가 없거나 다르거나 손상되면 None)"""
+    if not can_encrypt():
+        return None
+    try:
+        return json.loads(_cipher().decrypt(token).decode("utf-8"))
+    except (InvalidToken, ValueError):
+        with _lock:
+            _stats["decrypt_errors"] += 1
+        return None
+
+
+def write_private(path: Path, data: bytes) -> None:
+    """권한 0600 임시 파일에 쓴 뒤 원자적 교체"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def domain_group(domains: List[str]) -> str:
+    """허용 도메인 집합 → 그룹 이름 (순서/www 무관)"""
+    names = sorted({d.lower().removeprefix("www.") for d in domains or []})
+    return "domains-" + hashlib.sha1(",".join(names).encode("utf-8")).hexdigest()[:10]
+
+
+def _path(account: str, group: str) -> Path:
+    return AUTH_STATE_DIR / f"{_SAFE_RE.sub('_', account)}__{_SAFE_RE.sub('_', group)}.state"
+
+
+def is_login_url(url: str) -> bool:
+    lowered = (url or "").lower()
+    return any(m in lowered for m in LOGIN_URL_MARKERS)
+
+
+# ====== 저장소 ======
+def bind(browser, account: Optional[str], domains: List[str]) -> None:
+    """
+    make_browser()에서 호출: 이 브라우저 세션의 계정/도메인 그룹 기록 (저장소를 안 써도 기록 → 스텝 캐시 키에 사용).
+    계정이 없으면 기록하지 않는다 → 저장된 로그인 세션을 주입/갱신하지 않음 (다른 사용자의 로그인을 넘겨받지 않도록)
+    """
+    if browser is None or not account:
+        return
+    try:
+        _bindings[browser] = (account, domain_group(domains))
+    except TypeError:
+        pass
+
+
+def binding(browser) -> Optional[Tuple[str, str]]:
+    try:
+        return _bindings.get(browser)
+    except TypeError:
+        return None
+
+
+async def adopt(src, dst) -> None:
+    """
+    표시 모드 전환 등으로 살아 있는 세션을 새 브라우저로 옮긴 뒤 호출: 계정/그룹 연결을 옮기고
+    새 컨텍스트는 이미 최신 상태이므로 저장된(더 오래된) 세션을 다시 주입하지 않게 한다.
+    """
+    bound = binding(src)
+    if bound is None or dst is None:
+        return
+    try:
+        _bindings[dst] = bound
+        context = getattr(await step_page(dst), "context", None)
+        if context is not None:
+            _injected.add(context)
+    except Exception:
+        pass
+
+
+def load(account: str, group: str) -> Optional[Dict[str, Any]]:
+    """복호화한 {saved_at, url, storage_state} (없거나 오래됐거나 키가 다르면 None)"""
+    if not available():
+        return None
+    path = _path(account, group)
+    if not path.exists():
+        return None
+    try:
+        data = decrypt_json(path.read_bytes())
+    except OSError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if time.time() - float(data.get("saved_at", 0)) > AUTH_STATE_MAX_AGE_S:
+        return None
+    return data
+
+
+def save(account: str, group: str, storage_state: Dict[str, Any], url: str = "") -> bool:
+    """로그인된 storage state 암호화 저장 (원자적 교체, 권한 0600)"""
+    if not available() or not (storage_state or {}).get("cookies"):
+        return False
+    token = encrypt_json({"saved_at": time.time(), "url": url, "storage_state": storage_state})
+    if token is None:
+        return False
+    write_private(_path(account, group), token)
+    with _lock:
+        _last_saved[(account, group)] = time.time()
+        _stats["saves"] += 1
+    return True
+
+
+def discard(account: str, group: str) -> None:
+    """로그아웃이 확인된 세션 삭제 → 다음 로그인 후 새로 저장"""
+    with _lock:
+        _last_saved.pop((account, group), None)
+    try:
+        _path(account, group).unlink()
+    except FileNotFoundError:
+        pass
+
+
+# ====== 주입 / 확인 / 갱신 ======
+async def inject(browser) -> bool:
+    """저장된 세션을 이 브라우저의 세션 컨텍스트에 주입 (컨텍스트당 1회) → 주입했는지"""
+    bound = binding(browser)
+    if bound is None:
+        return False
+    data = load(*bound)
+    if data is None:
+        return False
+    page = await step_page(browser)
+    context = getattr(page, "context", None)
+    if context is None:
+        return False
+    try:
+        if context in _injected:
+            return True
+    except TypeError:
+        pass
+    try:
+        await restore_storage_state(context, data.get("storage_state"))
+    except Exception:
+        return False
+    try:
+        _injected.add(context)
+    except TypeError:
+        pass
+    with _lock:
+        _stats["injects"] += 1
+    return True
+
+
+async def probe(rule, browser) -> Optional[float]:
+    """
+    저장된 세션으로 rule.probe 에 접속해 로그인 화면으로 가지 않으면 확인에 걸린 초, 아니면 None.
+    저장된 세션이 없으면 확인하지 않는다 (None).
+    저장본은 로그인 화면으로 튕긴 경우(로그아웃 확인)에만 지운다. 접속 오류/타임아웃이나
+    expect_url 불일치는 세션 만료의 증거가 아니므로 로그인 스텝만 실행하고 저장본은 유지한다.
+    """
+    bound = binding(browser)
+    if bound is None or not await inject(browser):
+        return None
+    started = time.perf_counter()
+    final = ""
+    try:
+        page = await step_page(browser)
+        await page.goto(rule.probe, wait_until="domcontentloaded", timeout=AUTH_PROBE_TIMEOUT_S * 1000)
+        try:
+            # 스크립트 리다이렉트(SSO)까지 잠깐 기다림
+            await page.wait_for_load_state("load", timeout=AUTH_PROBE_TIMEOUT_S * 1000)
+        except Exception:
+            pass
+        final = page.url
+    except Exception:
+        final = ""
+    elapsed = time.perf_counter() - started
+    expired = bool(final) and is_login_url(final)
+    live = bool(final) and not expired and (not rule.expect_url or rule.expect_url.lower() in final.lower())
+    with _lock:
+        _stats["probes"] += 1
+        _stats["probe_s_total"] += elapsed
+        _stats["probe_live" if live else "probe_expired" if expired else "probe_errors"] += 1
+    if expired:
+        discard(*bound)
+    return elapsed if live else None
+
+
+def maybe_save(browser, storage_state: Optional[Dict[str, Any]], url: str) -> bool:
+    """로그인 스텝 이후 스텝 완료 시: 로그인 화면이 아니고 마지막 저장 후 REFRESH_S가 지났으면 저장"""
+    bound = binding(browser)
+    if bound is None or not storage_state or not url or is_login_url(url):
+        return False
+    with _lock:
+        recent = time.time() - _last_saved.get(bound, 0.0) < AUTH_STATE_REFRESH_S
+    if recent:
+        return False
+    try:
+        return save(*bound, storage_state, url)
+    except OSError:
+        return False
+
+
+def auth_state_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    stats["available"] = available()
+    stats["stored"] = len(list(AUTH_STATE_DIR.glob("*.state"))) if AUTH_STATE_DIR.exists() else 0
+    stats["probe_s_avg"] = round(stats["probe_s_total"] / stats["probes"], 3) if stats["probes"] else 0.0
+    stats["probe_s_total"] = round(stats["probe_s_total"], 3)
+    return stats
@@ -0,0 +1,263 @@
+# batch_runner.py
+# 헤드리스 배치 실행 CLI.
+# 하나의 YAML 스크립트를 여러 프롬프트(파일/값) × 계정에 대해 무인 실행한다.
+# 작업은 프로세스 풀로 분산되며, 각 워커 프로세스는 자신의 브라우저와 LLM 클라이언트를 가진다.
+# 항목별 결과/타이밍은 출력 디렉토리에 JSON으로, 전체 요약은 summary.json / summary.md 로 기록된다.
+#
+# 예)
+#   python batch_runner.py example_scripts/outlook_automation.yaml \
+#       --prompt-file prompts/daily_email_summary.txt prompts/meeting_schedule.txt \
+#       --account alice=cookies/alice.json --account bob=cookies/bob.json \
+#       --workers 4 --out batch_results/daily
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# ====== 설정 및 상수 ======
+DEFAULT_OUT_DIR = Path("./batch_results")
+
+# 워커 프로세스 전역 상태 (initializer에서 채움)
+_worker: Dict[str, Any] = {}
+
+
+# ====== 워커 ======
+def _init_worker(headless: bool) -> None:
+    """워커 프로세스 초기화: 이벤트 루프 1개 + LLM 클라이언트 1개, 브라우저는 계정별로 지연 생성"""
+    from script_runner import make_llm
+
+    _worker["loop"] = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker["loop"])
+    _worker["llm"] = make_llm()
+    _worker["browsers"] = {}
+    _worker["headless"] = headless
+
+
+async def _browser_for(account: str, cookies_file: Optional[str]):
+    from script_runner import make_browser
+    import browser_pool
+
+    browsers = _worker["browsers"]
+    if account in browsers:
+        browsers[account] = browsers.pop(account)  # 최근 사용 순서 갱신
+        return browsers[account]
+    # 브라우저 풀 자리를 다 쓰고 있으면 가장 오래 쓰지 않은 계정의 브라우저를 반납 (다시 오면 쿠키 파일로 복원)
+    while browsers and len(browsers) >= browser_pool.capacity():
+        oldest = next(iter(browsers))
+        old = browsers.pop(oldest)
+        if old is not None:
+            await old.close()
+    # 무인 실행: 사람 액션 대기에서도 창 표시로 인계하지 않음
+    browsers[account] = make_browser(cookies_file=cookies_file, headless=_worker["headless"], account=account,
+                                     handoff=False)
+    return browsers[account]
+
+
+async def _run_item_async(item: Dict[str, Any]) -> Dict[str, Any]:
+    from script_runner import iter_until_wait
+    from run_log import RunLog
+
+    out_dir = Path(item["out_dir"])
+    started = time.time()
+    result: Dict[str, Any] = {
+        "item_id": item["item_id"],
+        "session_id": item["session_id"],
+        "prompt": item["prompt_name"],
+        "account": item["account"],
+        "worker_pid": os.getpid(),
+        "started_at": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+    }
+    log = RunLog(session_id=item["session_id"], logs_dir=out_dir / "logs")
+    steps: List[Dict[str, Any]] = []
+    final = None
+    try:
+        browser = await _browser_for(item["account"], item.get("cookies_file"))
+        last_seq, last_t = log.seq, time.time()
+        async for final in iter_until_wait(item["script_text"], 0, log, False, _worker["llm"], browser, item["prompt_text"]):
+            if log.seq == last_seq:
+                continue
+            # 새 레코드 = 스텝(또는 병렬 묶음) 완료 → 경과 시간 기록
+            now = time.time()
+            for rec in log.tail(log.seq - last_seq):
+                steps.append({
+                    "step": rec.get("step"),
+                    "name": rec.get("name"),
+                    "kind": rec.get("kind"),
+                    "elapsed_s": round(now - last_t, 2),
+                    "output": rec.get("text", ""),
+                })
+            last_seq, last_t = log.seq, now
+
+        idx, _, waiting, msg = final[0], final[1], final[2], final[3]
+        if waiting:
+            # 무인 실행에서는 사람 액션이 필요한 지점에서 멈추고 해당 항목을 보류 처리
+            result.update(status="needs_user", message=msg)
+        elif any(s["kind"] == "error" for s in steps):
+            result.update(status="error", message=next(s["output"] for s in steps if s["kind"] == "error"))
+        else:
+            result.update(status="done", message="")
+        result["next_step"] = idx
+    except Exception as e:
+        result.update(status="error", message=f"{type(e).__name__}: {e}")
+
+    result["elapsed_s"] = round(time.time() - started, 2)
+    result["steps"] = steps
+    result["log_path"] = str(log.path)
+
+    with open(out_dir / f"{item['item_id']}.json", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return result
+
+
+def _run_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return _worker["loop"].run_until_complete(_run_item_async(item))
+
+
+# ====== 입력 구성 ======
+def _parse_accounts(values: List[str]) -> List[Dict[str, Optional[str]]]:
+    """--account NAME[=COOKIES_FILE]"""
+    if not values:
+        return [{"name": "default", "cookies_file": None}]
+    accounts = []
+    for v in values:
+        name, _, cookies = v.partition("=")
+        accounts.append({"name": name.strip() or "default", "cookies_file": cookies.strip() or None})
+    return accounts
+
+
+def _collect_prompts(files: List[str], values: List[str]) -> List[Dict[str, str]]:
+    prompts = []
+    for path in files or []:
+        p = Path(path)
+        with open(p, "r", encoding="utf-8") as f:
+            prompts.append({"name": p.stem, "text": f.read()})
+    for i, text in enumerate(values or [], 1):
+        prompts.append({"name": f"prompt_{i}", "text": text})
+    return prompts or [{"name": "no_prompt", "text": ""}]
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_-]", "_", name)[:40] or "item"
+
+
+def build_items(script_text: str, prompts, accounts, out_dir: Path, batch_id: str) -> List[Dict[str, Any]]:
+    """
+    항목 목록. item_id 는 배치 안에서만 고유(결과 파일 이름)하므로 실행 로그/체크포인트의 세션 ID 에는
+    배치 실행 ID 를 붙인다 (배치를 다시 돌려도 이전 배치의 체크포인트를 이어받거나 덮어쓰지 않음).
+    """
+    items = []
+    for account in accounts:
+        for prompt in prompts:
+            item_id = f"{len(items)+1:04d}_{_safe(account['name'])}_{_safe(prompt['name'])}"
+            items.append({
+                "item_id": item_id,
+                "session_id": f"batch_{batch_id}_{item_id}",
+                "script_text": script_text,
+                "prompt_name": prompt["name"],
+                "prompt_text": prompt["text"],
+                "account": account["name"],
+                "cookies_file": account["cookies_file"],
+                "out_dir": str(out_dir),
+            })
+    return items
+
+
+def write_summary(out_dir: Path, results: List[Dict[str, Any]], wall_s: float, workers: int) -> None:
+    results = sorted(results, key=lambda r: r["item_id"])
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    summary = {
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "workers": workers,
+        "items": len(results),
+        "counts": counts,
+        "wall_s": round(wall_s, 2),
+        "sum_item_s": round(sum(r.get("elapsed_s", 0) for r in results), 2),
+        "results": [{k: r.get(k) for k in ("item_id", "session_id", "prompt", "account", "status", "elapsed_s", "message")} for r in results],
+    }
+    with open(out_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    lines = [
+        f"# 배치 실행 요약 ({summary['finished_at']})",
+        "",
+        f"- 항목: {len(results)}개 / 워커: {workers}개 / 전체 소요: {summary['wall_s']}초 (항목 합계 {summary['sum_item_s']}초)",
+        "- 상태: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())),
+        "",
+        "| 항목 | 프롬프트 | 계정 | 상태 | 소요(초) | 메시지 |",
+        "|---|---|---|---|---|---|",
+    ]
+    for r in results:
+        msg = str(r.get("message") or "").replace("\n", " ").replace("|", "/")[:80]
+        lines.append(f"| {r['item_id']} | {r['prompt']} | {r['account']} | {r['status']} | {r.get('elapsed_s', '')} | {msg} |")
+    with open(out_dir / "summary.md", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+# ====== CLI ======
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="YAML 스크립트 헤드리스 배치 실행")
+    parser.add_argument("script", help="YAML 스크립트 파일")
+    parser.add_argument("--prompt-file", nargs="+", action="extend", default=[], help="프롬프트 파일 ({prompt} 치환)")
+    parser.add_argument("--prompt", action="append", default=[], help="프롬프트 값 (여러 번 지정 가능)")
+    parser.add_argument("--account", action="append", default=[], help="계정 NAME[=쿠키파일] (여러 번 지정 가능)")
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) // 2, 1), help="워커 프로세스 수")
+    parser.add_argument("--out", default=None, help="출력 디렉토리 (기본: batch_results/<시각>)")
+    parser.add_argument("--headed", action="store_true", help="브라우저 창 표시 (기본: 헤드리스)")
+    args = parser.parse_args(argv)
+
+    from script_plan import get_plan
+
+    with open(args.script, "r", encoding="utf-8") as f:
+        script_text = f.read()
+    try:
+        get_plan(script_text)  # 워커에 보내기 전에 검증
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    out_dir = Path(args.out) if args.out else DEFAULT_OUT_DIR / datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    from run_log import new_session_id
+    items = build_items(script_text, _collect_prompts(args.prompt_file, args.prompt), _parse_accounts(args.account),
+                        out_dir, new_session_id())
+    workers = max(1, min(args.workers, len(items)))
+    print(f"▶ {len(items)}개 항목을 워커 {workers}개로 실행합니다 → {out_dir}")
+
+    # 워커가 뜨는 동안 모델을 미리 로드 (워커들은 같은 Ollama 서버를 공유)
+    from llm_pool import start_warmup
+    start_warmup()
+
+    started = time.time()
+    results: List[Dict[str, Any]] = []
+    # spawn: 워커마다 깨끗한 프로세스에서 브라우저/LLM 생성 (Windows와 동일 동작)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(not args.headed,)) as pool:
+        futures = {pool.submit(_run_item, item): item for item in items}
+        for fut in as_completed(futures):
+            item = futures[fut]
+            try:
+                r = fut.result()
+            except Exception as e:
+                r = {"item_id": item["item_id"], "session_id": item["session_id"], "prompt": item["prompt_name"], "account": item["account"],
+                     "status": "error", "message": f"워커 오류: {e}", "elapsed_s": 0}
+            results.append(r)
+            print(f"  [{len(results)}/{len(items)}] {r['item_id']}: {r['status']} ({r.get('elapsed_s', 0)}초)")
+
+    write_summary(out_dir, results, time.time() - started, workers)
+    print(f"✅ 완료: {out_dir / 'summary.md'}")
+    return 0 if all(r["status"] == "done" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+# browser_pool.py
+# 세션/작업 간에 공유하는 웜(warm) 브라우저 풀.
+# - make_browser()는 Chromium을 새로 띄우지 않고 BrowserLease(대여)를 돌려준다
+# - 대여는 처음 비동기로 쓰일 때 풀의 BrowserSession(Chromium 1개) 하나를 독점한다
+#   (browser_use 0.8 의 BrowserSession 은 브라우저 전체 탭에 붙으므로 세션끼리 한 Chromium 을 나눠 쓰지 않는다)
+# - 병렬 스텝/foreach 항목 전용 세션(new_context)도 풀 자리를 하나씩 쓴다
+# - 반납 시 세션을 초기화(쿠키/스토리지 삭제, 탭 정리, 라우트 해제)해 브라우저를 다음 대여에 다시 쓴다.
+#   초기화에 실패한 브라우저는 닫는다
+# - 브라우저 수 상한(BROWSER_POOL_SIZE)이 가득 차면 자리가 날 때까지 대기(BROWSER_POOL_WAIT_S),
+#   대기 시간은 browser_pool_stats()에 집계
+# 브라우저 세션은 띄운 이벤트 루프에 묶이므로 같은 루프의 대여에만 배정한다.
+import os
+import time
+import asyncio
+import itertools
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+from browser_support import BrowserHandle, launch_session, stop_session, reset_session
+
+# ====== 설정 및 상수 ======
+POOL_ENABLED = os.environ.get("BROWSER_POOL", "1").lower() not in ("0", "false", "off")  # 끄면 세션마다 새 브라우저
+POOL_SIZE = max(1, int(os.environ.get("BROWSER_POOL_SIZE", "4")))                       # 프로세스당 브라우저 수 상한
+POOL_WARM = max(0, int(os.environ.get("BROWSER_POOL_WARM", "1")))                       # 미리 띄워둘 브라우저 수
+WAIT_S = float(os.environ.get("BROWSER_POOL_WAIT_S", "60"))                             # 자리 대기 상한
+POLL_S = 0.25
+
+
+class _Slot:
+    """풀의 브라우저 1개 (BrowserSession)"""
+
+    def __init__(self, settings: Dict[str, Any], loop):
+        self.settings = dict(settings)
+        self.headless = bool(settings.get("headless"))
+        self.loop = loop
+        self.session = None
+        self.lease: Optional[int] = None
+        self.started = False
+        self.created_at = time.time()
+        self.pids: List[int] = []     # 이 브라우저의 Chromium 최상위 프로세스 (메모리 집계용)
+        self.ready: Optional[asyncio.Event] = None
+
+    def rss_mb(self) -> Optional[float]:
+        if psutil is None or not self.pids:
+            return None
+        total = 0
+        for pid in self.pids:
+            try:
+                proc = psutil.Process(pid)
+                total += proc.memory_info().rss
+                for child in proc.children(recursive=True):
+                    try:
+                        total += child.memory_info().rss
+                    except psutil.Error:
+                        pass
+            except psutil.Error:
+                continue
+        return round(total / (1024 * 1024), 1)
+
+
+_lock = threading.Lock()
+_slots: List[_Slot] = []
+_stats: Dict[str, Any] = {
+    "acquires": 0,
+    "waits": 0,          # 자리가 없어 기다린 대여 수
+    "wait_s_total": 0.0,
+    "wait_s_max": 0.0,
+    "timeouts": 0,
+    "launches": 0,
+    "retired": 0,        # 상한 때문에 닫은 유휴 브라우저
+    "recycles": 0,       # 초기화 후 풀에 되돌린 반납
+    "reset_failures": 0, # 초기화에 실패해 닫은 브라우저
+}
+_waiting = 0
+
+
+# ====== 프로세스 추적 (psutil 있을 때만) ======
+def _chromium_pids() -> Set[int]:
+    if psutil is None:
+        return set()
+    try:
+        return {p.pid for p in psutil.Process().children(recursive=True)
+                if "chrom" in (p.name() or "").lower()}
+    except psutil.Error:
+        return set()
+
+
+def _roots(pids: Set[int]) -> List[int]:
+    roots = []
+    for pid in pids:
+        try:
+            if psutil.Process(pid).ppid() not in pids:
+                roots.append(pid)
+        except psutil.Error:
+            continue
+    return roots
+
+
+# ====== 배정 ======
+def _pick_locked(headless: bool, loop) -> Optional[_Slot]:
+    """같은 모드/루프의 유휴 브라우저 (이미 기동된 것 우선)"""
+    fits = [s for s in _slots if s.headless == headless and s.loop is loop and s.lease is None]
+    return max(fits, key=lambda s: s.started) if fits else None
+
+
+def _retire_idle_locked(headless: bool, loop) -> Optional[_Slot]:
+    """상한에 걸렸을 때 다른 모드/루프의 유휴 브라우저 하나를 풀에서 뺀다 (닫기는 호출부가)"""
+    for s in _slots:
+        if s.lease is None and (s.headless != headless or s.loop is not loop):
+            _slots.remove(s)
+            _stats["retired"] += 1
+            return s
+    return None
+
+
+async def _close_slot(slot: _Slot) -> None:
+    if slot.session is None:
+        return
+    try:
+        if slot.loop is asyncio.get_running_loop():
+            await stop_session(slot.session)
+        elif slot.loop.is_running():
+            asyncio.run_coroutine_threadsafe(stop_session(slot.session), slot.loop)
+    except Exception:
+        pass
+
+
+async def _start(slot: _Slot) -> None:
+    """브라우저 기동 (같은 슬롯을 동시에 기다리는 대여는 ready 이벤트로 합류)"""
+    if slot.started:
+        return
+    if slot.ready is not None:
+        await slot.ready.wait()
+        if not slot.started:
+            raise RuntimeError("풀 브라우저 기동에 실패했습니다.")
+        return
+    slot.ready = asyncio.Event()
+    before = _chromium_pids()
+    try:
+        slot.session = await launch_session(slot.settings)
+        slot.pids = _roots(_chromium_pids() - before)
+        slot.started = True
+    finally:
+        slot.ready.set()
+        slot.ready = None
+
+
+async def _acquire(lease_id: int, settings: Dict[str, Any]) -> _Slot:
+    global _waiting
+    loop = asyncio.get_running_loop()
+    headless = bool(settings.get("headless"))
+    started = time.perf_counter()
+    waited = False
+    while True:
+        retired = None
+        with _lock:
+            slot = _pick_locked(headless, loop)
+            if slot is None:
+                if len(_slots) >= POOL_SIZE:
+                    retired = _retire_idle_locked(headless, loop)
+                if len(_slots) < POOL_SIZE:
+                    slot = _Slot(settings, loop)
+                    _slots.append(slot)
+                    _stats["launches"] += 1
+            if slot is not None:
+                slot.lease = lease_id
+                _stats["acquires"] += 1
+                if waited:
+                    _waiting -= 1
+                    elapsed = time.perf_counter() - started
+                    _stats["wait_s_total"] += elapsed
+                    _stats["wait_s_max"] = max(_stats["wait_s_max"], elapsed)
+            elif not waited:
+                waited = True
+                _waiting += 1
+                _stats["waits"] += 1
+        if retired is not None:
+            await _close_slot(retired)
+        if slot is not None:
+            try:
+                await _start(slot)
+            except Exception:
+                with _lock:
+                    slot.lease = None
+                    if slot in _slots and not slot.started:
+                        _slots.remove(slot)
+                raise
+            # 세션별 설정(허용 도메인)은 대여마다 적용
+            slot.session.browser_profile.allowed_domains = settings.get("allowed_domains")
+            return slot
+        if time.perf_counter() - started >= WAIT_S:
+            with _lock:
+                _waiting -= 1
+                _stats["timeouts"] += 1
+            raise RuntimeError(
+                f"브라우저 풀이 가득 찼습니다 (브라우저 {POOL_SIZE}개). "
+                f"{WAIT_S:.0f}초 안에 자리가 나지 않았습니다."
+            )
+        await asyncio.sleep(POLL_S)
+
+
+async def _release(slot: _Slot) -> None:
+    """대여 반납: 세션을 초기화해 자리를 비운다 (다른 루프거나 초기화 실패면 브라우저를 닫음)"""
+    reused = slot.loop is asyncio.get_running_loop() and await reset_session(slot.session)
+    with _lock:
+        if reused and slot in _slots:
+            slot.lease = None
+            _stats["recycles"] += 1
+        else:
+            if slot in _slots:
+                _slots.remove(slot)
+            _stats["reset_failures"] += 1
+    if not reused:
+        await _close_slot(slot)
+
+
+# ====== 대여 ======
+class BrowserLease(BrowserHandle):
+    """
+    BrowserHandle 자리에 넘기는 대여 객체: 세션 공유/전용 BrowserSession 을 새로 띄우지 않고 풀에서 배정받는다.
+    settings 는 세션 전용(허용 도메인/표시 모드) 프로필 설정.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, settings: Dict[str, Any], state: Optional[Dict[str, Any]] = None):
+        super().__init__(settings, state)
+        self._id = next(BrowserLease._ids)
+        self._slots: List[_Slot] = []
+
+    async def _open(self):
+        slot = await _acquire(self._id, self.settings)
+        self._slots.append(slot)
+        return slot.session
+
+    async def _close(self, session) -> None:
+        slot = next((s for s in self._slots if s.session is session), None)
+        if slot is None:
+            return
+        self._slots.remove(slot)
+        await _release(slot)
+
+    async def recycle(self) -> None:
+        """세션을 반납 (이후 다시 쓰면 새로 배정)"""
+        await self.close()
+
+
+def capacity() -> int:
+    """프로세스에서 동시에 대여할 수 있는 브라우저 세션 수"""
+    return POOL_SIZE
+
+
+def lease(settings: Dict[str, Any], state: Optional[Dict[str, Any]] = None) -> BrowserLease:
+    """
+    세션용 대여 생성 (브라우저 배정은 첫 사용 시).
+    settings: 세션 BrowserProfile 설정, state: 배정 직후 복원할 storage state
+    """
+    return BrowserLease(settings, state)
+
+
+def release(browser) -> None:
+    """동기 호출부(세션 초기화, Gradio State 삭제 콜백)용 반납: 브라우저를 띄운 루프에서 recycle 실행"""
+    if not isinstance(browser, BrowserLease) or not browser._slots:
+        return
+    loop = browser._slots[0].loop
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(browser.recycle(), loop)
+
+
+async def warm(settings: Dict[str, Any], count: int = POOL_WARM) -> int:
+    """브라우저를 미리 count개(상한 이내) 띄워 둔다 → 띄운 수"""
+    loop = asyncio.get_running_loop()
+    headless = bool(settings.get("headless"))
+    launched = []
+    with _lock:
+        existing = sum(1 for s in _slots if s.headless == headless and s.loop is loop)
+        for _ in range(max(0, min(count, POOL_SIZE) - existing)):
+            if len(_slots) >= POOL_SIZE:
+                break
+            slot = _Slot(settings, loop)
+            _slots.append(slot)
+            _stats["launches"] += 1
+            launched.append(slot)
+    for slot in launched:
+        try:
+            await _start(slot)
+        except Exception:
+            with _lock:
+                if slot in _slots:
+                    _slots.remove(slot)
+    return sum(1 for s in launched if s.started)
+
+
+def browser_pool_stats() -> Dict[str, Any]:
+    """점유율, 대기 시간, 브라우저별 메모리 (psutil 없으면 rss_mb=None)"""
+    now = time.time()
+    with _lock:
+        stats = dict(_stats)
+        slots = list(_slots)
+        stats["waiting"] = _waiting
+    browsers = [{
+        "headless": s.headless,
+        "started": s.started,
+        "sessions": int(s.lease is not None),
+        "age_s": round(now - s.created_at, 1),
+        "rss_mb": s.rss_mb(),
+    } for s in slots]
+    in_use = sum(b["sessions"] for b in browsers)
+    stats.update({
+        "browsers": len(browsers),
+        "max_browsers": POOL_SIZE,
+        "sessions": in_use,
+        "capacity": capacity(),
+        "occupancy": round(in_use / capacity(), 4),
+        "wait_s_avg": round(stats["wait_s_total"] / stats["waits"], 3) if stats["waits"] else 0.0,
+        "wait_s_total": round(stats["wait_s_total"], 3),
+        "wait_s_max": round(stats["wait_s_max"], 3),
+        "rss_mb_total": round(sum(b["rss_mb"] or 0 for b in browsers), 1),
+        "per_browser": browsers,
+    })
+    return stats
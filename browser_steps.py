@@ -0,0 +1,148 @@
+# browser_steps.py
+# LLM을 거치지 않고 Playwright 페이지에서 직접 실행하는 결정적 스텝.
+# - navigate : url 로 이동
+# - click    : selector(CSS/XPath) 또는 text 로 찾은 요소 클릭
+# - fill     : 입력란에 value 입력 (submit: true 면 Enter)
+# - wait_for : 요소 상태(state) 또는 URL(url) 대기
+# - extract  : selector 에 해당하는 요소들의 텍스트/속성을 JSON으로 추출
+# navigate/click/fill(submit) 뒤에는 고정 대기 대신 페이지 준비 감지(page_ready)로 기다린다.
+# 실패 시 예외를 그대로 올리며, 호출부(script_runner)가 로그/사용자 안내로 처리한다.
+import os
+import json
+from typing import Any, Dict, List, Optional
+
+from browser_support import step_page, same_page
+import page_ready
+
+# ====== 설정 및 상수 ======
+STEP_TIMEOUT_MS = int(os.environ.get("STEP_TIMEOUT_MS", "15000"))
+EXTRACT_LIMIT = 50
+
+
+# ====== 요소 찾기 ======
+def _selector(sel: str) -> str:
+    """'//...', '(//...)', './...' 는 XPath, 그 외는 Playwright 선택자(CSS 등) 그대로"""
+    sel = str(sel).strip()
+    if sel.startswith(("//", "(/", "./", "..")):
+        return "xpath=" + sel
+    return sel
+
+
+def _locator(page, step, text: Optional[str] = None):
+    """selector 우선, 없으면 text 로 요소 찾기 (nth: 여러 개일 때 순번, 기본 0)"""
+    if step.get("selector"):
+        loc = page.locator(_selector(step.get("selector")))
+    else:
+        loc = page.get_by_text(text if text is not None else str(step.get("text")), exact=bool(step.get("exact", False)))
+    return loc.nth(int(step.get("nth", 0)))
+
+
+def _timeout(step) -> float:
+    return float(step.get("timeout", STEP_TIMEOUT_MS / 1000)) * 1000
+
+
+def _describe(step) -> str:
+    return str(step.get("selector") or step.get("text") or step.get("url") or "")
+
+
+async def _settle(page, stats) -> str:
+    """페이지 준비 대기 → 결과 문자열 꼬리 (감지기를 끄면 대기 없음)"""
+    if not page_ready.ADAPTIVE:
+        return ""
+    waited = await page_ready.wait_ready(page, stats)
+    return f" (준비 {waited:.1f}초)"
+
+
+# ====== 스텝 실행 ======
+async def _navigate(page, step, value: str, stats=None) -> str:
+    await page.goto(value, wait_until=step.get("wait_until", "domcontentloaded"), timeout=_timeout(step))
+    ready = await _settle(page, stats)
+    return f"이동 완료: {page.url}{ready}"
+
+
+async def _click(page, step, value: str, stats=None) -> str:
+    await _locator(page, step, value or None).click(timeout=_timeout(step))
+    ready = await _settle(page, stats)
+    return f"클릭 완료: {_describe(step)}{ready}"
+
+
+async def _fill(page, step, value: str, stats=None) -> str:
+    loc = _locator(page, step, step.get("text"))
+    await loc.fill(value, timeout=_timeout(step))
+    ready = ""
+    if step.get("submit"):
+        await loc.press("Enter", timeout=_timeout(step))
+        ready = await _settle(page, stats)
+    # 입력값은 결과/로그에 남기지 않음
+    return f"입력 완료: {_describe(step)}{ready}"
+
+
+async def _wait_for(page, step, value: str, stats=None) -> str:
+    if step.get("url"):
+        expected = str(step.get("url"))
+        await page.wait_for_url(lambda u: same_page(u, expected), timeout=_timeout(step))
+        return f"URL 확인: {page.url}"
+    state = step.get("state", "visible")
+    await _locator(page, step, value or None).wait_for(state=state, timeout=_timeout(step))
+    return f"대기 완료: {_describe(step)} ({state})"
+
+
+async def _read(el, attr: Optional[str]) -> Optional[str]:
+    if attr:
+        return await el.get_attribute(attr)
+    return (await el.inner_text()).strip()
+
+
+async def _extract(page, step, value: str, stats=None) -> str:
+    """
+    fields 가 없으면 각 요소의 텍스트(또는 attr) 목록,
+    fields 가 있으면 요소마다 {필드: 하위 선택자 값} 객체 목록을 JSON 문자열로 반환.
+    fields 값: "하위 선택자" 또는 {selector, attr}
+    """
+    loc = page.locator(_selector(step.get("selector")))
+    await loc.first.wait_for(state="attached", timeout=_timeout(step))
+    count = min(await loc.count(), int(step.get("limit", EXTRACT_LIMIT)))
+    fields: Dict[str, Any] = step.get("fields") or {}
+
+    items: List[Any] = []
+    for i in range(count):
+        el = loc.nth(i)
+        if not fields:
+            items.append(await _read(el, step.get("attr")))
+            continue
+        row = {}
+        for key, spec in fields.items():
+            if isinstance(spec, dict):
+                sub, attr = spec.get("selector"), spec.get("attr")
+            else:
+                sub, attr = spec, None
+            target = el.locator(_selector(sub)).first if sub else el
+            try:
+                row[key] = await _read(target, attr) if await target.count() else None
+            except Exception:
+                row[key] = None
+        items.append(row)
+    return json.dumps(items, ensure_ascii=False, indent=2)
+
+
+_RUNNERS = {
+    "navigate": _navigate,
+    "click": _click,
+    "fill": _fill,
+    "wait_for": _wait_for,
+    "extract": _extract,
+}
+
+
+async def run_browser_step(step, browser, value: str = "", stats: Optional[Dict[str, Any]] = None) -> str:
+    """
+    결정적 스텝 1개 실행 → 결과 문자열.
+    value: 렌더링된 템플릿 필드 (navigate=url, fill=value, click/wait_for=text)
+    stats: 페이지 준비 대기 시간을 기록할 스텝 집계 dict
+    """
+    page = await step_page(browser)
+    if page is None:
+        raise RuntimeError("브라우저 페이지에 접근할 수 없습니다 (이 browser-use 구성에서는 결정적 스텝을 지원하지 않음).")
+    # 액션이 일으키는 요청부터 추적
+    page_ready.track(page)
+    return await _RUNNERS[step.type](page, step, value, stats)
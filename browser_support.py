@@ -0,0 +1,342 @@
+# browser_support.py
+# browser_use(0.8+) BrowserSession 과, 같은 Chromium 에 CDP로 붙인 Playwright 브라우저/컨텍스트/페이지에 접근하는 공통 헬퍼.
+# - 세션마다 BrowserHandle(프로필 설정 + 지연 기동하는 BrowserSession)을 "browser"로 주고받는다
+#   (BrowserSession 은 pydantic 모델이라 해시가 안 돼 세션별 상태의 키로 쓸 수 없음)
+# - 결정적 스텝/요청 차단/storage state 는 Playwright(connect_over_cdp)로, agent 는 BrowserSession 으로 같은 탭을 조작한다
+# browser_use/Playwright 가 없는 구성(make_browser()가 None)에서는 모두 None/빈 값으로 폴백한다.
+import json
+import asyncio
+import weakref
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+# 버전에 따라 최상위 export가 없을 수 있으므로 안전 임포트
+BrowserSession = BrowserProfile = None
+try:
+    from browser_use import BrowserSession as _BrowserSession, BrowserProfile as _BrowserProfile
+    BrowserSession, BrowserProfile = _BrowserSession, _BrowserProfile
+except Exception:
+    pass
+
+try:
+    from playwright.async_api import async_playwright
+except Exception:
+    async_playwright = None
+
+_playwright = None                                                     # 프로세스당 Playwright 1개 (첫 사용 루프)
+_pw_lock: Optional[asyncio.Lock] = None
+_connections: Dict[str, Any] = {}                                      # BrowserSession.id → Playwright Browser
+_target_ids: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # Playwright Page → CDP target id
+
+
+def available() -> bool:
+    return BrowserSession is not None and BrowserProfile is not None
+
+
+def load_cookies_file(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """쿠키 파일(쿠키 목록 JSON 또는 storage state JSON) → storage state (없거나 읽을 수 없으면 None)"""
+    if not path:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if isinstance(data, list):
+        return {"cookies": data, "origins": []}
+    return data if isinstance(data, dict) else None
+
+
+# ====== 세션 ======
+async def launch_session(settings: Dict[str, Any]):
+    """BrowserProfile 설정으로 Chromium 을 띄운 BrowserSession (프로필은 세션마다 새로: 임시 user_data_dir 분리)"""
+    if not settings.get("headless"):
+        # 창 표시: 서버면 가상 디스플레이(VIRTUAL_DISPLAY) 확보 (display_mode 가 이 모듈을 임포트하므로 지연 임포트)
+        import display_mode
+        await display_mode.ensure_display_async()
+    session = BrowserSession(browser_profile=BrowserProfile(**settings))
+    await session.start()
+    return session
+
+
+async def stop_session(session) -> None:
+    """Playwright 연결을 끊고 Chromium 종료"""
+    await disconnect(session)
+    try:
+        await session.kill()
+    except Exception:
+        pass
+
+
+class BrowserHandle:
+    """
+    세션 브라우저: 프로필 설정(dict)과 처음 쓰일 때 기동하는 BrowserSession.
+    state: 기동 직후 복원할 storage state (체크포인트 재개/계정 쿠키 파일).
+    new_context(): 같은 설정의 BrowserSession 을 하나 더 띄운다 (병렬 스텝/foreach 항목 전용, close_context 로 닫음).
+    """
+
+    def __init__(self, settings: Dict[str, Any], state: Optional[Dict[str, Any]] = None):
+        self.settings = dict(settings)
+        self.state = state
+        self._session = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._contexts: List[Any] = []
+
+    @property
+    def headless(self) -> bool:
+        return bool(self.settings.get("headless"))
+
+    async def _open(self):
+        return await launch_session(self.settings)
+
+    async def _close(self, session) -> None:
+        await stop_session(session)
+
+    async def get_session(self):
+        """세션 공유 BrowserSession (처음 부를 때 기동 + 초기 상태 복원)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._session is None:
+                session = await self._open()
+                if self.state:
+                    try:
+                        await restore_storage_state(await playwright_context(session), self.state)
+                    except Exception:
+                        pass
+                self._session = session
+            return self._session
+
+    async def new_context(self):
+        session = await self._open()
+        self._contexts.append(session)
+        return session
+
+    async def close_context(self, session) -> None:
+        self._contexts = [s for s in self._contexts if s is not session]
+        await self._close(session)
+
+    async def close(self) -> None:
+        """세션과 남은 전용 세션을 모두 닫는다. 이후 다시 쓰면 새로 기동"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            session, self._session = self._session, None
+            contexts, self._contexts = self._contexts, []
+        for s in contexts + ([session] if session is not None else []):
+            await self._close(s)
+
+
+async def session_of(browser):
+    """BrowserHandle/대여 → 세션 공유 BrowserSession, BrowserSession(전용 컨텍스트)은 그대로 (지원하지 않으면 None)"""
+    if browser is None:
+        return None
+    if BrowserSession is not None and isinstance(browser, BrowserSession):
+        return browser
+    get = getattr(browser, "get_session", None)
+    if get is None:
+        return None
+    try:
+        return await get()
+    except Exception:
+        return None
+
+
+async def shared_context(browser):
+    """
+    순차 스텝(결정적 스텝 + agent)이 함께 쓰는 BrowserSession.
+    Agent(browser_session=...)에 주입하면 keep_alive 설정으로 스텝이 끝나도 닫히지 않아
+    다음 스텝이 같은 탭/로그인 상태를 이어받는다. 지원하지 않는 구성(세션 브라우저 없음)이면 None.
+    세션을 배정받지 못하면(풀 대기 시간 초과 등) 예외를 그대로 올린다 → 호출부는 스텝을 실패 처리
+    (None 으로 삼키면 Agent 가 허용 도메인/로그인 상태가 없는 기본 브라우저로 실행됨).
+    """
+    if browser is None:
+        return None
+    if BrowserSession is not None and isinstance(browser, BrowserSession):
+        return browser
+    get = getattr(browser, "get_session", None)
+    if get is None:
+        return None
+    return await get()
+
+
+# ====== Playwright (CDP 연결) ======
+async def playwright_browser(browser):
+    """세션의 Chromium 에 CDP로 붙인 Playwright Browser (세션당 1개 연결 재사용, 없으면 None)"""
+    global _playwright, _pw_lock
+    session = await session_of(browser)
+    cdp_url = getattr(session, "cdp_url", None) if session is not None else None
+    if not cdp_url or async_playwright is None:
+        return None
+    if _pw_lock is None:
+        _pw_lock = asyncio.Lock()
+    async with _pw_lock:
+        pw_browser = _connections.get(session.id)
+        if pw_browser is not None and pw_browser.is_connected():
+            return pw_browser
+        try:
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            pw_browser = await _playwright.chromium.connect_over_cdp(cdp_url)
+        except Exception:
+            return None
+        _connections[session.id] = pw_browser
+        return pw_browser
+
+
+async def disconnect(session) -> None:
+    """BrowserSession 의 Playwright 연결 해제 (라우트/init 스크립트도 함께 사라짐, Chromium 은 그대로)"""
+    pw_browser = _connections.pop(getattr(session, "id", None), None)
+    if pw_browser is not None:
+        try:
+            await pw_browser.close()
+        except Exception:
+            pass
+
+
+async def playwright_context(browser):
+    """세션 탭들이 있는 Playwright 기본 컨텍스트 (없으면 None)"""
+    pw_browser = await playwright_browser(browser)
+    contexts = list(getattr(pw_browser, "contexts", []) or []) if pw_browser is not None else []
+    return contexts[0] if contexts else None
+
+
+async def playwright_contexts(browser) -> List[Any]:
+    context = await playwright_context(browser)
+    return [context] if context is not None else []
+
+
+async def _target_id(page) -> Optional[str]:
+    tid = _target_ids.get(page)
+    if tid is None:
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            try:
+                tid = (await cdp.send("Target.getTargetInfo"))["targetInfo"]["targetId"]
+            finally:
+                await cdp.detach()
+        except Exception:
+            return None
+        _target_ids[page] = tid
+    return tid
+
+
+async def current_page(browser):
+    """agent 가 보고 있는 탭(BrowserSession.agent_focus)의 Playwright Page, 못 찾으면 마지막 탭 (없으면 None)"""
+    session = await session_of(browser)
+    context = await playwright_context(session)
+    pages = list(getattr(context, "pages", []) or []) if context is not None else []
+    if not pages:
+        return None
+    focus = getattr(getattr(session, "agent_focus", None), "target_id", None)
+    if focus:
+        for page in pages:
+            if await _target_id(page) == focus:
+                return page
+    return pages[-1]
+
+
+async def ensure_page(browser):
+    """현재 탭, 없으면 새 탭 생성 (컨텍스트도 없으면 None)"""
+    page = await current_page(browser)
+    if page is not None:
+        return page
+    context = await playwright_context(browser)
+    if context is not None:
+        return await context.new_page()
+    return None
+
+
+async def step_page(browser):
+    """결정적 스텝이 조작할 페이지: 세션 공유 BrowserSession 의 현재 탭"""
+    return await ensure_page(browser)
+
+
+async def reset_session(session) -> bool:
+    """
+    다음 사용자에게 넘기기 전 세션 초기화: 쿠키와 origin별 스토리지를 지우고 탭 하나만 about:blank 로 남긴 뒤
+    Playwright 연결을 끊는다 (라우트/init 스크립트 제거). 실패하면 False → 호출부가 브라우저를 닫는다.
+    """
+    pw_browser = await playwright_browser(session)
+    context = await playwright_context(session)
+    if pw_browser is None or context is None:
+        return False
+    try:
+        state = await context.storage_state()
+        origins = {o["origin"] for o in state.get("origins", []) if o.get("origin")}
+        origins |= {"https://" + c["domain"].lstrip(".") for c in state.get("cookies", []) if c.get("domain")}
+        origins |= {f"{u.scheme}://{u.netloc}" for u in (urlparse(p.url) for p in context.pages) if u.scheme in ("http", "https")}
+        await context.clear_cookies()
+        cdp = await pw_browser.new_browser_cdp_session()
+        try:
+            for origin in origins:
+                await cdp.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        finally:
+            await cdp.detach()
+        keep = await current_page(session)
+        for page in list(context.pages):
+            if page is not keep:
+                await page.close()
+        if keep is not None:
+            await keep.goto("about:blank")
+    except Exception:
+        return False
+    await disconnect(session)
+    return True
+
+
+def storage_init_script(data: Dict[str, Dict[str, str]], storage: str = "localStorage") -> str:
+    """origin별 {키: 값}을 localStorage/sessionStorage 에 복원하는 init 스크립트 (페이지 스크립트보다 먼저 실행, 이미 있는 키는 유지)"""
+    return (
+        "(() => { const s = " + json.dumps(data, ensure_ascii=False) + "[location.origin];"
+        f" if (!s) return; try {{ const st = window.{storage}; for (const [k, v] of Object.entries(s))"
+        " if (st.getItem(k) === null) st.setItem(k, v); } catch (e) {} })();"
+    )
+
+
+async def restore_storage_state(pw_context, state) -> None:
+    """storage state(쿠키 + origin별 localStorage)를 다른 Playwright 컨텍스트에 복원 → 같은 로그인 상태"""
+    state = state or {}
+    if state.get("cookies"):
+        await pw_context.add_cookies(state["cookies"])
+    local = {o["origin"]: {i["name"]: i["value"] for i in o.get("localStorage", [])}
+             for o in state.get("origins", []) or [] if o.get("origin") and o.get("localStorage")}
+    if local:
+        await pw_context.add_init_script(storage_init_script(local))
+
+
+async def storage_state(browser) -> Optional[Dict[str, Any]]:
+    """세션의 storage state (쿠키 + origin별 localStorage, 지원하지 않거나 실패하면 None)"""
+    try:
+        context = await playwright_context(browser)
+        return await context.storage_state() if context is not None else None
+    except Exception:
+        return None
+
+
+async def current_url(browser) -> str:
+    page = await current_page(browser)
+    return getattr(page, "url", "") if page is not None else ""
+
+
+def same_page(url: str, expected: str) -> bool:
+    """호스트 + 경로 접두사 비교 (쿼리/해시 무시). expected가 URL이 아니면 부분 문자열 비교"""
+    if not url or not expected:
+        return False
+    exp = urlparse(expected)
+    if not exp.scheme:
+        return expected.lower() in url.lower()
+    cur = urlparse(url)
+    return cur.netloc.lower() == exp.netloc.lower() and cur.path.startswith(exp.path.rstrip("/"))
+
+
+async def goto(browser, url: str, timeout_ms: int = 25000) -> str:
+    """현재 탭에서 이동 후 최종 URL 반환 (실패 시 빈 문자열)"""
+    page = await ensure_page(browser)
+    if page is None:
+        return ""
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+        return page.url
+    except Exception:
+        return ""
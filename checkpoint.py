@@ -0,0 +1,121 @@
+# checkpoint.py
+# 스크립트 실행 진행 상황을 스텝마다 디스크에 저장(체크포인트)하고, 프로세스 재시작/새로고침 후
+# 완료된 agent 호출을 반복하지 않고 정확히 그 스텝부터 이어서 실행할 수 있게 한다.
+# - checkpoints/<run_id>.json       : 스텝 인덱스, 대기 상태, 마스킹된 스텝 결과, 스크립트/프롬프트
+# - checkpoints/<run_id>.state      : 브라우저 storage state (쿠키/로컬 스토리지). auth_state 와 같은 키(AUTH_STATE_KEY)로
+#                                      암호화, 권한 0600. 키가 없으면 저장하지 않음 (재개 시 로그인부터 다시)
+# 실행이 끝나면(finished) 체크포인트를 지운다.
+import os
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import auth_state
+import browser_support
+
+# ====== 설정 및 상수 ======
+CHECKPOINTS_DIR = Path(os.environ.get("CHECKPOINTS_DIR", "./checkpoints"))
+
+
+def _checkpoint_path(run_id: str) -> Path:
+    return CHECKPOINTS_DIR / f"{run_id}.json"
+
+
+def _state_path(run_id: str) -> Path:
+    return CHECKPOINTS_DIR / f"{run_id}.state"
+
+
+def atomic_write_json(path: Path, data: Any, private: bool = False) -> None:
+    """임시 파일에 쓴 뒤 교체 → 쓰는 도중 죽어도 이전 체크포인트 유지"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    if private:
+        try:
+            os.chmod(tmp, 0o600)
+        except OSError:
+            pass
+    os.replace(tmp, path)
+
+
+# ====== 브라우저 상태 ======
+async def capture_storage_state(browser) -> Optional[Dict[str, Any]]:
+    """현재 브라우저 컨텍스트의 storage state (지원하지 않거나 실패하면 None)"""
+    return await browser_support.storage_state(browser)
+
+
+# ====== 체크포인트 저장/조회 ======
+def save_checkpoint(run_id: str, *, script_text: str, script_hash: str, prompt_text: str, idx: int,
+                    waiting: bool, msg: str, outputs: List[Dict[str, Any]], log_path: str = "",
+                    storage_state: Optional[Dict[str, Any]] = None, finished: bool = False) -> Path:
+    """스텝 완료 직후 호출: 진행 상황을 원자적으로 기록 (finished 면 체크포인트 삭제)"""
+    path = _checkpoint_path(run_id)
+    if finished:
+        delete_checkpoint(run_id)
+        return path
+    token = auth_state.encrypt_json(storage_state) if storage_state is not None else None
+    data = {
+        "run_id": run_id,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "script_hash": script_hash,
+        "script_text": script_text,
+        "prompt_text": prompt_text,
+        "idx": idx,
+        "waiting": waiting,
+        "msg": msg,
+        "finished": False,
+        "outputs": outputs,  # [{"step", "name", "output"(마스킹됨)}]
+        "log_path": log_path,
+        "has_storage_state": token is not None or _state_path(run_id).exists(),
+    }
+    if token is not None:
+        auth_state.write_private(_state_path(run_id), token)
+    atomic_write_json(path, data)
+    return path
+
+
+def load_checkpoint(run_id: str) -> Optional[Dict[str, Any]]:
+    """체크포인트 조회 (복호화한 storage state 포함, 키가 없거나 다르면 storage_state 없음)"""
+    path = _checkpoint_path(run_id)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    state_path = _state_path(run_id)
+    if state_path.exists():
+        state = auth_state.decrypt_json(state_path.read_bytes())
+        if state is not None:
+            data["storage_state"] = state
+    return data
+
+
+def list_checkpoints(include_finished: bool = False) -> List[str]:
+    """이어서 실행 가능한 run_id 목록 (최근 순)"""
+    if not CHECKPOINTS_DIR.exists():
+        return []
+    runs = []
+    for path in CHECKPOINTS_DIR.glob("*.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        if include_finished or not data.get("finished"):
+            runs.append((data.get("updated_at", ""), data.get("run_id", path.stem)))
+    return [run_id for _, run_id in sorted(runs, reverse=True)]
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def delete_checkpoint(run_id: str) -> None:
+    for path in (_checkpoint_path(run_id), _state_path(run_id)):
+        _unlink(path)
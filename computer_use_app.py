@@ -14,15 +14,15 @@ os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")
 
 import yaml
 import streamlit as st
-from browser_use import Agent, ChatOllama
+from browser_use import Agent
 
-# 브라우저 설정
-Browser = BrowserConfig = BrowserContextConfig = None
-try:
-    from browser_use import Browser as _Browser, BrowserConfig as _BrowserConfig, BrowserContextConfig as _BrowserContextConfig
-    Browser, BrowserConfig, BrowserContextConfig = _Browser, _BrowserConfig, _BrowserContextConfig
-except Exception:
-    pass
+from async_engine import get_engine, get_job
+from llm_pool import get_llm, start_warmup
+from prompt_prefix import agent_prompt_kwargs
+import browser_pool
+import browser_support
+import page_ready
+import display_mode
 
 # ====== 설정 및 상수 ======
 PROMPTS_DIR = Path("./prompts")
@@ -93,35 +93,37 @@ def load_prompt(name: str) -> str:
 
 # ====== 실행 엔진 ======
 def make_llm():
-    """LLM 생성"""
-    return ChatOllama(model="llama3.2-vision")
+    """LLM (프로세스 공유 클라이언트 풀)"""
+    return get_llm()
+
+def _profile_settings(headless: Optional[bool] = None) -> Dict[str, Any]:
+    if headless is None:
+        headless = display_mode.DEFAULT_HEADLESS
+    return {
+        "headless": headless,
+        "allowed_domains": DEFAULT_ALLOWED_DOMAINS,
+        "keep_alive": True,
+        "minimum_wait_page_load_time": page_ready.PAGE_MIN_WAIT_S,
+    }
 
 def make_browser():
-    """브라우저 생성"""
-    if Browser and BrowserConfig:
-        cfg = None
-        if BrowserContextConfig:
-            cfg = BrowserConfig(
-                headless=False,
-                new_context_config=BrowserContextConfig(
-                    allowed_domains=DEFAULT_ALLOWED_DOMAINS,
-                    minimum_wait_page_load_time=2,
-                    maximum_wait_page_load_time=25,
-                ),
-            )
-        else:
-            cfg = BrowserConfig(headless=False)
-        return Browser(config=cfg)
-    return None
+    """브라우저 생성 (브라우저 풀이 켜져 있으면 웜 브라우저 대여)"""
+    if not browser_support.available():
+        return None
+    settings = _profile_settings()
+    if browser_pool.POOL_ENABLED:
+        return browser_pool.lease(settings)
+    return browser_support.BrowserHandle(settings)
 
-def run_agent_task(task: str, progress_callback=None) -> Tuple[str, bool, str]:
+async def run_agent_task_async(task: str, progress_callback=None) -> Tuple[str, bool, str]:
     """에이전트 작업 실행"""
+    browser = None
     try:
         if progress_callback:
             progress_callback("🤖 AI 에이전트 초기화 중...")
         
-        # 안전 프리앰블 추가
-        full_task = SAFETY_PREAMBLE + "\n\n" + task
+        # 안전 프리앰블은 시스템 프롬프트 슬롯에 (요청 간 공통 접두부 → Ollama KV 캐시 재사용)
+        prompt_kwargs = agent_prompt_kwargs(Agent, SAFETY_PREAMBLE, task)
         
         if progress_callback:
             progress_callback("🌐 브라우저 연결 중...")
@@ -130,22 +132,27 @@ def run_agent_task(task: str, progress_callback=None) -> Tuple[str, bool, str]:
         llm = make_llm()
         browser = make_browser()
         
+        # 작업 전용 세션: 고정 로드 대기 대신 페이지 준비 감지
+        context = await browser_support.shared_context(browser)
+        page_ready.adapt_context(context)
+        extra = {"browser_session": context} if context is not None else {}
+        
         if progress_callback:
             progress_callback("🚀 작업 실행 중...")
         
         # 에이전트 실행
         agent = Agent(
-            task=full_task,
+            **prompt_kwargs,
             llm=llm,
             use_vision=True,
-            browser=browser,
+            **extra,
         )
         
         if progress_callback:
             progress_callback("⏳ AI가 작업을 수행하고 있습니다...")
         
         # 실제 실행 (타임아웃 설정)
-        result = agent.run_sync(max_steps=5)
+        result = await agent.run(max_steps=5)
         
         if progress_callback:
             progress_callback("✅ 작업 완료!")
@@ -167,6 +174,20 @@ def run_agent_task(task: str, progress_callback=None) -> Tuple[str, bool, str]:
         if progress_callback:
             progress_callback(error_msg)
         return error_msg, False, ""
+    finally:
+        # 작업이 끝나면 브라우저를 닫는다 (풀 대여면 풀에 반납)
+        if browser is not None:
+            await browser.close()
+
+def run_agent_task(task: str, progress_callback=None) -> Tuple[str, bool, str]:
+    """동기 호출부 호환: 실행 엔진에 제출 후 완료까지 대기"""
+    return get_engine().run(run_agent_task_async, task, progress_callback)
+
+# 모델 미리 로드 (Streamlit 재실행마다 호출되지만 프로세스당 1회만 수행)
+start_warmup()
+# 브라우저 풀 예열 (이미 띄운 브라우저가 있으면 아무것도 하지 않음)
+if browser_support.available() and browser_pool.POOL_ENABLED:
+    get_engine().submit(browser_pool.warm, _profile_settings())
 
 # ====== Streamlit UI ======
 st.set_page_config(
@@ -249,6 +270,10 @@ with col1:
     
     with col_stop:
         if st.button("⏹️ 중지", disabled=not st.session_state.is_running):
+            job = get_job(st.session_state.get('job_id'))
+            if job:
+                job.cancel()
+            st.session_state.job_id = None
             st.session_state.is_running = False
             st.session_state.waiting_for_user = False
             st.rerun()
@@ -292,19 +317,30 @@ with col2:
         st.info("실행 로그가 여기에 표시됩니다.")
 
 # 실행 로직
+# 작업은 실행 엔진에 제출하고 핸들만 세션에 보관 → 재실행(rerun)마다 진행 메시지/완료 여부를 폴링
 if st.session_state.is_running and not st.session_state.waiting_for_user:
     if user_prompt:
-        # 진행 상황 콜백
-        def progress_callback(message):
+        job = get_job(st.session_state.get('job_id'))
+        if job is None:
+            # 에이전트 실행
+            job = get_engine().submit(run_agent_task_async, user_prompt, progress=True)
+            st.session_state.job_id = job.job_id
+        
+        # 진행 상황 로그 반영
+        for message in job.drain_progress():
             st.session_state.execution_log.append({
                 "type": "info",
                 "message": message,
                 "timestamp": datetime.now().strftime("%H:%M:%S")
             })
         
-        # 에이전트 실행
+        if not job.done():
+            time.sleep(1)
+            st.rerun()
+        
+        st.session_state.job_id = None
         try:
-            result, waiting, wait_msg = run_agent_task(user_prompt, progress_callback)
+            result, waiting, wait_msg = job.result()
             
             # 결과 로그 추가
             st.session_state.execution_log.append({
@@ -0,0 +1,280 @@
+# display_mode.py
+# 브라우저 표시 모드(헤드리스/창 표시) 결정과 실행 중 전환.
+# - BROWSER_HEADLESS=auto(기본): 디스플레이가 없는 서버(DISPLAY/WAYLAND_DISPLAY 없음)에선 헤드리스, 데스크톱에선 창 표시
+# - 헤드리스 세션이 사람 액션 대기(require_user, wait_for, 로그인 요청)에 멈추면 살아 있는 세션 상태
+#   (쿠키 + localStorage + 현재 탭의 sessionStorage + URL)를 창이 보이는 새 브라우저로 옮기고(인계),
+#   사람이 처리한 뒤 다음 실행에서 다시 헤드리스로 돌려보낸다
+# - 서버에서 창 표시가 필요하면 VIRTUAL_DISPLAY=1 로 Xvfb 가상 디스플레이를 띄우고, VNC_PORT 와 VNC_PASSWORD 를 주면
+#   x11vnc 로 화면을 연다 (비밀번호가 없으면 VNC 를 띄우지 않음)
+# 배치 실행(make_browser(handoff=False))은 인계하지 않으므로 화면 렌더링 비용이 들지 않는다.
+import os
+import sys
+import time
+import shutil
+import atexit
+import asyncio
+import tempfile
+import threading
+import subprocess
+import weakref
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from browser_support import step_page, storage_init_script, restore_storage_state
+from checkpoint import capture_storage_state
+
+# ====== 설정 및 상수 ======
+_MODE = os.environ.get("BROWSER_HEADLESS", "auto").lower()
+HANDOFF_ENABLED = os.environ.get("HEADED_HANDOFF", "1").lower() not in ("0", "false", "off")
+HEADLESS_RETURN = os.environ.get("HEADLESS_RETURN", "1").lower() not in ("0", "false", "off")  # 대기 처리 후 헤드리스 복귀
+VIRTUAL_DISPLAY = os.environ.get("VIRTUAL_DISPLAY", "0").lower() in ("1", "true", "on")
+VIRTUAL_DISPLAY_SIZE = os.environ.get("VIRTUAL_DISPLAY_SIZE", "1920x1080x24")
+VIRTUAL_DISPLAY_NUM = int(os.environ.get("VIRTUAL_DISPLAY_NUM", "99"))
+VNC_PORT = int(os.environ.get("VNC_PORT", "0") or 0)
+VNC_PASSWORD = os.environ.get("VNC_PASSWORD", "")
+HANDOFF_TIMEOUT_S = float(os.environ.get("HEADED_HANDOFF_TIMEOUT_S", "25"))
+
+# 현재 탭의 sessionStorage (MSAL 토큰 캐시 등, 컨텍스트 storage_state 에는 없음)
+_SESSION_STORAGE_JS = "() => [location.origin, Object.fromEntries(Object.entries(sessionStorage))]"
+
+
+def has_display() -> bool:
+    """창을 띄울 수 있는지 (Windows/macOS 는 항상, 그 외는 DISPLAY/WAYLAND_DISPLAY)"""
+    if sys.platform.startswith(("win", "darwin")):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+# auto: 실제 디스플레이가 없으면(서버/컨테이너) 헤드리스. 가상 디스플레이는 인계용이라 판단에 넣지 않는다
+DEFAULT_HEADLESS = _MODE in ("1", "true", "on") or (_MODE == "auto" and not has_display())
+
+_lock = threading.Lock()
+_procs: List[subprocess.Popen] = []
+_no_handoff: "weakref.WeakSet" = weakref.WeakSet()   # 인계하지 않는 브라우저 (배치)
+_handed: "weakref.WeakSet" = weakref.WeakSet()       # 대기 처리를 위해 창 표시로 옮긴 브라우저
+_stats: Dict[str, Any] = {
+    "to_headed": 0,
+    "to_headless": 0,
+    "handoff_s_total": 0.0,
+    "failures": 0,
+    "virtual_display": False,
+    "vnc": "off",        # off / on / no_password (VNC_PORT 는 있는데 비밀번호가 없어 띄우지 않음)
+}
+
+
+# ====== 가상 디스플레이 ======
+def _stop_procs() -> None:
+    for proc in reversed(_procs):
+        try:
+            proc.terminate()
+        except Exception:
+            pass
+
+
+atexit.register(_stop_procs)
+
+
+def could_display() -> bool:
+    """창을 띄울 수 있는 구성인지 (실제 디스플레이 또는 Xvfb 가상 디스플레이, 기동은 하지 않음)"""
+    return has_display() or (VIRTUAL_DISPLAY and shutil.which("Xvfb") is not None)
+
+
+def _vnc_auth() -> Optional[List[str]]:
+    """x11vnc 비밀번호 인자: 0600 임시 파일로 넘기고 x11vnc 가 읽은 뒤 지운다 (프로세스 목록에 비밀번호 노출 방지)"""
+    fd, path = tempfile.mkstemp(prefix="vncpass-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(VNC_PASSWORD + "\n")
+    except OSError:
+        return None
+    return ["-passwdfile", "rm:" + path]
+
+
+def _start_vnc(display: str) -> None:
+    if not VNC_PORT or not shutil.which("x11vnc"):
+        return
+    if not VNC_PASSWORD:
+        _stats["vnc"] = "no_password"
+        return
+    auth = _vnc_auth()
+    if auth is None:
+        return
+    try:
+        _procs.append(subprocess.Popen(
+            ["x11vnc", "-display", display, "-forever", "-shared", "-quiet", "-rfbport", str(VNC_PORT), *auth],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        _stats["vnc"] = "on"
+    except OSError:
+        pass
+
+
+def ensure_display() -> bool:
+    """
+    창 표시 브라우저를 띄울 디스플레이 확보 (없고 VIRTUAL_DISPLAY 면 Xvfb 기동) → 가능한지.
+    Xvfb 기동을 최대 5초 기다리므로 이벤트 루프에서는 ensure_display_async 를 쓴다.
+    """
+    if has_display():
+        return True
+    if not VIRTUAL_DISPLAY or not shutil.which("Xvfb"):
+        return False
+    with _lock:
+        if has_display():
+            return True
+        display = f":{VIRTUAL_DISPLAY_NUM}"
+        try:
+            _procs.append(subprocess.Popen(
+                ["Xvfb", display, "-screen", "0", VIRTUAL_DISPLAY_SIZE, "-nolisten", "tcp"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+        except OSError:
+            return False
+        # 소켓이 생길 때까지 잠깐 대기
+        socket_path = f"/tmp/.X11-unix/X{VIRTUAL_DISPLAY_NUM}"
+        deadline = time.time() + 5
+        while not os.path.exists(socket_path) and time.time() < deadline:
+            time.sleep(0.1)
+        os.environ["DISPLAY"] = display
+        _stats["virtual_display"] = True
+        _start_vnc(display)
+    return True
+
+
+async def ensure_display_async() -> bool:
+    """ensure_display 를 스레드에서 실행 (Xvfb 기동 대기 동안 이벤트 루프를 막지 않음)"""
+    return await asyncio.to_thread(ensure_display)
+
+
+def viewer_hint() -> str:
+    """사용자에게 창을 어디서 보는지 안내 (가상 디스플레이 + VNC 일 때)"""
+    if _stats["virtual_display"] and _stats["vnc"] == "on":
+        return f"VNC 포트 {VNC_PORT}로 접속해 브라우저 창에서 처리하세요."
+    if _stats["virtual_display"] and _stats["vnc"] == "no_password":
+        return "VNC_PASSWORD 가 없어 VNC 를 열지 않았습니다. 비밀번호를 설정한 뒤 다시 실행하세요."
+    return ""
+
+
+# ====== 모드 조회 ======
+def is_headless(browser) -> bool:
+    return bool(getattr(browser, "headless", False))
+
+
+def disable_handoff(browser) -> None:
+    """배치처럼 사람이 없는 실행: 대기 지점에서도 창 표시로 옮기지 않음"""
+    if browser is not None:
+        try:
+            _no_handoff.add(browser)
+        except TypeError:
+            pass
+
+
+def should_show(browser) -> bool:
+    """사람 액션 대기에 멈춘 헤드리스 세션 → 창 표시로 옮길지"""
+    if browser is None or not HANDOFF_ENABLED or not is_headless(browser):
+        return False
+    try:
+        if browser in _no_handoff:
+            return False
+    except TypeError:
+        return False
+    return could_display()
+
+
+def can_show() -> bool:
+    """대기 지점에서 창 표시로 옮길 수 있는지 (체크포인트에서 대기 중인 세션을 재개할 때)"""
+    return HANDOFF_ENABLED and DEFAULT_HEADLESS and could_display()
+
+
+def mark_shown(browser) -> None:
+    """대기 처리를 위해 창 표시로 연 브라우저로 기록 (다음 실행에서 헤드리스 복귀 대상)"""
+    if browser is not None:
+        try:
+            _handed.add(browser)
+        except TypeError:
+            pass
+
+
+def should_return(browser) -> bool:
+    """대기 처리를 위해 창 표시로 옮겼던 세션 → 다음 실행에서 헤드리스로 되돌릴지"""
+    if browser is None or not HEADLESS_RETURN or not DEFAULT_HEADLESS:
+        return False
+    try:
+        return browser in _handed
+    except TypeError:
+        return False
+
+
+# ====== 세션 인계 ======
+async def _snapshot(browser) -> Tuple[Optional[Dict[str, Any]], str, Optional[Tuple[str, Dict[str, str]]]]:
+    """(storage_state, 현재 탭 URL, 현재 탭의 (origin, sessionStorage))"""
+    state = await capture_storage_state(browser)
+    url, session = "", None
+    try:
+        page = await step_page(browser)
+        if page is not None:
+            url = page.url if page.url != "about:blank" else ""
+            session = tuple(await page.evaluate(_SESSION_STORAGE_JS))
+    except Exception:
+        session = None
+    return state, url, session
+
+
+async def _restore(browser, state: Optional[Dict[str, Any]], url: str,
+                   session: Optional[Tuple[str, Dict[str, str]]]) -> None:
+    page = await step_page(browser)
+    context = getattr(page, "context", None)
+    if page is None or context is None:
+        raise RuntimeError("새 브라우저 컨텍스트를 열 수 없습니다.")
+    await restore_storage_state(context, state)
+    if session and session[1]:
+        await context.add_init_script(storage_init_script({session[0]: session[1]}, "sessionStorage"))
+    if url:
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=HANDOFF_TIMEOUT_S * 1000)
+        except Exception:
+            pass
+
+
+async def _close(browser) -> None:
+    try:
+        await browser.close()
+    except Exception:
+        pass
+
+
+async def switch(browser, headless: bool, make: Callable[[Any, bool], Any]) -> Tuple[Any, Optional[float]]:
+    """
+    살아 있는 세션을 표시 모드가 다른 새 브라우저로 옮긴다 → (새 브라우저, 걸린 초).
+    make(old, headless): 같은 세션 설정으로 표시 모드만 바꾼 브라우저 생성.
+    실패하면 기존 브라우저를 그대로 돌려준다 (걸린 초 None).
+    """
+    started = time.perf_counter()
+    new = None
+    try:
+        state, url, session = await _snapshot(browser)
+        new = make(browser, headless)
+        await _restore(new, state, url, session)
+    except Exception:
+        if new is not None:
+            await _close(new)
+        with _lock:
+            _stats["failures"] += 1
+        return browser, None
+    await _close(browser)
+    if not headless:
+        mark_shown(new)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _stats["to_headless" if headless else "to_headed"] += 1
+        _stats["handoff_s_total"] += elapsed
+    return new, elapsed
+
+
+def display_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    handoffs = stats["to_headed"] + stats["to_headless"]
+    stats["handoff_s_avg"] = round(stats["handoff_s_total"] / handoffs, 3) if handoffs else 0.0
+    stats["handoff_s_total"] = round(stats["handoff_s_total"], 3)
+    stats["default_headless"] = DEFAULT_HEADLESS
+    stats["display"] = has_display()
+    return stats
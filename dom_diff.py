@@ -0,0 +1,230 @@
+# dom_diff.py
+# agent 액션마다 browser_use 가 직렬화하는 상호작용 요소 목록(DOM 상태)을 직전 요청과 비교해
+# 바뀐 부분만 LLM에 보내는 계층. llm_pool.PooledChatOllama.ainvoke 가 요청 직전에 호출한다.
+# - 탭(현재 URL)별로 직전에 보낸 요소 목록을 기억하고, 요소 번호([N])를 뺀 줄 단위로 구조 비교
+# - 바뀌지 않은 긴 구간(DOM_DIFF_MIN_RUN 줄 이상)은 요소마다 "[번호]<태그> 짧은 텍스트" 한 줄로 줄인다
+#   (번호는 현재 번호라 그대로 클릭/입력에 쓸 수 있음. browser_use 0.8 의 MessageManager 는 이전 상태 메시지를
+#   남기지 않으므로 "직전과 같음" 자리표시만 두면 모델이 그 요소를 알 수 없다)
+# - 전체 전송: 탭의 첫 요청, URL 변경(이동), 같은 요청 재시도, DOM_DIFF_FULL_EVERY 회마다, 새 Agent(캐스케이드 전환)
+# - 기본은 꺼짐(DOM_DIFF=1 로 켬), 스텝 단위 지정: YAML dom_diff: true/false (전역 설정보다 우선)
+# 줄인 글자 수와 추정 토큰은 스텝 집계 dict와 dom_diff_stats()에 남는다.
+import os
+import re
+import hashlib
+import difflib
+import threading
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+# ====== 설정 및 상수 ======
+DOM_DIFF_ENABLED = os.environ.get("DOM_DIFF", "0").lower() in ("1", "true", "on")
+DOM_DIFF_MIN_RUN = max(3, int(os.environ.get("DOM_DIFF_MIN_RUN", "6")))       # 이보다 짧은 변경 없는 구간은 그대로 보냄
+DOM_DIFF_FULL_EVERY = max(1, int(os.environ.get("DOM_DIFF_FULL_EVERY", "5")))  # 이 횟수마다 전체 목록 전송
+DOM_DIFF_LABEL_CHARS = max(8, int(os.environ.get("DOM_DIFF_LABEL_CHARS", "40")))  # 줄인 요소의 텍스트 길이
+DOM_DIFF_MIN_SAVING = 0.2   # 이만큼도 줄지 않으면 전체 전송
+CHARS_PER_TOKEN = 4         # 추정 토큰 (영문/마크업 기준)
+
+# 요소 목록 시작/끝 (browser_use 버전별 상태 메시지 형식)
+_BLOCK_START_RE = re.compile(r"Interactive elements[^\n]*:\n")
+_BLOCK_END_RE = re.compile(r"\n(?:</browser_state>|Current step:|Current date and time:|<step_info>)")
+_URL_RE = re.compile(r"Current url: (\S+)")
+_TAB_RE = re.compile(r"Current tab: (\S+)")
+_INDEX_RE = re.compile(r"^(\s*)\*?\[(\d+)\]")
+_TAG_RE = re.compile(r"<([\w-]+)([^>]*)>")
+_MARKUP_RE = re.compile(r"<[^>]*>")
+
+STAT_KEYS = ("dom_full", "dom_diff", "dom_chars_sent", "dom_chars_saved")
+
+_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("dom_diff_state", default=None)
+
+_lock = threading.Lock()
+_stats: Dict[str, int] = {"full": 0, "diff": 0, "chars_sent": 0, "chars_saved": 0, "collapsed_runs": 0}
+
+
+def start_step(enabled: Optional[bool] = None, stats: Optional[Dict[str, Any]] = None) -> None:
+    """
+    현재 컨텍스트(= 이 스텝의 agent 실행)의 탭별 직전 목록 초기화와 사용 여부/집계 dict 지정.
+    enabled: 스텝의 dom_diff 값 (None: DOM_DIFF 전역 설정)
+    """
+    if stats is not None:
+        for k in STAT_KEYS:
+            stats.setdefault(k, 0)
+    _state.set({"enabled": DOM_DIFF_ENABLED if enabled is None else enabled, "stats": stats, "tabs": {}})
+
+
+def reset() -> None:
+    """새 Agent가 같은 스텝을 이어받을 때 (직전 목록을 본 적 없으므로 전체 전송부터)"""
+    st = _state.get()
+    if st is not None:
+        st["tabs"].clear()
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> str:
+    if not stats or not stats.get("dom_diff"):
+        return ""
+    sent, saved = stats["dom_chars_sent"], stats["dom_chars_saved"]
+    ratio = saved / (sent + saved) if sent + saved else 0.0
+    return (f"🧩 DOM 변경분 전송 {stats['dom_diff']}회 / 전체 {stats['dom_full']}회: "
+            f"요소 목록 {ratio:.0%} 절감 (약 {saved // CHARS_PER_TOKEN}토큰)")
+
+
+def dom_diff_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    total = stats["chars_sent"] + stats["chars_saved"]
+    stats["saved_ratio"] = round(stats["chars_saved"] / total, 4) if total else 0.0
+    stats["tokens_saved_est"] = stats["chars_saved"] // CHARS_PER_TOKEN
+    stats["enabled"] = DOM_DIFF_ENABLED
+    return stats
+
+
+# ====== 비교 ======
+def _key(line: str) -> str:
+    """요소 번호와 새 요소 표시(*)를 뺀 비교용 줄"""
+    m = _INDEX_RE.match(line)
+    return m.group(1) + "[]" + line[m.end():] if m else line
+
+
+def _index(line: str) -> Optional[str]:
+    m = _INDEX_RE.match(line)
+    return m.group(2) if m else None
+
+
+def _label(lines: List[str], pos: int) -> str:
+    """요소 줄 → "[번호]<태그> 짧은 텍스트" (텍스트: 태그 안 → 바로 아래 텍스트 줄 → 속성 순)"""
+    line = lines[pos]
+    m = _INDEX_RE.match(line)
+    rest = line[m.end():]
+    tag = _TAG_RE.match(rest)
+    text = _MARKUP_RE.sub(" ", rest[tag.end():] if tag else rest).strip()
+    if not text and pos + 1 < len(lines) and _index(lines[pos + 1]) is None:
+        text = lines[pos + 1].strip()
+    if not text and tag:
+        text = tag.group(2).strip().rstrip("/").strip()
+    text = " ".join(text.split())
+    if len(text) > DOM_DIFF_LABEL_CHARS:
+        text = text[:DOM_DIFF_LABEL_CHARS - 1] + "…"
+    head = f"[{m.group(2)}]<{tag.group(1)}>" if tag else f"[{m.group(2)}]"
+    return f"{head} {text}" if text else head
+
+
+def _collapse(lines: List[str], start: int, end: int) -> List[str]:
+    """변경 없는 구간 lines[start:end] → 안내 한 줄 + 요소마다 짧은 라벨 (요소 번호는 현재 번호)"""
+    elements = [pos for pos in range(start, end) if _index(lines[pos]) is not None]
+    labels = [_label(lines, pos) for pos in elements]
+    indent = re.match(r"\s*", lines[elements[0] if elements else start]).group(0)
+    return [f"{indent}[... {len(labels)} elements unchanged since the previous step, shown shortened; indices are valid ...]",
+            *(indent + label for label in labels)]
+
+
+def render_diff(previous: List[str], current: List[str]) -> Tuple[str, int]:
+    """직전 목록과 비교해 변경 없는 긴 구간을 접은 텍스트 → (텍스트, 접은 구간 수)"""
+    matcher = difflib.SequenceMatcher(None, [_key(x) for x in previous], [_key(x) for x in current], autojunk=False)
+    out: List[str] = []
+    runs = 0
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag == "equal" and j2 - j1 >= DOM_DIFF_MIN_RUN:
+            # 구간 앞뒤 한 줄은 남겨 바뀐 부분의 위치를 알 수 있게
+            out.append(current[j1])
+            out.extend(_collapse(current, j1 + 1, j2 - 1))
+            out.append(current[j2 - 1])
+            runs += 1
+        elif tag != "delete":
+            out.extend(current[j1:j2])
+    return "\n".join(out), runs
+
+
+# ====== 메시지 ======
+def _text_parts(message) -> List[Tuple[Optional[int], str]]:
+    """(파트 인덱스 또는 None(문자열 content), 텍스트)"""
+    content = getattr(message, "content", None)
+    if isinstance(content, str):
+        return [(None, content)]
+    if isinstance(content, list):
+        return [(i, p.text) for i, p in enumerate(content) if isinstance(getattr(p, "text", None), str)]
+    return []
+
+
+def _find_block(messages) -> Optional[Tuple[int, Optional[int], str, int, int]]:
+    """마지막 상태 메시지의 요소 목록 위치 (메시지 인덱스, 파트 인덱스, 텍스트, 시작, 끝)"""
+    for mi in range(len(messages) - 1, -1, -1):
+        for pi, text in _text_parts(messages[mi]):
+            start = _BLOCK_START_RE.search(text)
+            if start is None:
+                continue
+            end = _BLOCK_END_RE.search(text, start.end())
+            return mi, pi, text, start.end(), end.start() if end else len(text)
+    return None
+
+
+def _replace_text(messages, mi: int, pi: Optional[int], text: str):
+    message = messages[mi]
+    if pi is None:
+        new = message.model_copy(update={"content": text})
+    else:
+        parts = list(message.content)
+        parts[pi] = parts[pi].model_copy(update={"text": text})
+        new = message.model_copy(update={"content": parts})
+    messages = list(messages)
+    messages[mi] = new
+    return messages
+
+
+def _tab_key(text: str) -> Tuple[str, str]:
+    """(탭 키, 현재 URL)"""
+    url = _URL_RE.search(text)
+    tab = _TAB_RE.search(text)
+    url_value = url.group(1) if url else ""
+    if tab:
+        # 새 형식: 탭 목록에서 현재 탭의 URL
+        m = re.search(r"Tab " + re.escape(tab.group(1)) + r"\S*:? (\S+)", text)
+        return tab.group(1), url_value or (m.group(1) if m else "")
+    return "", url_value
+
+
+def _record(st: Dict[str, Any], full: bool, sent: int, saved: int, runs: int) -> None:
+    with _lock:
+        _stats["full" if full else "diff"] += 1
+        _stats["chars_sent"] += sent
+        _stats["chars_saved"] += saved
+        _stats["collapsed_runs"] += runs
+    stats = st["stats"]
+    if stats is not None:
+        stats["dom_full" if full else "dom_diff"] += 1
+        stats["dom_chars_sent"] += sent
+        stats["dom_chars_saved"] += saved
+
+
+def apply(messages):
+    """요청 직전: 상태 메시지의 요소 목록을 직전 요청과의 변경분으로 줄인 메시지 (해당 없으면 그대로)"""
+    st = _state.get()
+    if st is None or not st["enabled"]:
+        return messages
+    found = _find_block(messages)
+    if found is None:
+        return messages
+    mi, pi, text, start, end = found
+    block = text[start:end]
+    lines = block.split("\n")
+    tab, url = _tab_key(text[:start])
+    # 요소 목록 밖(기록/스텝 정보)이 같으면 같은 요청의 재시도 → 전체 전송
+    fingerprint = hashlib.sha1((text[:start] + text[end:]).encode("utf-8")).hexdigest()
+    prev = st["tabs"].get(tab)
+    st["tabs"][tab] = {
+        "url": url,
+        "lines": lines,
+        "fingerprint": fingerprint,
+        "since_full": 0 if prev is None else prev["since_full"] + 1,
+    }
+    current = st["tabs"][tab]
+    if (prev is None or prev["url"] != url or prev["fingerprint"] == fingerprint
+            or current["since_full"] >= DOM_DIFF_FULL_EVERY):
+        current["since_full"] = 0
+        _record(st, True, len(block), 0, 0)
+        return messages
+    diffed, runs = render_diff(prev["lines"], lines)
+    if runs == 0 or len(diffed) > len(block) * (1 - DOM_DIFF_MIN_SAVING):
+        _record(st, True, len(block), 0, 0)
+        return messages
+    _record(st, False, len(diffed), len(block) - len(diffed), runs)
+    return _replace_text(messages, mi, pi, text[:start] + diffed + text[end:])
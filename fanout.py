@@ -0,0 +1,181 @@
+# fanout.py
+# foreach 스텝: 앞선 스텝 출력에서 뽑은 목록의 항목마다 agent를 따로 실행하는 팬아웃.
+# - 항목 목록: 앞선 스텝 출력의 JSON 배열(extract 스텝 등) → 글머리/번호 목록 → URL → 줄 (또는 YAML 리스트)
+# - 항목마다 세션과 같은 로그인 상태(쿠키 + localStorage)를 넣은 전용 브라우저 세션의 탭을 열고,
+#   항목에 URL이 있으면 agent 시작 전에 그 페이지로 바로 이동 (허용 도메인만)
+# - 동시 실행 수는 step_scheduler 와 같은 세마포어 상한 (스텝 max_parallel > 스크립트 max_parallel)
+# - 결과는 실행 완료 순서와 무관하게 항목 순서대로 합친다
+# 항목 수/실패/동시 실행으로 줄인 시간은 fanout_stats()에 남는다.
+import re
+import json
+import threading
+from typing import Dict, Any, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import net_profiles
+import page_ready
+from browser_support import step_page, storage_state
+
+# ====== 설정 및 상수 ======
+URL_KEYS = ("url", "href", "link", "webUrl")
+NAV_TIMEOUT_MS = 25000
+
+_URL_RE = re.compile(r"https?://[^\s<>\"')\]]+")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+?)\s*$")
+
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {"runs": 0, "items": 0, "failed": 0, "navigated": 0, "wall_s_total": 0.0, "item_s_total": 0.0}
+
+
+# ====== 항목 목록 ======
+def _json_list(text: str) -> Optional[List[Any]]:
+    """텍스트 안 첫 번째 비어 있지 않은 JSON 배열"""
+    decoder = json.JSONDecoder()
+    for m in re.finditer(r"\[", text):
+        try:
+            value, _ = decoder.raw_decode(text, m.start())
+        except ValueError:
+            continue
+        if isinstance(value, list) and value and not all(isinstance(v, (int, float)) for v in value):
+            return [v for v in value if v not in (None, "", {})]
+    return None
+
+
+def extract_items(text: str) -> List[Any]:
+    """스텝 출력 → 항목 목록 (JSON 배열 > 글머리/번호 목록 > URL > 비어 있지 않은 줄)"""
+    text = str(text or "")
+    items = _json_list(text)
+    if items:
+        return items
+    lines = text.splitlines()
+    bullets = [m.group(1) for m in (_BULLET_RE.match(line) for line in lines) if m]
+    if bullets:
+        return bullets
+    urls = list(dict.fromkeys(u.rstrip(".,;") for u in _URL_RE.findall(text)))
+    if urls:
+        return urls
+    return [line.strip() for line in lines if line.strip()]
+
+
+def resolve_items(rule, outputs: List[Dict[str, Any]]) -> List[Any]:
+    """foreach 규칙 → 항목 목록 (최대 rule.max_items 개). 원본 스텝은 가장 최근 출력 사용"""
+    if rule.source is None:
+        items = list(rule.items)
+    else:
+        record = next((o for o in reversed(outputs) if o.get("step") == rule.source), None)
+        if record is None:
+            return []
+        items = extract_items(record.get("final") or record.get("output", ""))
+    return items[:rule.max_items]
+
+
+def final_text(result: Any) -> str:
+    """agent 결과의 최종 답변 (AgentHistoryList.final_result(), 없으면 문자열)"""
+    final = getattr(result, "final_result", None)
+    if callable(final):
+        try:
+            value = final()
+            if value:
+                return str(value)
+        except Exception:
+            pass
+    return str(result)
+
+
+def item_text(item: Any) -> str:
+    """task 의 {item} 에 넣을 문자열 (객체는 "키: 값" 나열)"""
+    if isinstance(item, dict):
+        return ", ".join(f"{k}: {v}" for k, v in item.items() if v not in (None, ""))
+    return str(item)
+
+
+def item_url(item: Any, base_url: str = "") -> Optional[str]:
+    """항목이 가리키는 페이지 (객체의 url/href/link 또는 텍스트 안 첫 URL, 상대 경로는 현재 페이지 기준)"""
+    if isinstance(item, dict):
+        for key in URL_KEYS:
+            if isinstance(item.get(key), str) and item[key].strip():
+                url = item[key].strip()
+                return urljoin(base_url, url) if base_url else url
+        item = " ".join(str(v) for v in item.values())
+    m = _URL_RE.search(str(item))
+    return m.group(0).rstrip(".,;") if m else None
+
+
+def merge(items: List[Any], results: List[str]) -> str:
+    """항목 순서대로 결과 합치기"""
+    blocks = [f"### [{i}] {item_text(item)}\n{result}" for i, (item, result) in enumerate(zip(items, results), start=1)]
+    return "\n\n".join(blocks)
+
+
+# ====== 항목 탭 ======
+async def session_state(browser) -> Optional[Dict[str, Any]]:
+    """세션 공유 BrowserSession 의 storage state (항목 세션에 같은 로그인 상태를 넣기 위해)"""
+    return await storage_state(browser)
+
+
+def _allowed(context, url: str) -> bool:
+    domains = getattr(getattr(context, "browser_profile", None), "allowed_domains", None)
+    if not domains:
+        return True
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == d.lower() or host.endswith("." + d.lower().lstrip("*.")) for d in domains)
+
+
+async def prepare_item(context, url: Optional[str], profile: Optional[str],
+                       stats: Optional[Dict[str, Any]] = None) -> None:
+    """항목 전용 BrowserSession(로그인 상태는 step_scheduler 가 복원): 요청 차단 프로필 + 항목 URL로 이동"""
+    page = await step_page(context)
+    if page is None:
+        return
+    await net_profiles.prepare_context(context, profile, stats)
+    if not url or not _allowed(context, url):
+        return
+    page_ready.track(page)
+    try:
+        await page.goto(url, wait_until="domcontentloaded", timeout=NAV_TIMEOUT_MS)
+    except Exception:
+        return
+    await page_ready.wait_ready(page, stats)
+    with _lock:
+        _stats["navigated"] += 1
+
+
+# ====== 집계 ======
+def combine(stats_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """항목별 집계 dict → 스텝 합계 (숫자만 더함, 목록은 이어 붙임, 문자열(프로필/경고)은 첫 값)"""
+    total: Dict[str, Any] = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                total[key] = total.get(key, 0) + value
+            elif isinstance(value, list):
+                total.setdefault(key, []).extend(value)
+            elif isinstance(value, str):
+                total.setdefault(key, value)
+    return total
+
+
+def record(items: int, failed: int, wall_s: float, item_s: float) -> None:
+    with _lock:
+        _stats["runs"] += 1
+        _stats["items"] += items
+        _stats["failed"] += failed
+        _stats["wall_s_total"] += wall_s
+        _stats["item_s_total"] += item_s
+
+
+def summarize(items: int, failed: int, wall_s: float, item_s: float, max_parallel: int) -> str:
+    tail = f", 실패 {failed}개" if failed else ""
+    return (f"🔀 항목 {items}개를 동시 {max_parallel}개씩 처리: {wall_s:.1f}초 "
+            f"(항목 실행 합계 {item_s:.1f}초{tail})")
+
+
+def fanout_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    stats["speedup"] = round(stats["item_s_total"] / stats["wall_s_total"], 2) if stats["wall_s_total"] else 0.0
+    stats["wall_s_total"] = round(stats["wall_s_total"], 3)
+    stats["item_s_total"] = round(stats["item_s_total"], 3)
+    return stats
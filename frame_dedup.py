@@ -0,0 +1,185 @@
+# frame_dedup.py
+# 연속된 agent 액션 사이에 화면이 사실상 바뀌지 않았을 때 비전 추론을 건너뛰는 지각 해시(dHash) 계층.
+# llm_pool.PooledChatOllama.ainvoke 가 요청마다 마지막 스크린샷의 dHash를 직전 프레임과 비교한다.
+# - reuse : 직전 모델 응답을 그대로 재사용 (연속 재사용 횟수 상한)
+# - wait  : 화면이 바뀔 때까지(최대 FRAME_DEDUP_WAIT_S) 페이지를 다시 찍어 보고, 새 스크린샷으로 추론
+# - auto  : 직전 응답이 대기/스크롤뿐이면 reuse, 아니면 wait (같은 클릭을 맹목적으로 반복하지 않음)
+# - off   : 사용 안 함
+# 스텝별로 건너뛴 횟수와 절약 시간을 집계한다 (script_runner 가 실행 로그에 기록).
+import os
+import io
+import time
+import base64
+import asyncio
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+from browser_support import current_page
+
+# ====== 설정 및 상수 ======
+FRAME_DEDUP_MODE = os.environ.get("FRAME_DEDUP_MODE", "auto").lower()
+FRAME_DEDUP_DISTANCE = int(os.environ.get("FRAME_DEDUP_DISTANCE", "4"))   # 64비트 중 허용 해밍 거리
+FRAME_DEDUP_WAIT_S = float(os.environ.get("FRAME_DEDUP_WAIT_S", "3"))
+FRAME_DEDUP_MAX_REUSE = int(os.environ.get("FRAME_DEDUP_MAX_REUSE", "2"))
+POLL_INTERVAL_S = 0.5
+
+# auto 모드에서 재사용해도 안전한(페이지 상태를 바꾸지 않는) 액션
+SAFE_REUSE_ACTIONS = {"wait", "scroll", "scroll_down", "scroll_up"}
+
+STAT_KEYS = ("frames", "similar", "reused", "waited", "wait_s", "saved_s")
+
+_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("frame_dedup_state", default=None)
+
+
+def start_step(browser=None, stats: Optional[Dict[str, Any]] = None) -> None:
+    """
+    현재 컨텍스트(= 이 스텝의 agent 실행)의 직전 프레임 상태 초기화.
+    browser: Agent(browser_session=...)에 넘긴 세션 (wait/auto 모드에서 화면을 다시 찍을 대상)
+    """
+    if stats is not None:
+        for k in STAT_KEYS:
+            stats.setdefault(f"dedup_{k}", 0)
+    _state.set({"browser": browser, "stats": stats, "hash": None, "response": None, "latency": 0.0, "reuses": 0})
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> str:
+    if not stats or not (stats.get("dedup_reused") or stats.get("dedup_waited")):
+        return ""
+    return (
+        f"♻ 중복 화면 {stats['dedup_similar']}회: 응답 재사용 {stats['dedup_reused']}회"
+        f"(약 {stats['dedup_saved_s']:.1f}초 절약), 변화 대기 {stats['dedup_waited']}회({stats['dedup_wait_s']:.1f}초)"
+    )
+
+
+# ====== dHash ======
+def dhash(data: bytes) -> Optional[int]:
+    """9x8 흑백 축소 후 인접 픽셀 밝기 비교 → 64비트 해시"""
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data)).convert("L").resize((9, 8), Image.BILINEAR)
+    except Exception:
+        return None
+    px = list(img.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return value
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# ====== 메시지 내 스크린샷 ======
+def _last_image(messages) -> Optional[Tuple[int, int, str]]:
+    """가장 마지막 data URL 이미지 위치 (메시지 인덱스, 파트 인덱스, url)"""
+    for mi in range(len(messages) - 1, -1, -1):
+        content = getattr(messages[mi], "content", None)
+        if not isinstance(content, list):
+            continue
+        for pi in range(len(content) - 1, -1, -1):
+            url = getattr(getattr(content[pi], "image_url", None), "url", None)
+            if isinstance(url, str) and url.startswith("data:image"):
+                return mi, pi, url
+    return None
+
+
+def _replace_image(messages, where: Tuple[int, int, str], png: bytes):
+    mi, pi, _ = where
+    message = messages[mi]
+    part = message.content[pi]
+    update = {"url": "data:image/png;base64," + base64.b64encode(png).decode("ascii")}
+    if hasattr(part.image_url, "media_type"):
+        update["media_type"] = "image/png"
+    parts = list(message.content)
+    parts[pi] = part.model_copy(update={"image_url": part.image_url.model_copy(update=update)})
+    messages = list(messages)
+    messages[mi] = message.model_copy(update={"content": parts})
+    return messages
+
+
+def _action_names(response) -> set:
+    names = set()
+    for action in getattr(getattr(response, "completion", None), "action", None) or []:
+        try:
+            names.update(action.model_dump(exclude_none=True, exclude_unset=True).keys())
+        except Exception:
+            names.add("?")
+    return names
+
+
+async def _wait_for_change(page, previous: int) -> Optional[Tuple[bytes, int]]:
+    """화면이 바뀔 때까지 페이지를 다시 찍음 → (png, hash) 또는 None(시간 초과)"""
+    deadline = time.perf_counter() + FRAME_DEDUP_WAIT_S
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(POLL_INTERVAL_S)
+        try:
+            png = await page.screenshot(type="png")
+        except Exception:
+            return None
+        h = dhash(png)
+        if h is not None and distance(h, previous) > FRAME_DEDUP_DISTANCE:
+            return png, h
+    return None
+
+
+# ====== LLM 호출 전후 ======
+async def before_inference(messages):
+    """
+    → (messages, 재사용할 응답 또는 None).
+    응답이 None 이 아니면 호출부는 추론 없이 그 응답을 반환한다.
+    """
+    st = _state.get()
+    if st is None or FRAME_DEDUP_MODE == "off" or Image is None:
+        return messages, None
+    where = _last_image(messages)
+    if where is None:
+        return messages, None
+    try:
+        h = dhash(base64.b64decode(where[2].partition(",")[2]))
+    except Exception:
+        h = None
+    if h is None:
+        return messages, None
+
+    stats = st["stats"] if st["stats"] is not None else {f"dedup_{k}": 0 for k in STAT_KEYS}
+    stats["dedup_frames"] += 1
+    if st["hash"] is not None and distance(h, st["hash"]) <= FRAME_DEDUP_DISTANCE:
+        stats["dedup_similar"] += 1
+        prev = st["response"]
+        can_reuse = prev is not None and st["reuses"] < FRAME_DEDUP_MAX_REUSE and (
+            FRAME_DEDUP_MODE == "reuse"
+            or (FRAME_DEDUP_MODE == "auto" and _action_names(prev) and _action_names(prev) <= SAFE_REUSE_ACTIONS)
+        )
+        if can_reuse:
+            st["reuses"] += 1
+            stats["dedup_reused"] += 1
+            stats["dedup_saved_s"] = round(stats["dedup_saved_s"] + st["latency"], 2)
+            return messages, prev
+        page = await current_page(st["browser"]) if FRAME_DEDUP_MODE in ("wait", "auto") else None
+        if page is not None:
+            started = time.perf_counter()
+            fresh = await _wait_for_change(page, st["hash"])
+            stats["dedup_waited"] += 1
+            stats["dedup_wait_s"] = round(stats["dedup_wait_s"] + time.perf_counter() - started, 2)
+            if fresh is not None:
+                # 화면 변화 후의 새 스크린샷으로 추론 (DOM 텍스트는 직전 상태 기준)
+                messages = _replace_image(messages, where, fresh[0])
+                h = fresh[1]
+    st["hash"] = h
+    st["reuses"] = 0
+    return messages, None
+
+
+def after_inference(response, latency_s: float) -> None:
+    st = _state.get()
+    if st is not None:
+        st["response"] = response
+        st["latency"] = latency_s
@@ -24,7 +24,11 @@ os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")
 
 import yaml
 import streamlit as st
-from browser_use import Agent, ChatOllama
+from browser_use import Agent
+
+from async_engine import get_engine, get_job
+from llm_pool import get_llm, start_warmup
+from prompt_prefix import agent_prompt_kwargs
 
 # 브라우저 설정
 Browser = BrowserConfig = BrowserContextConfig = None
@@ -239,8 +243,8 @@ def read_file(filename: str) -> str:
 
 # ====== 실행 엔진 ======
 def make_llm():
-    """LLM 생성"""
-    return ChatOllama(model="llama3.2-vision")
+    """LLM (프로세스 공유 클라이언트 풀)"""
+    return get_llm()
 
 def make_browser():
     """브라우저 생성"""
@@ -265,14 +269,14 @@ def make_browser():
         return Browser(config=cfg)
     return None
 
-def run_computer_use_task(task: str, progress_callback=None) -> Tuple[str, bool, str]:
+async def run_computer_use_task_async(task: str, progress_callback=None) -> Tuple[str, bool, str]:
     """Computer Use 작업 실행"""
     try:
         if progress_callback:
             progress_callback("🤖 AI 에이전트 초기화 중...")
         
-        # 안전 프리앰블 추가
-        full_task = SAFETY_PREAMBLE + "\n\n" + task
+        # 안전 프리앰블은 시스템 프롬프트 슬롯에 (요청 간 공통 접두부 → Ollama KV 캐시 재사용)
+        prompt_kwargs = agent_prompt_kwargs(Agent, SAFETY_PREAMBLE, task)
         
         if progress_callback:
             progress_callback("🌐 시스템 정보 수집 중...")
@@ -305,14 +309,14 @@ def run_computer_use_task(task: str, progress_callback=None) -> Tuple[str, bool,
         
         # 에이전트 실행
         agent = Agent(
-            task=full_task,
+            **prompt_kwargs,
             llm=llm,
             use_vision=True,
             browser=browser,
         )
         
         # 실제 실행 (타임아웃 설정)
-        result = agent.run_sync(max_steps=3)
+        result = await agent.run(max_steps=3)
         
         if progress_callback:
             progress_callback("✅ 작업 완료!")
@@ -335,6 +339,13 @@ def run_computer_use_task(task: str, progress_callback=None) -> Tuple[str, bool,
             progress_callback(error_msg)
         return error_msg, False, ""
 
+def run_computer_use_task(task: str, progress_callback=None) -> Tuple[str, bool, str]:
+    """동기 호출부 호환: 실행 엔진에 제출 후 완료까지 대기"""
+    return get_engine().run(run_computer_use_task_async, task, progress_callback)
+
+# 모델 미리 로드 (Streamlit 재실행마다 호출되지만 프로세스당 1회만 수행)
+start_warmup()
+
 # ====== Streamlit UI ======
 st.set_page_config(
     page_title="Computer Use - 완전한 시스템 자동화 AI",
@@ -416,6 +427,10 @@ with col1:
     
     with col_stop:
         if st.button("⏹️ 중지", disabled=not st.session_state.is_running):
+            job = get_job(st.session_state.get('job_id'))
+            if job:
+                job.cancel()
+            st.session_state.job_id = None
             st.session_state.is_running = False
             st.session_state.waiting_for_user = False
             st.rerun()
@@ -459,19 +474,30 @@ with col2:
         st.info("실행 로그가 여기에 표시됩니다.")
 
 # 실행 로직
+# 작업은 실행 엔진에 제출하고 핸들만 세션에 보관 → 재실행(rerun)마다 진행 메시지/완료 여부를 폴링
 if st.session_state.is_running and not st.session_state.waiting_for_user:
     if user_prompt:
-        # 진행 상황 콜백
-        def progress_callback(message):
+        job = get_job(st.session_state.get('job_id'))
+        if job is None:
+            # Computer Use 실행
+            job = get_engine().submit(run_computer_use_task_async, user_prompt, progress=True)
+            st.session_state.job_id = job.job_id
+        
+        # 진행 상황 로그 반영
+        for message in job.drain_progress():
             st.session_state.execution_log.append({
                 "type": "info",
                 "message": message,
                 "timestamp": datetime.now().strftime("%H:%M:%S")
             })
         
-        # Computer Use 실행
+        if not job.done():
+            time.sleep(1)
+            st.rerun()
+        
+        st.session_state.job_id = None
         try:
-            result, waiting, wait_msg = run_computer_use_task(user_prompt, progress_callback)
+            result, waiting, wait_msg = job.result()
             
             # 결과 로그 추가
             st.session_state.execution_log.append({
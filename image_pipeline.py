@@ -0,0 +1,263 @@
+# image_pipeline.py
+# 비전 LLM에 보내기 전 스크린샷 전처리: 긴 변 기준 축소, 뷰포트/관심 영역 크롭, 흑백, JPEG/WebP 재인코딩.
+# - llm_pool.PooledChatOllama 가 요청 메시지의 data URL 이미지에 자동 적용
+# - 전역 설정(환경변수) → 스크립트 최상위 image: → 스텝 image: 순으로 덮어씀
+# - 호출마다 절감된 바이트/추정 이미지 토큰을 전역 및 스텝별로 집계
+# Pillow가 없으면 원본 그대로 통과한다.
+import os
+import io
+import base64
+import math
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Optional, Tuple, Union
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+# ====== 설정 및 상수 ======
+IMAGE_FORMATS = ("jpeg", "webp", "png")
+VIEWPORT_HEIGHT = int(os.environ.get("IMAGE_VIEWPORT_HEIGHT", "1100"))  # BrowserContextConfig 기본 창 높이
+
+# llama3.2-vision 이미지 토큰 추정: 560px 타일당 1601 토큰, 최대 4타일
+_TILE = 560
+_TOKENS_PER_TILE = 1601
+_MAX_TILES = 4
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    enabled: bool = True
+    max_edge: int = 1024                # 0 = 축소 안 함
+    crop: Optional[Tuple[float, float, float, float]] = None  # (x, y, w, h), 1 이하 값은 비율
+    viewport_height: int = 0            # > 0 이면 위에서부터 이 높이까지만 (전체 페이지 → 뷰포트)
+    grayscale: bool = False
+    format: str = "jpeg"
+    quality: int = 70
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default) not in ("0", "false", "False", "")
+
+
+def parse_options(spec: Any, base: Optional[ImageOptions] = None) -> ImageOptions:
+    """
+    YAML image: 블록 → ImageOptions (base 위에 덮어씀).
+    image: false | {max_edge, crop: viewport | [x, y, w, h], grayscale, format, quality}
+    잘못된 값은 ValueError.
+    """
+    base = base or DEFAULT_OPTIONS
+    if spec is None:
+        return base
+    if spec is False:
+        return replace(base, enabled=False)
+    if spec is True:
+        return replace(base, enabled=True)
+    if not isinstance(spec, dict):
+        raise ValueError("image는 true/false 또는 매핑이어야 합니다.")
+
+    changes: Dict[str, Any] = {"enabled": bool(spec.get("enabled", True))}
+    if "max_edge" in spec:
+        changes["max_edge"] = int(spec["max_edge"] or 0)
+    if "grayscale" in spec:
+        changes["grayscale"] = bool(spec["grayscale"])
+    if "format" in spec:
+        fmt = str(spec["format"]).lower().replace("jpg", "jpeg")
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"image.format은 {list(IMAGE_FORMATS)} 중 하나여야 합니다.")
+        changes["format"] = fmt
+    if "quality" in spec:
+        q = int(spec["quality"])
+        if not 1 <= q <= 100:
+            raise ValueError("image.quality는 1~100 사이여야 합니다.")
+        changes["quality"] = q
+    if "crop" in spec:
+        crop = spec["crop"]
+        if crop in (None, False, "none"):
+            changes["crop"], changes["viewport_height"] = None, 0
+        elif crop == "viewport":
+            changes["crop"], changes["viewport_height"] = None, VIEWPORT_HEIGHT
+        elif isinstance(crop, (list, tuple)) and len(crop) == 4:
+            changes["crop"], changes["viewport_height"] = tuple(float(v) for v in crop), 0
+        else:
+            raise ValueError("image.crop은 viewport 또는 [x, y, w, h] 여야 합니다.")
+    return replace(base, **changes)
+
+
+def _env_options() -> ImageOptions:
+    crop = os.environ.get("IMAGE_CROP", "").strip()
+    spec: Dict[str, Any] = {
+        "enabled": _env_flag("IMAGE_PREPROCESS", "1"),
+        "max_edge": int(os.environ.get("IMAGE_MAX_EDGE", "1024")),
+        "grayscale": _env_flag("IMAGE_GRAYSCALE", "0"),
+        "format": os.environ.get("IMAGE_FORMAT", "jpeg"),
+        "quality": int(os.environ.get("IMAGE_QUALITY", "70")),
+    }
+    if crop:
+        spec["crop"] = crop if crop == "viewport" else [float(v) for v in crop.split(",")]
+    return parse_options(spec, ImageOptions())
+
+
+DEFAULT_OPTIONS = _env_options()
+
+
+# ====== 스텝별 설정 (컨텍스트 변수) ======
+_current_options: ContextVar[Optional[ImageOptions]] = ContextVar("image_options", default=None)
+_current_stats: ContextVar[Optional[Dict[str, int]]] = ContextVar("image_stats", default=None)
+
+
+def new_stats() -> Dict[str, int]:
+    return {"calls": 0, "images": 0, "bytes_before": 0, "bytes_after": 0, "tokens_before": 0, "tokens_after": 0}
+
+
+def use_options(options: Optional[ImageOptions], stats: Optional[Dict[str, int]] = None) -> None:
+    """현재 컨텍스트(= 이 스텝의 agent 실행)에서 쓸 설정과 집계 dict 지정"""
+    _current_options.set(options)
+    _current_stats.set(stats)
+
+
+_global_lock = threading.Lock()
+_global_stats = new_stats()
+
+
+def image_stats() -> Dict[str, int]:
+    """프로세스 전체 집계"""
+    with _global_lock:
+        return dict(_global_stats)
+
+
+def summarize(stats: Optional[Dict[str, int]]) -> str:
+    """집계 → 한 줄 요약 (이미지가 없으면 빈 문자열)"""
+    if not stats or not stats.get("images"):
+        return ""
+    kb = lambda b: f"{b / 1024:.0f}KB"
+    return (
+        f"🖼 이미지 {stats['images']}장: {kb(stats['bytes_before'])} → {kb(stats['bytes_after'])}, "
+        f"토큰(추정) {stats['tokens_before']} → {stats['tokens_after']}"
+    )
+
+
+# ====== 처리 ======
+def estimate_tokens(width: int, height: int) -> int:
+    tiles = min(math.ceil(width / _TILE) * math.ceil(height / _TILE), _MAX_TILES)
+    return max(tiles, 1) * _TOKENS_PER_TILE
+
+
+def _crop_box(img, options: ImageOptions):
+    w, h = img.size
+    if options.crop:
+        x, y, cw, ch = options.crop
+        if max(x, y, cw, ch) <= 1:
+            x, y, cw, ch = x * w, y * h, cw * w, ch * h
+        return int(x), int(y), int(min(x + cw, w)), int(min(y + ch, h))
+    if options.viewport_height and h > options.viewport_height:
+        return 0, 0, w, options.viewport_height
+    return None
+
+
+def process_image(image: Union[bytes, Any], options: Optional[ImageOptions] = None) -> Tuple[bytes, str, Dict[str, int]]:
+    """
+    이미지(bytes 또는 PIL Image) → (처리된 bytes, MIME 타입, 보고서).
+    비활성/Pillow 없음/처리 결과가 더 크면 원본 bytes를 그대로 반환한다.
+    """
+    options = options or DEFAULT_OPTIONS
+    if Image is None or not options.enabled:
+        data = image if isinstance(image, bytes) else b""
+        return data, "image/png", {"bytes_before": len(data), "bytes_after": len(data), "tokens_before": 0, "tokens_after": 0}
+
+    if isinstance(image, bytes):
+        original = image
+        img = Image.open(io.BytesIO(image))
+    else:
+        img = image
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        original = buf.getvalue()
+    tokens_before = estimate_tokens(*img.size)
+
+    box = _crop_box(img, options)
+    if box:
+        img = img.crop(box)
+    if options.max_edge and max(img.size) > options.max_edge:
+        scale = options.max_edge / max(img.size)
+        img = img.resize((max(int(img.width * scale), 1), max(int(img.height * scale), 1)), Image.LANCZOS)
+    if options.grayscale:
+        img = img.convert("L")
+    elif options.format == "jpeg" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buf = io.BytesIO()
+    save_kwargs = {"quality": options.quality} if options.format in ("jpeg", "webp") else {"optimize": True}
+    img.save(buf, format=options.format.upper(), **save_kwargs)
+    data = buf.getvalue()
+    report = {
+        "bytes_before": len(original),
+        "bytes_after": len(data),
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_tokens(*img.size),
+    }
+    if len(data) >= len(original) and not box and report["tokens_after"] == tokens_before:
+        return original, "image/png", {**report, "bytes_after": len(original)}
+    return data, f"image/{options.format}", report
+
+
+def _record(report: Dict[str, int], step_stats: Optional[Dict[str, int]]) -> None:
+    targets = [_global_stats] + ([step_stats] if step_stats is not None else [])
+    with _global_lock:
+        for stats in targets:
+            stats["images"] += 1
+            for k in ("bytes_before", "bytes_after", "tokens_before", "tokens_after"):
+                stats[k] += report[k]
+
+
+def _process_data_url(url: str, options: ImageOptions, step_stats) -> Tuple[str, str]:
+    header, _, payload = url.partition(",")
+    try:
+        raw = base64.b64decode(payload)
+        data, mime, report = process_image(raw, options)
+    except Exception:
+        return url, header[5:].split(";")[0]
+    _record(report, step_stats)
+    if data is raw:
+        return url, header[5:].split(";")[0]
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}", mime
+
+
+def preprocess_messages(messages):
+    """
+    LLM 요청 메시지의 data URL 이미지(ContentPartImageParam)를 현재 설정으로 전처리.
+    원본 메시지(Agent 대화 기록)는 수정하지 않고 사본을 반환한다.
+    """
+    options = _current_options.get() or DEFAULT_OPTIONS
+    step_stats = _current_stats.get()
+    with _global_lock:
+        _global_stats["calls"] += 1
+        if step_stats is not None:
+            step_stats["calls"] += 1
+    if Image is None or not options.enabled:
+        return messages
+
+    out = []
+    for message in messages:
+        content = getattr(message, "content", None)
+        if not isinstance(content, list):
+            out.append(message)
+            continue
+        parts, changed = [], False
+        for part in content:
+            image_url = getattr(part, "image_url", None)
+            url = getattr(image_url, "url", None)
+            if isinstance(url, str) and url.startswith("data:image"):
+                new_url, mime = _process_data_url(url, options, step_stats)
+                if new_url != url:
+                    update = {"url": new_url}
+                    if hasattr(image_url, "media_type"):
+                        update["media_type"] = mime
+                    part = part.model_copy(update={"image_url": image_url.model_copy(update=update)})
+                    changed = True
+            parts.append(part)
+        out.append(message.model_copy(update={"content": parts}) if changed else message)
+    return out
@@ -0,0 +1,232 @@
+# llm_cache.py
+# LLM 응답을 디스크에 저장하는 내용 주소(content-addressed) 캐시.
+# 키 = 모델 + 출력 형식 + 정규화된 메시지(텍스트) + 첨부 이미지 바이트의 해시.
+# 같은 스크립트 재실행/재시도에서 byte 단위로 같은 요청이 오면 Ollama 호출 없이 응답을 돌려준다.
+# - 저장소: LLM_CACHE_DIR/responses.sqlite3 (배치 워커 등 여러 프로세스가 공유 가능)
+# - 전체 크기가 LLM_CACHE_MAX_MB 를 넘으면 마지막 사용 시각이 오래된 항목부터 제거 (LRU)
+# - 기본 꺼짐(LLM_CACHE=1 로 켬): 응답에는 메일/일정 내용이 그대로 들어가고 평문으로 저장되므로 명시적으로 켤 때만 사용
+# - 스텝 단위 끄기: YAML llm_cache: false
+import os
+import json
+import time
+import base64
+import hashlib
+import sqlite3
+import threading
+import weakref
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+try:
+    from browser_use.llm.views import ChatInvokeCompletion
+except Exception:
+    ChatInvokeCompletion = None
+
+# ====== 설정 및 상수 ======
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "0").lower() in ("1", "true", "on")
+LLM_CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", "./llm_cache"))
+LLM_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "512"))
+EVICT_TARGET = 0.9  # 제거 시 상한의 90%까지 줄임
+
+_step_enabled: ContextVar[bool] = ContextVar("llm_cache_enabled", default=True)
+_step_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_cache_stats", default=None)
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def use_for_step(enabled: bool = True, stats: Optional[Dict[str, Any]] = None) -> None:
+    """현재 컨텍스트(= 이 스텝의 agent 실행)의 캐시 사용 여부와 집계 dict 지정"""
+    _step_enabled.set(enabled)
+    _step_stats.set(stats)
+    if stats is not None:
+        stats.setdefault("llm_cache_hits", 0)
+        stats.setdefault("llm_cache_misses", 0)
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(LLM_CACHE_DIR / "responses.sqlite3"), check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        _conn = conn
+    return _conn
+
+
+# ====== 키 ======
+def _normalize_text(text: str) -> str:
+    return "\n".join(line.rstrip() for line in str(text).strip().splitlines())
+
+
+def _normalize_part(part) -> Any:
+    image_url = getattr(part, "image_url", None)
+    if image_url is not None:
+        url = getattr(image_url, "url", "") or ""
+        payload = url.partition(",")[2] if url.startswith("data:") else url
+        try:
+            raw = base64.b64decode(payload) if url.startswith("data:") else payload.encode("utf-8")
+        except Exception:
+            raw = payload.encode("utf-8")
+        return {"image": hashlib.sha256(raw).hexdigest()}
+    text = getattr(part, "text", None)
+    if text is not None:
+        return {"text": _normalize_text(text)}
+    return {"other": type(part).__name__}
+
+
+def cache_key(model: str, messages, output_format=None) -> str:
+    """모델 + 출력 형식 + 메시지(텍스트 정규화, 이미지는 바이트 해시)"""
+    norm = []
+    for m in messages:
+        content = getattr(m, "content", None)
+        if isinstance(content, list):
+            content = [_normalize_part(p) for p in content]
+        elif content is not None:
+            content = _normalize_text(content)
+        norm.append({"role": getattr(m, "role", type(m).__name__), "content": content})
+    material = {
+        "model": model,
+        "format": getattr(output_format, "__name__", None) if output_format is not None else None,
+        "schema": _schema_hash(output_format),
+        "messages": norm,
+    }
+    return hashlib.sha256(json.dumps(material, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+_schema_hashes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _schema_hash(output_format) -> Optional[str]:
+    """출력 스키마(사용 가능한 액션 목록 포함)가 바뀌면 다른 키 (클래스별 1회 계산)"""
+    schema = getattr(output_format, "model_json_schema", None)
+    if not callable(schema):
+        return None
+    try:
+        cached = _schema_hashes.get(output_format)
+        if cached is None:
+            cached = hashlib.sha256(json.dumps(schema(), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+            _schema_hashes[output_format] = cached
+        return cached
+    except Exception:
+        return None
+
+
+# ====== 조회/저장 ======
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] += 1
+    stats = _step_stats.get()
+    if stats is not None and name in ("hits", "misses"):
+        stats[f"llm_cache_{name}"] += 1
+
+
+def active() -> bool:
+    return LLM_CACHE_ENABLED and ChatInvokeCompletion is not None and _step_enabled.get()
+
+
+def get(key: str, output_format=None):
+    """적중 시 ChatInvokeCompletion (usage 없음), 아니면 None"""
+    try:
+        with _lock:
+            row = _db().execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                _db().execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                _db().commit()
+    except sqlite3.Error:
+        row = None
+    if row is None:
+        _count("misses")
+        return None
+    try:
+        data = json.loads(row[0])
+        if output_format is not None and data.get("structured"):
+            completion = output_format.model_validate_json(data["completion"])
+        else:
+            completion = data["completion"]
+    except Exception:
+        # 스키마가 달라 복원할 수 없는 항목은 미스로 처리
+        _count("misses")
+        return None
+    _count("hits")
+    return ChatInvokeCompletion(completion=completion, usage=None)
+
+
+def put(key: str, model: str, response) -> None:
+    completion = getattr(response, "completion", response)
+    dump = getattr(completion, "model_dump_json", None)
+    if callable(dump):
+        data = {"structured": True, "completion": dump()}
+    else:
+        data = {"structured": False, "completion": str(completion)}
+    value = json.dumps(data, ensure_ascii=False)
+    now = time.time()
+    try:
+        with _lock:
+            db = _db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses(key, model, value, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, len(value.encode("utf-8")), now, now),
+            )
+            db.commit()
+            _stats["stores"] += 1
+            _evict_locked(db)
+    except sqlite3.Error:
+        pass
+
+
+def _evict_locked(db: sqlite3.Connection) -> None:
+    limit = LLM_CACHE_MAX_MB * 1024 * 1024
+    total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= limit:
+        return
+    target = limit * EVICT_TARGET
+    removed = 0
+    for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used ASC").fetchall():
+        if total <= target:
+            break
+        db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total -= size
+        removed += 1
+    db.commit()
+    _stats["evictions"] += removed
+
+
+def llm_cache_stats() -> Dict[str, Any]:
+    """적중률 등 집계 + 저장소 크기 (캐시가 꺼졌거나 아직 열지 않았으면 저장소를 만들지 않고 0)"""
+    with _lock:
+        stats = dict(_stats)
+        entries, size = 0, 0
+        if LLM_CACHE_ENABLED and _conn is not None:
+            try:
+                entries, size = _conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            except sqlite3.Error:
+                pass
+    lookups = stats["hits"] + stats["misses"]
+    stats.update(
+        enabled=LLM_CACHE_ENABLED and ChatInvokeCompletion is not None,
+        entries=entries,
+        size_bytes=size,
+        max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+        hit_rate=round(stats["hits"] / lookups, 4) if lookups else 0.0,
+    )
+    return stats
+
+
+def clear() -> None:
+    with _lock:
+        try:
+            _db().execute("DELETE FROM responses")
+            _db().commit()
+        except sqlite3.Error:
+            pass
+        for k in _stats:
+            _stats[k] = 0
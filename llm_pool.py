@@ -0,0 +1,268 @@
+# llm_pool.py
+# 프로세스 전역 Ollama LLM 클라이언트 풀.
+# - 모델별 ChatOllama 인스턴스를 1개만 만들어 세션/작업 간에 공유
+# - 이벤트 루프마다 Ollama 엔드포인트별 AsyncClient 1개를 유지 → keep-alive HTTP 연결 재사용
+#   (기본 ChatOllama 는 호출마다 새 클라이언트 = 새 연결)
+# - OLLAMA_HOSTS 에 여러 엔드포인트를 주면 요청마다 진행 중 요청이 가장 적은 곳으로 분산 (ollama_balancer.py)
+# - 모든 chat 요청에 keep_alive 를 붙여 모델이 메모리에 상주하도록 유지
+# - 시작 시 워밍업 요청으로 모델을 미리 로드 (첫 호출의 모델 로딩 지연 제거)
+# - 동시 요청 수 상한(LLM_POOL_SIZE)과 지표(진행 중 요청, 클라이언트 대기 시간 등) 제공
+# - 요청 전 중복 화면 건너뛰기(frame_dedup.py) + DOM 변경분 전송(dom_diff.py) + 스크린샷 전처리(image_pipeline.py)
+#   + 응답 캐시(llm_cache.py)
+import os
+import copy
+import json
+import time
+import asyncio
+import threading
+import urllib.request
+import weakref
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")  # 로컬 Ollama 기본값
+
+from browser_use import ChatOllama
+
+from image_pipeline import preprocess_messages
+from frame_dedup import before_inference, after_inference
+import dom_diff
+import llm_cache
+import ollama_balancer
+import metrics
+import prompt_prefix
+
+# ====== 설정 및 상수 ======
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2-vision")
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # "-1" 이면 무기한 상주
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "4"))       # 엔드포인트당 동시 요청 상한
+LLM_WARMUP = os.environ.get("LLM_WARMUP", "1") not in ("0", "false", "False")
+WARMUP_TIMEOUT_S = 600  # CPU 환경에서 대형 비전 모델 로딩은 수 분 걸릴 수 있음
+
+
+def _keep_alive_value(value: str):
+    """'-1', '0' 같은 숫자 문자열은 정수로 (Ollama API 규격)"""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+# ====== 지표 ======
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, Any] = {
+    "requests": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "waiting": 0,
+    "wait_s_total": 0.0,
+    "wait_s_max": 0.0,
+    "latency_s_total": 0.0,
+    "clients_created": 0,
+    "dedup_skipped": 0,
+    "retries": 0,
+    "warmup": "pending",
+    "warmup_s": None,
+}
+
+
+def _update(**delta) -> None:
+    with _metrics_lock:
+        for k, v in delta.items():
+            _metrics[k] += v
+
+
+def pool_stats() -> Dict[str, Any]:
+    """풀 지표 스냅샷 (평균값 포함)"""
+    with _metrics_lock:
+        stats = dict(_metrics)
+    done = max(stats["requests"], 1)
+    stats["size"] = LLM_POOL_SIZE * len(ollama_balancer.hosts())
+    stats["model"] = OLLAMA_MODEL
+    stats["keep_alive"] = OLLAMA_KEEP_ALIVE
+    stats["wait_s_avg"] = round(stats["wait_s_total"] / done, 4)
+    stats["latency_s_avg"] = round(stats["latency_s_total"] / done, 4)
+    stats["balancer"] = ollama_balancer.balancer_stats()
+    return stats
+
+
+# ====== 루프별 공유 클라이언트 ======
+class _KeepAliveClient:
+    """ollama AsyncClient 래퍼: chat 요청에 keep_alive 기본값 주입 + 응답의 토큰/접두부 재사용 집계"""
+
+    def __init__(self, client, keep_alive, host: str = ""):
+        self._client = client
+        self._keep_alive = keep_alive
+        self._host = host
+
+    async def chat(self, *args, **kwargs):
+        kwargs.setdefault("keep_alive", self._keep_alive)
+        response = await self._client.chat(*args, **kwargs)
+        if not kwargs.get("stream"):
+            model = kwargs.get("model", "")
+            usage = prompt_prefix.observe(self._host, model, kwargs.get("messages"), response)
+            metrics.record_tokens(model, **usage)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# 이벤트 루프 → ({엔드포인트: 클라이언트}, 세마포어). httpx 연결과 세마포어는 루프에 묶이므로 루프마다 1개
+_loop_state: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_loop_lock = threading.Lock()
+
+# 현재 요청이 배정된 엔드포인트 (ainvoke → get_client 전달)
+_current_host: ContextVar[Optional[str]] = ContextVar("ollama_host", default=None)
+
+
+def _state_for_loop():
+    loop = asyncio.get_running_loop()
+    with _loop_lock:
+        state = _loop_state.get(loop)
+        if state is None:
+            size = max(LLM_POOL_SIZE, 1) * len(ollama_balancer.hosts())
+            state = _loop_state[loop] = ({}, asyncio.Semaphore(size))
+    return state
+
+
+def _client_for(llm: "PooledChatOllama", host: str):
+    clients, _ = _state_for_loop()
+    with _loop_lock:
+        client = clients.get(host)
+        if client is None:
+            clone = copy.copy(llm)
+            clone.host = host
+            client = ChatOllama.get_client(clone)  # 원래 구현으로 엔드포인트당 1회만 생성
+            client = clients[host] = _KeepAliveClient(client, _keep_alive_value(OLLAMA_KEEP_ALIVE), host)
+            _update(clients_created=1)
+    return client
+
+
+class PooledChatOllama(ChatOllama):
+    """클라이언트를 재사용하고 엔드포인트 분산/동시 요청 수/대기 시간을 계측하는 ChatOllama"""
+
+    def get_client(self):
+        return _client_for(self, _current_host.get() or ollama_balancer.hosts()[0])
+
+    async def ainvoke(self, messages, output_format=None):
+        # 직전과 같은 화면이면 응답 재사용 또는 화면 변화 대기
+        messages, reused = await before_inference(messages)
+        if reused is not None:
+            _update(dedup_skipped=1)
+            return reused
+        # 요소 목록은 직전 요청과 바뀐 부분만 (현재 스텝의 dom_diff 설정)
+        messages = dom_diff.apply(messages)
+        # 스크린샷 축소/재인코딩 (현재 스텝의 image 설정)
+        messages = preprocess_messages(messages)
+        # 같은 모델/메시지/이미지 요청이면 디스크 캐시 응답
+        cache_key = None
+        if llm_cache.active():
+            cache_key = llm_cache.cache_key(self.model, messages, output_format)
+            hit = llm_cache.get(cache_key, output_format)
+            if hit is not None:
+                after_inference(hit, 0.0)
+                return hit
+        _, sem = _state_for_loop()
+        queued = time.perf_counter()
+        _update(waiting=1)
+        async with sem:
+            waited = time.perf_counter() - queued
+            with _metrics_lock:
+                _metrics["waiting"] -= 1
+                _metrics["in_flight"] += 1
+                _metrics["wait_s_total"] += waited
+                _metrics["wait_s_max"] = max(_metrics["wait_s_max"], waited)
+            started = time.perf_counter()
+            try:
+                result = await self._routed_invoke(messages, output_format)
+                latency = time.perf_counter() - started
+                after_inference(result, latency)
+                metrics.record_llm(self.model, latency)
+                if cache_key is not None:
+                    llm_cache.put(cache_key, self.model, result)
+                return result
+            except Exception:
+                _update(errors=1)
+                raise
+            finally:
+                _update(in_flight=-1, requests=1, latency_s_total=time.perf_counter() - started)
+
+    async def _routed_invoke(self, messages, output_format):
+        """엔드포인트를 골라 호출, 연결 오류면 다른 엔드포인트로 재시도 (엔드포인트 수만큼)"""
+        tried = set()
+        affinity = prompt_prefix.affinity_key(messages)
+        while True:
+            try:
+                with ollama_balancer.routed(self.model, tried, affinity) as ep:
+                    token = _current_host.set(ep.url)
+                    try:
+                        return await super().ainvoke(messages, output_format)
+                    finally:
+                        _current_host.reset(token)
+            except Exception as e:
+                tried.add(ep.url)
+                if not ollama_balancer.is_connection_error(e) or len(tried) >= len(ollama_balancer.hosts()):
+                    raise
+                _update(retries=1)
+
+
+_llms: Dict[str, PooledChatOllama] = {}
+_llms_lock = threading.Lock()
+
+
+def get_llm(model: Optional[str] = None) -> PooledChatOllama:
+    """모델별 공유 LLM 인스턴스 (없으면 생성)"""
+    model = model or OLLAMA_MODEL
+    with _llms_lock:
+        llm = _llms.get(model)
+        if llm is None:
+            llm = _llms[model] = PooledChatOllama(model=model)
+        return llm
+
+
+# ====== 워밍업 ======
+_warmup_started = False
+
+
+def _warm_host(host: str, model: str, results: Dict[str, bool]) -> None:
+    body = json.dumps({"model": model, "prompt": "", "keep_alive": _keep_alive_value(OLLAMA_KEEP_ALIVE)}).encode("utf-8")
+    req = urllib.request.Request(f"{host}/api/generate", data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=WARMUP_TIMEOUT_S) as resp:
+            resp.read()
+        results[host] = True
+    except Exception:
+        results[host] = False
+
+
+def warm_up(model: Optional[str] = None) -> bool:
+    """
+    빈 프롬프트로 /api/generate 호출 → 모든 엔드포인트에 모델을 로드하고 keep_alive 동안 유지.
+    동기 호출(수 분 걸릴 수 있음)이므로 보통 start_warmup()으로 백그라운드 실행.
+    """
+    model = model or OLLAMA_MODEL
+    results: Dict[str, bool] = {}
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_warm_host, args=(host, model, results), daemon=True)
+               for host in ollama_balancer.hosts()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ok = any(results.values())
+    with _metrics_lock:
+        _metrics["warmup"] = "done" if ok else "failed"
+        _metrics["warmup_s"] = round(time.perf_counter() - started, 2)
+    return ok
+
+
+def start_warmup(model: Optional[str] = None) -> None:
+    """프로세스당 1회 백그라운드 워밍업 (LLM_WARMUP=0 이면 생략) + 엔드포인트 헬스 체크 시작"""
+    global _warmup_started
+    ollama_balancer.start_health_checks()
+    with _llms_lock:
+        if _warmup_started or not LLM_WARMUP:
+            return
+        _warmup_started = True
+    threading.Thread(target=warm_up, args=(model,), name="llm-warmup", daemon=True).start()
@@ -0,0 +1,333 @@
+# metrics.py
+# 스텝/agent 액션 단위 계측과 Prometheus 텍스트 형식 /metrics 엔드포인트.
+# - 스텝: 전체 소요 시간, LLM 호출 수/지연, 프롬프트·완료 토큰, 전송한 이미지 바이트, 브라우저 액션 수
+# - agent 액션(= agent 스텝 1회): 소요 시간, 그중 LLM 이외 시간(페이지 로드 대기·액션 실행·스크린샷)
+# - llm_pool / image_pipeline / llm_cache 등 모듈별 *_stats() 값은 수집 시점에 게이지로 함께 내보냄
+# 외부 의존성 없이 카운터/히스토그램과 텍스트 형식을 직접 구현한다 (METRICS_PORT=0 이면 서버 끔).
+import os
+import re
+import time
+import threading
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+# ====== 설정 및 상수 ======
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")  # 로컬만 (컨테이너/원격 수집은 명시적으로 0.0.0.0)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+PREFIX = "webrunner"
+
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+
+STEP_STAT_KEYS = ("llm_calls", "llm_s", "prompt_tokens", "completion_tokens", "actions", "browser_s")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ====== 카운터/히스토그램 ======
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help_text, labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = SECONDS_BUCKETS,
+                 labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help_text, labelnames
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # [버킷별 개수..., 합계, 개수]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="' + _fmt(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(float(series[-2]))}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+STEP_SECONDS = Histogram(f"{PREFIX}_step_seconds", "스텝 전체 소요 시간", labelnames=("type", "source"))
+ACTION_SECONDS = Histogram(f"{PREFIX}_agent_action_seconds", "agent 액션(스텝 1회) 소요 시간")
+BROWSER_SECONDS = Histogram(f"{PREFIX}_browser_wait_seconds",
+                            "agent 액션 중 LLM 이외 시간 (페이지 로드 대기, 액션 실행, 스크린샷)")
+BROWSER_ACTIONS = Counter(f"{PREFIX}_browser_actions_total", "agent가 실행한 브라우저 액션 수", ("action",))
+LLM_SECONDS = Histogram(f"{PREFIX}_llm_request_seconds", "LLM 추론 지연", labelnames=("model",))
+LLM_TOKENS = Counter(f"{PREFIX}_llm_tokens_total", "LLM 토큰 수", ("model", "kind"))
+LLM_PROMPT_TOKENS = Histogram(f"{PREFIX}_llm_prompt_tokens", "요청당 평가한 프롬프트 토큰", TOKEN_BUCKETS, ("model",))
+IMAGE_BYTES = Counter(f"{PREFIX}_llm_image_bytes_total", "LLM에 보낸 스크린샷 바이트 (전처리 후)")
+PAGE_READY_SECONDS = Histogram(f"{PREFIX}_page_ready_seconds", "이동/액션 후 페이지 준비까지 실제 대기 시간",
+                               labelnames=("reason",))
+
+_REGISTRY = [STEP_SECONDS, ACTION_SECONDS, BROWSER_SECONDS, BROWSER_ACTIONS,
+             LLM_SECONDS, LLM_TOKENS, LLM_PROMPT_TOKENS, IMAGE_BYTES, PAGE_READY_SECONDS]
+
+
+# ====== 스텝별 집계 (컨텍스트 변수) ======
+_step_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("metrics_step_stats", default=None)
+
+
+def use_for_step(stats: Optional[Dict[str, Any]]) -> None:
+    """현재 컨텍스트(= 이 스텝의 agent 실행)의 LLM 호출을 stats 에 합산"""
+    _step_stats.set(stats)
+    if stats is not None:
+        for k in STEP_STAT_KEYS:
+            stats.setdefault(k, 0)
+
+
+def record_llm(model: str, latency_s: float) -> None:
+    """LLM 추론 1회 (캐시 적중/응답 재사용은 호출하지 않음)"""
+    LLM_SECONDS.observe(latency_s, model=model)
+    stats = _step_stats.get()
+    if stats is not None:
+        stats["llm_calls"] += 1
+        stats["llm_s"] = round(stats["llm_s"] + latency_s, 3)
+
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """Ollama chat 응답의 토큰 수 (prompt_eval_count: KV 캐시로 재사용한 접두부는 빠짐)"""
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, model=model)
+    stats = _step_stats.get()
+    if stats is not None:
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+
+
+class ActionTracker:
+    """
+    agent 스텝 콜백 사이 간격 = 직전 액션 실행 + 페이지 로드 대기 + 상태/스크린샷 수집 + 이번 LLM 호출.
+    간격에서 그 사이 LLM 시간을 빼 브라우저 시간으로 기록한다.
+    """
+
+    def __init__(self, stats: Optional[Dict[str, Any]] = None):
+        self._stats = stats if stats is not None else {k: 0 for k in STEP_STAT_KEYS}
+        self._last = time.perf_counter()
+        self._llm_at_last = 0.0
+
+    def observe(self, model_output) -> None:
+        now = time.perf_counter()
+        interval = now - self._last
+        llm_s = float(self._stats.get("llm_s", 0.0))
+        browser_s = max(interval - (llm_s - self._llm_at_last), 0.0)
+        self._last, self._llm_at_last = now, llm_s
+
+        ACTION_SECONDS.observe(interval)
+        BROWSER_SECONDS.observe(browser_s)
+        names = []
+        for action in getattr(model_output, "action", None) or []:
+            try:
+                names.extend(action.model_dump(exclude_none=True, exclude_unset=True).keys())
+            except Exception:
+                names.append("unknown")
+        for name in names:
+            BROWSER_ACTIONS.inc(action=name)
+        self._stats["actions"] = self._stats.get("actions", 0) + len(names)
+        self._stats["browser_s"] = round(self._stats.get("browser_s", 0.0) + browser_s, 3)
+
+    def wrap(self, on_step: Optional[Callable] = None) -> Callable:
+        """register_new_step_callback 용 콜백 (기존 콜백이 있으면 이어서 호출)"""
+        def callback(state, model_output, step_number):
+            self.observe(model_output)
+            if on_step is not None:
+                on_step(state, model_output, step_number)
+        return callback
+
+
+def record_step(step_type: str, source: str, wall_s: float, stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """스텝 1개 완료 → 히스토그램 기록 + 요약표 한 행"""
+    stats = stats or {}
+    STEP_SECONDS.observe(wall_s, type=step_type, source=source)
+    image_bytes = int(stats.get("bytes_after", 0) or 0)
+    if image_bytes:
+        IMAGE_BYTES.inc(image_bytes)
+    return {
+        "wall_s": round(wall_s, 2),
+        "llm_calls": stats.get("llm_calls", 0),
+        "llm_s": round(float(stats.get("llm_s", 0) or 0), 2),
+        "prompt_tokens": stats.get("prompt_tokens", 0),
+        "completion_tokens": stats.get("completion_tokens", 0),
+        "image_kb": round(image_bytes / 1024, 1),
+        "actions": stats.get("actions", 0),
+        "browser_s": round(float(stats.get("browser_s", 0) or 0), 2),
+        "blocked": stats.get("blocked_requests", 0),
+        "ready_s": round(float(stats.get("ready_s", 0) or 0), 2),
+    }
+
+
+def summary_table(rows: List[Dict[str, Any]]) -> str:
+    """[{name, type, ...record_step 결과}] → Markdown 표 (합계 행 포함)"""
+    if not rows:
+        return ""
+    head = ("| 스텝 | 유형 | 전체(초) | LLM 호출 | LLM(초) | 프롬프트 토큰 | 완료 토큰 | 이미지(KB) | 액션 | 브라우저(초) | 차단 요청 | 준비 대기(초) |\n"
+            "|---|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|")
+    cols = ("wall_s", "llm_calls", "llm_s", "prompt_tokens", "completion_tokens", "image_kb", "actions", "browser_s",
+            "blocked", "ready_s")
+    lines = [head]
+    for r in rows:
+        lines.append(f"| {r['name']} | {r['type']} | " + " | ".join(str(r.get(c, 0)) for c in cols) + " |")
+    totals = {c: round(sum(r.get(c, 0) for r in rows), 2) for c in cols}
+    lines.append("| **합계** | | " + " | ".join(str(totals[c]) for c in cols) + " |")
+    return "\n".join(lines)
+
+
+# ====== 모듈별 *_stats() 게이지 ======
+def _stats_sources() -> Dict[str, Callable[[], Dict[str, Any]]]:
+    # 순환 import 방지를 위해 수집 시점에 import (llm_pool 은 이 모듈을 import 함)
+    import llm_pool
+    import llm_cache
+    import image_pipeline
+    import model_cascade
+    import step_cache
+    import trajectory
+    import script_plan
+    import prompt_prefix
+    import browser_pool
+    import auth_state
+    import net_profiles
+    import page_ready
+    import display_mode
+    import dom_diff
+    import fanout
+    return {
+        "llm_pool": llm_pool.pool_stats,
+        "llm_cache": llm_cache.llm_cache_stats,
+        "image": image_pipeline.image_stats,
+        "cascade": model_cascade.cascade_stats,
+        "step_cache": step_cache.step_cache_stats,
+        "trajectory": trajectory.trajectory_stats,
+        "plan_cache": script_plan.plan_cache_stats,
+        "prompt_prefix": prompt_prefix.prefix_stats,
+        "browser_pool": browser_pool.browser_pool_stats,
+        "auth_state": auth_state.auth_state_stats,
+        "network": net_profiles.net_profile_stats,
+        "page_ready": page_ready.page_ready_stats,
+        "display": display_mode.display_stats,
+        "dom_diff": dom_diff.dom_diff_stats,
+        "foreach": fanout.fanout_stats,
+    }
+
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _gauge_lines() -> List[str]:
+    lines = []
+    try:
+        sources = _stats_sources()
+    except Exception:
+        return lines
+    for prefix, fn in sources.items():
+        try:
+            stats = fn()
+        except Exception:
+            continue
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{PREFIX}_{prefix}_{_NAME_RE.sub('_', key)}"
+            lines += [f"# TYPE {name} gauge", f"{name} {_fmt(value)}"]
+        # 엔드포인트별 상태
+        for ep in (stats.get("balancer") or {}).get("endpoints", []) if prefix == "llm_pool" else []:
+            label = _labels(("url",), (ep["url"],))
+            lines += [f"{PREFIX}_ollama_endpoint_outstanding{label} {ep['outstanding']}",
+                      f"{PREFIX}_ollama_endpoint_ejected{label} {int(ep['ejected'])}"]
+        # 풀 브라우저별 점유/메모리
+        for i, b in enumerate(stats.get("per_browser", []) if prefix == "browser_pool" else []):
+            label = _labels(("browser", "headless"), (str(i), str(b["headless"]).lower()))
+            lines.append(f"{PREFIX}_browser_sessions{label} {b['sessions']}")
+            if b["rss_mb"] is not None:
+                lines.append(f"{PREFIX}_browser_rss_mb{label} {_fmt(b['rss_mb'])}")
+    return lines
+
+
+def render() -> str:
+    """Prometheus 텍스트 형식 (0.0.4)"""
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines += metric.render()
+    lines += _gauge_lines()
+    return "\n".join(lines) + "\n"
+
+
+# ====== /metrics 서버 ======
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # 스크레이프마다 콘솔 출력하지 않음
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """프로세스당 1회 백그라운드 /metrics 서버 시작 → 포트 (METRICS_PORT=0 이거나 실패하면 None)"""
+    global _server
+    port = METRICS_PORT if port is None else port
+    with _server_lock:
+        if _server is not None:
+            return _server.server_address[1]
+        if port <= 0:
+            return None
+        try:
+            _server = ThreadingHTTPServer((METRICS_HOST, port), _Handler)
+        except OSError:
+            return None
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server.server_address[1]
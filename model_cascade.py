@@ -0,0 +1,215 @@
+# model_cascade.py
+# agent 스텝의 모델 선택과 텍스트 → 비전 모델 캐스케이드.
+# - vision: true  : 비전 모델 + 스크린샷 (기존 동작)
+# - vision: false : 텍스트 모델 + DOM 상태만 (스크린샷 없음)
+# - vision: auto  : 작은 텍스트 모델로 먼저 실행하고, 실패/스텝 상한 도달/반복 오류/낮은 확신이면
+#                   같은 브라우저 상태에서 비전 모델로 이어서 재실행(escalation)
+# 단계별 소요 시간과 escalation 사유는 스텝 집계 dict(script_runner 실행 로그)와 cascade_stats()에 남는다.
+import os
+import time
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Optional, Callable
+
+from async_engine import get_engine
+from step_cache import result_succeeded
+
+# ====== 설정 및 상수 ======
+OLLAMA_TEXT_MODEL = os.environ.get("OLLAMA_TEXT_MODEL", "llama3.2")
+CASCADE_TEXT_MAX_STEPS = int(os.environ.get("CASCADE_TEXT_MAX_STEPS", "8"))  # 텍스트 단계 스텝 상한 (빨리 포기)
+CASCADE_MAX_ERRORS = int(os.environ.get("CASCADE_MAX_ERRORS", "2"))          # 이 횟수 이상 액션 오류면 escalation
+
+# 텍스트 모델이 화면을 판단하지 못했다고 답할 때 흔히 쓰는 표현 (소문자 비교)
+UNCERTAIN_MARKERS = (
+    "확인할 수 없", "알 수 없", "모르겠", "판단할 수 없", "보이지 않",
+    "cannot determine", "can't determine", "unable to", "not sure", "unsure", "cannot see", "can't see",
+)
+
+
+@dataclass(frozen=True)
+class ModelChoice:
+    vision: str = "on"                 # on | off | auto
+    model: Optional[str] = None        # on/off 모드의 모델, auto 모드의 escalation 모델 (None: 세션 기본 모델)
+    text_model: Optional[str] = None   # off/auto 모드의 텍스트 모델 (None: OLLAMA_TEXT_MODEL)
+
+
+def _vision_mode(value: Any) -> str:
+    if value is True or str(value).lower() in ("true", "on", "1"):
+        return "on"
+    if value is False or str(value).lower() in ("false", "off", "0"):
+        return "off"
+    if str(value).lower() == "auto":
+        return "auto"
+    raise ValueError("vision은 true, false, auto 중 하나여야 합니다.")
+
+
+def parse_choice(spec: Dict[str, Any], base: Optional[ModelChoice] = None) -> ModelChoice:
+    """
+    스텝(또는 스크립트 최상위)의 vision/model/text_model 필드 → ModelChoice (base 위에 덮어씀).
+    잘못된 값은 ValueError.
+    """
+    base = base or DEFAULT_CHOICE
+    changes: Dict[str, Any] = {}
+    if "vision" in spec:
+        changes["vision"] = _vision_mode(spec["vision"])
+    for key in ("model", "text_model"):
+        if key in spec:
+            if spec[key] is not None and not isinstance(spec[key], str):
+                raise ValueError(f"{key}는 모델 이름 문자열이어야 합니다.")
+            changes[key] = spec[key] or None
+    return replace(base, **changes) if changes else base
+
+
+DEFAULT_CHOICE = ModelChoice(vision=_vision_mode(os.environ.get("LLM_VISION", "true")))
+
+
+# ====== 지표 ======
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "cascades": 0,        # vision: auto 실행 수
+    "text_runs": 0,
+    "text_accepted": 0,
+    "escalations": 0,
+    "vision_runs": 0,
+    "text_s_total": 0.0,
+    "vision_s_total": 0.0,
+}
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _record(stats: Optional[Dict[str, Any]], tier: str, elapsed: float) -> None:
+    with _stats_lock:
+        _stats[f"{tier}_runs"] += 1
+        _stats[f"{tier}_s_total"] += elapsed
+    if stats is not None:
+        stats[f"{tier}_s"] = round(stats.get(f"{tier}_s", 0.0) + elapsed, 2)
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """텍스트 단계 통과율/escalation 비율/단계별 평균 시간"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["escalation_rate"] = round(stats["escalations"] / stats["cascades"], 4) if stats["cascades"] else 0.0
+    stats["text_s_avg"] = round(stats["text_s_total"] / stats["text_runs"], 3) if stats["text_runs"] else 0.0
+    stats["vision_s_avg"] = round(stats["vision_s_total"] / stats["vision_runs"], 3) if stats["vision_runs"] else 0.0
+    stats["default_vision"] = DEFAULT_CHOICE.vision
+    stats["text_model"] = OLLAMA_TEXT_MODEL
+    return stats
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> str:
+    if not stats or "model_tier" not in stats:
+        return ""
+    if stats["model_tier"] == "text→vision":
+        return (
+            f"🔼 텍스트 모델 {stats.get('text_s', 0):.1f}초 → 비전 모델로 전환({stats.get('escalation_reason', '')}) "
+            f"{stats.get('vision_s', 0):.1f}초"
+        )
+    if stats["model_tier"] == "text":
+        return f"🔤 텍스트 모델로 처리 ({stats.get('text_s', 0):.1f}초, 스크린샷 없음)"
+    return ""
+
+
+# ====== escalation 판단 ======
+def escalation_reason(result: Any) -> Optional[str]:
+    """텍스트 모델 결과를 그대로 써도 되면 None, 아니면 비전 모델로 넘길 사유"""
+    if not result_succeeded(result):
+        return "실패"
+    is_done = getattr(result, "is_done", None)
+    if callable(is_done):
+        try:
+            if not is_done():
+                return "스텝 상한 도달"
+        except Exception:
+            pass
+    errors = getattr(result, "errors", None)
+    if callable(errors):
+        try:
+            count = sum(1 for e in errors() if e)
+        except Exception:
+            count = 0
+        if count >= CASCADE_MAX_ERRORS:
+            return f"액션 오류 {count}회"
+    final = getattr(result, "final_result", None)
+    text = final() if callable(final) else result
+    if not str(text or "").strip():
+        return "빈 결과"
+    lowered = str(text).lower()
+    if any(m in lowered for m in UNCERTAIN_MARKERS):
+        return "낮은 확신"
+    return None
+
+
+# ====== 실행 ======
+class CascadeAgent:
+    """
+    Agent와 같은 run()/run_sync() 인터페이스를 가진 실행기.
+    build(llm, use_vision) 로 단계마다 Agent를 만들어 실행한다 (콜백/컨텍스트는 build가 주입).
+    """
+
+    def __init__(self, build: Callable[[Any, bool], Any], choice: ModelChoice,
+                 text_llm, vision_llm, stats: Optional[Dict[str, Any]] = None):
+        self._build = build
+        self._choice = choice
+        self._text_llm = text_llm
+        self._vision_llm = vision_llm
+        self._stats = stats
+
+    def _set(self, **values) -> None:
+        if self._stats is not None:
+            self._stats.update(values)
+
+    async def _run_tier(self, tier: str, max_steps: int):
+        llm = self._text_llm if tier == "text" else self._vision_llm
+        started = time.perf_counter()
+        try:
+            return await self._build(llm, tier == "vision").run(max_steps=max_steps)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record(self._stats, tier, elapsed)
+
+    async def run(self, max_steps: int = 100):
+        if self._choice.vision == "on":
+            self._set(model_tier="vision", model=getattr(self._vision_llm, "model", None))
+            return await self._run_tier("vision", max_steps)
+        if self._choice.vision == "off":
+            self._set(model_tier="text", model=getattr(self._text_llm, "model", None))
+            return await self._run_tier("text", max_steps)
+
+        _count("cascades")
+        self._set(model_tier="text", model=getattr(self._text_llm, "model", None))
+        try:
+            res = await self._run_tier("text", min(max_steps, CASCADE_TEXT_MAX_STEPS))
+        except Exception as e:
+            res = f"❌ 실행 오류: {str(e)}"
+        reason = escalation_reason(res)
+        if reason is None:
+            _count("text_accepted")
+            return res
+
+        _count("escalations")
+        self._set(model_tier="text→vision", model=getattr(self._vision_llm, "model", None), escalation_reason=reason)
+        # 텍스트 단계가 진행한 페이지 상태에서 비전 모델이 이어받음
+        return await self._run_tier("vision", max_steps)
+
+    def run_sync(self, max_steps: int = 100):
+        """동기 호출부(Gradio 작업 스레드 등)용: 공유 실행 엔진 루프에서 run() 실행 후 완료까지 대기"""
+        return get_engine().run(self.run, max_steps=max_steps)
+
+
+def cascade_agent(build: Callable[[Any, bool], Any], choice: Optional[ModelChoice], default_llm,
+                  stats: Optional[Dict[str, Any]] = None) -> CascadeAgent:
+    """스텝 모델 선택 → 공유 LLM 인스턴스를 골라 CascadeAgent 생성 (default_llm: 세션 비전 모델)"""
+    # script_plan 이 이 모듈을 import 하므로 browser_use 의존(llm_pool)은 여기서 지연 import
+    from llm_pool import get_llm
+
+    choice = choice or DEFAULT_CHOICE
+    vision_llm = get_llm(choice.model) if choice.model else default_llm
+    text_llm = None
+    if choice.vision != "on":
+        text_llm = get_llm(choice.text_model or (choice.model if choice.vision == "off" else None) or OLLAMA_TEXT_MODEL)
+    return CascadeAgent(build, choice, text_llm, vision_llm, stats)
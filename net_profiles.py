@@ -0,0 +1,194 @@
+# net_profiles.py
+# 브라우저 컨텍스트 단위 네트워크 요청 차단 프로필.
+# Microsoft 365 페이지는 이미지/폰트/텔레메트리 요청이 많아 네트워크가 조용해질 때까지(페이지 준비) 오래 걸린다.
+# - off          : 차단 없음 (기본, NET_PROFILE 로 전역 변경)
+# - no-telemetry : 텔레메트리/분석 호스트만 차단
+# - no-media     : + 이미지/미디어/폰트
+# - text-only    : + 스타일시트 (스크린샷이 깨지므로 vision: false 스텝용)
+# 스크립트 최상위 또는 스텝의 network: 로 선택하고, 세션 Chromium 에 CDP로 붙인 Playwright 컨텍스트의 route 로
+# 세션 전체에 적용한다. 적용하지 못하면(Playwright 미설치/연결 실패) 스텝 로그에 경고를 남긴다.
+# 문서(document) 요청은 차단하지 않는다. 차단한 요청 수와 추정 절감 바이트는 스텝 집계 dict와 net_profile_stats()에 남는다.
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, FrozenSet
+from urllib.parse import urlparse
+
+from browser_support import playwright_contexts, step_page
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    resource_types: FrozenSet[str] = frozenset()
+    telemetry: bool = False
+
+    def blocks(self, resource_type: str, url: str) -> bool:
+        if resource_type == "document":
+            return False
+        if resource_type in self.resource_types:
+            return True
+        return self.telemetry and is_telemetry(url)
+
+
+# ====== 설정 및 상수 ======
+PROFILES: Dict[str, Profile] = {
+    "off": Profile("off"),
+    "no-telemetry": Profile("no-telemetry", telemetry=True),
+    "no-media": Profile("no-media", frozenset({"image", "media", "font"}), telemetry=True),
+    "text-only": Profile("text-only", frozenset({"image", "media", "font", "stylesheet"}), telemetry=True),
+}
+
+# 텔레메트리/분석 호스트 (접미사 비교). NET_TELEMETRY_HOSTS 로 추가
+TELEMETRY_HOSTS = (
+    "events.data.microsoft.com", "aria.microsoft.com", "clarity.ms", "monitor.azure.com",
+    "applicationinsights.azure.com", "dc.services.visualstudio.com", "browser.pipe.aria.microsoft.com",
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "hotjar.com", "segment.io",
+) + tuple(h.strip().lower() for h in os.environ.get("NET_TELEMETRY_HOSTS", "").split(",") if h.strip())
+
+# 차단한 요청의 크기는 알 수 없으므로 자원 유형별 평균 크기로 추정 (바이트)
+EST_BYTES = {
+    "image": 25_000, "media": 300_000, "font": 35_000, "stylesheet": 20_000,
+    "script": 40_000, "xhr": 2_000, "fetch": 2_000, "ping": 500, "beacon": 500,
+}
+EST_BYTES_OTHER = 5_000
+
+
+def parse_profile(value: Any) -> str:
+    """스크립트/스텝의 network 값 → 프로필 이름 (false = off, 잘못된 값은 ValueError)"""
+    name = "off" if value in (None, False) else str(value).strip().lower()
+    if name not in PROFILES:
+        raise ValueError(f"network는 {', '.join(PROFILES)} 중 하나여야 합니다.")
+    return name
+
+
+DEFAULT_PROFILE = parse_profile(os.environ.get("NET_PROFILE", "off"))
+
+
+def is_telemetry(url: str) -> bool:
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == h or host.endswith("." + h) for h in TELEMETRY_HOSTS)
+
+
+# ====== 집계 ======
+_lock = threading.Lock()
+_stats: Dict[str, Any] = {"blocked_requests": 0, "blocked_bytes_est": 0, "contexts": 0, "failures": 0}
+_by_type: Dict[str, int] = {}
+
+
+def _record(stats: Optional[Dict[str, Any]], resource_type: str) -> None:
+    size = EST_BYTES.get(resource_type, EST_BYTES_OTHER)
+    with _lock:
+        _stats["blocked_requests"] += 1
+        _stats["blocked_bytes_est"] += size
+        _by_type[resource_type] = _by_type.get(resource_type, 0) + 1
+    if stats is not None:
+        stats["blocked_requests"] = stats.get("blocked_requests", 0) + 1
+        stats["blocked_bytes_est"] = stats.get("blocked_bytes_est", 0) + size
+
+
+def _failed(stats: Optional[Dict[str, Any]], profile: str, error: Exception) -> None:
+    with _lock:
+        _stats["failures"] += 1
+    if stats is not None:
+        stats["network"] = profile
+        stats["network_error"] = str(error).splitlines()[0] if str(error) else type(error).__name__
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> str:
+    if not stats:
+        return ""
+    if stats.get("network_error"):
+        return f"⚠️ 요청 차단 프로필 {stats.get('network', '')} 적용 실패: {stats['network_error']}"
+    if not stats.get("blocked_requests"):
+        return ""
+    return (f"🚫 요청 차단 {stats['blocked_requests']}건 ({stats.get('network', '')}, "
+            f"추정 {stats.get('blocked_bytes_est', 0) / 1024:.0f}KB 절감)")
+
+
+def net_profile_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+        stats.update({f"blocked_{t}": n for t, n in _by_type.items()})
+    stats["default_profile"] = DEFAULT_PROFILE
+    return stats
+
+
+# ====== 컨텍스트 적용 ======
+class _Route:
+    """Playwright 컨텍스트 1개의 라우트 핸들러 (프로필/집계 dict는 스텝마다 교체)"""
+
+    def __init__(self):
+        self.profile = PROFILES["off"]
+        self.stats: Optional[Dict[str, Any]] = None
+
+    async def handle(self, route, request) -> None:
+        try:
+            resource_type = request.resource_type
+            if self.profile.blocks(resource_type, request.url):
+                _record(self.stats, resource_type)
+                await route.abort("blockedbyclient")
+                return
+        except Exception:
+            pass
+        try:
+            await route.continue_()
+        except Exception:
+            pass
+
+
+_routes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()   # Playwright BrowserContext → _Route
+
+
+async def apply(pw_context, profile: str, stats: Optional[Dict[str, Any]] = None) -> None:
+    """Playwright 컨텍스트에 프로필 적용 (off 면 라우트 해제 → 요청이 Python을 거치지 않음)"""
+    if pw_context is None:
+        return
+    handler = _routes.get(pw_context)
+    if profile == "off":
+        if handler is not None:
+            del _routes[pw_context]
+            try:
+                await pw_context.unroute("**/*", handler.handle)
+            except Exception:
+                pass
+        return
+    if handler is None:
+        handler = _Route()
+        await pw_context.route("**/*", handler.handle)
+        _routes[pw_context] = handler
+        with _lock:
+            _stats["contexts"] += 1
+    handler.profile = PROFILES[profile]
+    handler.stats = stats
+    if stats is not None:
+        stats["network"] = profile
+
+
+async def use_for_step(browser, profile: Optional[str], stats: Optional[Dict[str, Any]] = None) -> None:
+    """순차 스텝: 세션 BrowserSession 에 이 스텝의 프로필 적용 (None: NET_PROFILE, 실패하면 stats 에 network_error)"""
+    profile = profile or DEFAULT_PROFILE
+    if profile == "off":
+        # 이미 라우트를 건 컨텍스트만 해제 (새 탭을 만들지 않음)
+        try:
+            for ctx in await playwright_contexts(browser):
+                if ctx in _routes:
+                    await apply(ctx, "off")
+        except Exception:
+            pass
+        return
+    try:
+        context = getattr(await step_page(browser), "context", None)
+        if context is None:
+            raise RuntimeError("브라우저 세션에 Playwright로 연결할 수 없습니다")
+        await apply(context, profile, stats)
+    except Exception as e:
+        _failed(stats, profile, e)
+
+
+async def prepare_context(context, profile: Optional[str], stats: Optional[Dict[str, Any]] = None) -> None:
+    """병렬 스텝/foreach 항목: 스텝 전용 BrowserSession 에 적용"""
+    profile = profile or DEFAULT_PROFILE
+    if profile != "off":
+        await use_for_step(context, profile, stats)
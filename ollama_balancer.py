@@ -0,0 +1,245 @@
+# ollama_balancer.py
+# 여러 Ollama 엔드포인트에 LLM 요청을 나누는 로드 밸런서 (llm_pool.PooledChatOllama 가 사용).
+# - OLLAMA_HOSTS="http://a:11434,http://b:11434" (없으면 OLLAMA_HOST 1개)
+# - 요청마다 진행 중 요청 수(least-outstanding-requests)가 가장 적은 엔드포인트 선택, 같으면 평균 지연이 짧은 쪽
+# - 백그라운드 헬스 체크(/api/tags): 응답 여부, 응답 시간, 설치된 모델 목록 확인
+# - 연속 실패하거나 다른 엔드포인트보다 현저히 느린 엔드포인트는 일정 시간 제외(eject) 후 자동 복귀
+# 모든 엔드포인트가 제외되면 전체 중에서 고른다 (요청을 거부하지 않음).
+import os
+import json
+import time
+import threading
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set
+
+# ====== 설정 및 상수 ======
+HEALTH_INTERVAL_S = float(os.environ.get("OLLAMA_HEALTH_INTERVAL_S", "15"))
+HEALTH_TIMEOUT_S = float(os.environ.get("OLLAMA_HEALTH_TIMEOUT_S", "5"))
+EJECT_S = float(os.environ.get("OLLAMA_EJECT_S", "30"))
+MAX_FAILURES = int(os.environ.get("OLLAMA_MAX_FAILURES", "3"))       # 연속 실패 이 횟수면 제외
+SLOW_FACTOR = float(os.environ.get("OLLAMA_SLOW_FACTOR", "3"))       # 가장 빠른 엔드포인트 대비 평균 지연 배수
+SLOW_MIN_SAMPLES = 5   # 느림 판정 전 최소 요청 수
+EWMA_ALPHA = 0.3
+
+
+def _parse_hosts() -> List[str]:
+    raw = os.environ.get("OLLAMA_HOSTS") or os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+    hosts = []
+    for h in raw.split(","):
+        h = h.strip().rstrip("/")
+        if h and "://" not in h:
+            h = f"http://{h}"
+        if h and h not in hosts:
+            hosts.append(h)
+    return hosts
+
+
+@dataclass
+class Endpoint:
+    url: str
+    outstanding: int = 0
+    requests: int = 0
+    errors: int = 0
+    failures: int = 0                       # 연속 실패 (요청 + 헬스 체크)
+    latency_ewma: Optional[float] = None    # 요청 지연 지수이동평균 (초)
+    ejected_until: float = 0.0
+    ejections: int = 0
+    models: Optional[Set[str]] = None       # 헬스 체크로 확인한 모델 (None: 아직 모름)
+    last_check: Optional[float] = None
+    check_s: Optional[float] = None
+    reason: str = ""
+    # 최근 처리한 시스템 프롬프트 친화도 키 (이 엔드포인트의 KV 캐시에 남아 있을 가능성)
+    prefixes: deque = field(default_factory=lambda: deque(maxlen=8))
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def has_model(self, model: Optional[str]) -> bool:
+        if not model or self.models is None:
+            return True
+        return model in self.models or f"{model}:latest" in self.models
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_s_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "ejected": not self.available(now),
+            "ejected_for_s": round(max(self.ejected_until - now, 0.0), 1),
+            "ejections": self.ejections,
+            "reason": self.reason,
+            "models": sorted(self.models) if self.models is not None else None,
+            "health_check_s": self.check_s,
+        }
+
+
+_lock = threading.Lock()
+_endpoints: List[Endpoint] = [Endpoint(url) for url in _parse_hosts()]
+
+
+def hosts() -> List[str]:
+    return [ep.url for ep in _endpoints]
+
+
+def _eject_locked(ep: Endpoint, reason: str, now: float) -> None:
+    if ep.available(now):
+        ep.ejections += 1
+    ep.ejected_until = now + EJECT_S
+    ep.reason = reason
+
+
+def _fail_locked(ep: Endpoint, reason: str, now: float) -> None:
+    ep.failures += 1
+    ep.reason = reason
+    if ep.failures >= MAX_FAILURES:
+        _eject_locked(ep, f"연속 실패 {ep.failures}회: {reason}", now)
+
+
+def _check_slow_locked(ep: Endpoint, now: float) -> None:
+    """다른 엔드포인트 중 가장 빠른 것보다 SLOW_FACTOR 배 이상 느리면 제외"""
+    if len(_endpoints) < 2 or ep.requests < SLOW_MIN_SAMPLES or ep.latency_ewma is None:
+        return
+    others = [o.latency_ewma for o in _endpoints
+              if o is not ep and o.latency_ewma is not None and o.requests >= SLOW_MIN_SAMPLES and o.available(now)]
+    if others and ep.latency_ewma > SLOW_FACTOR * min(others):
+        _eject_locked(ep, f"느림: 평균 {ep.latency_ewma:.1f}초 (최소 {min(others):.1f}초)", now)
+        # 복귀 후 다시 측정
+        ep.latency_ewma = None
+        ep.requests = 0
+
+
+# ====== 선택 ======
+def pick(model: Optional[str] = None, exclude: Optional[Set[str]] = None, affinity: Optional[str] = None) -> Endpoint:
+    """
+    진행 중 요청이 가장 적은 (제외되지 않았고 모델이 있는) 엔드포인트 → outstanding 1 증가.
+    진행 중 요청 수가 같으면 같은 시스템 프롬프트(affinity)를 최근 처리한 엔드포인트 우선 (접두부 KV 캐시 재사용).
+    """
+    now = time.time()
+    with _lock:
+        pool = [ep for ep in _endpoints if not exclude or ep.url not in exclude] or list(_endpoints)
+        healthy = [ep for ep in pool if ep.available(now) and ep.has_model(model)]
+        candidates = healthy or [ep for ep in pool if ep.available(now)] or pool
+        ep = min(candidates, key=lambda e: (
+            e.outstanding,
+            0 if affinity and affinity in e.prefixes else 1,
+            e.latency_ewma if e.latency_ewma is not None else 0.0,
+        ))
+        ep.outstanding += 1
+        if affinity and affinity not in ep.prefixes:
+            ep.prefixes.append(affinity)
+    return ep
+
+
+def release(ep: Endpoint, ok: bool, latency_s: float, error: str = "") -> None:
+    now = time.time()
+    with _lock:
+        ep.outstanding -= 1
+        if ok:
+            ep.requests += 1
+            ep.failures = 0
+            ep.latency_ewma = latency_s if ep.latency_ewma is None else (
+                EWMA_ALPHA * latency_s + (1 - EWMA_ALPHA) * ep.latency_ewma)
+            _check_slow_locked(ep, now)
+        else:
+            ep.errors += 1
+            _fail_locked(ep, error or "요청 실패", now)
+
+
+@contextmanager
+def routed(model: Optional[str] = None, exclude: Optional[Set[str]] = None, affinity: Optional[str] = None):
+    """with routed(model) as ep: ... — 연결 오류로 끝나면 실패로 기록 (모델 출력 오류 등은 성공으로 취급)"""
+    ep = pick(model, exclude, affinity)
+    started = time.perf_counter()
+    try:
+        yield ep
+    except Exception as e:
+        if is_connection_error(e):
+            release(ep, False, time.perf_counter() - started, type(e).__name__)
+        else:
+            release(ep, True, time.perf_counter() - started)
+        raise
+    else:
+        release(ep, True, time.perf_counter() - started)
+
+
+def is_connection_error(e: BaseException) -> bool:
+    """연결 거부/타임아웃 등 엔드포인트 문제인지 (ChatOllama 가 감싼 원인 예외까지 확인)"""
+    seen = 0
+    while e is not None and seen < 4:
+        if isinstance(e, (ConnectionError, TimeoutError)):
+            return True
+        name = type(e).__name__
+        if "Connect" in name or "Timeout" in name or name in ("RemoteProtocolError", "ReadError"):
+            return True
+        e = e.__cause__ or e.__context__
+        seen += 1
+    return False
+
+
+# ====== 헬스 체크 ======
+def check(ep: Endpoint) -> bool:
+    """/api/tags 조회 → 응답 여부/시간/모델 목록 갱신"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f"{ep.url}/api/tags", timeout=HEALTH_TIMEOUT_S) as resp:
+            data = json.loads(resp.read().decode("utf-8") or "{}")
+        models = {m.get("name") or m.get("model") for m in data.get("models", [])} - {None}
+        ok, error = True, ""
+    except Exception as e:
+        models, ok, error = None, False, f"헬스 체크 실패: {type(e).__name__}"
+    elapsed = time.perf_counter() - started
+    now = time.time()
+    with _lock:
+        ep.last_check = now
+        ep.check_s = round(elapsed, 3)
+        if ok:
+            ep.models = models
+            ep.failures = 0
+            if not ep.available(now) and ep.reason.startswith("연속 실패"):
+                # 다시 응답하면 바로 복귀
+                ep.ejected_until = 0.0
+                ep.reason = ""
+        else:
+            _fail_locked(ep, error, now)
+    return ok
+
+
+def check_all() -> None:
+    for ep in list(_endpoints):
+        check(ep)
+
+
+_health_started = False
+
+
+def _health_loop() -> None:
+    while True:
+        check_all()
+        time.sleep(HEALTH_INTERVAL_S)
+
+
+def start_health_checks() -> None:
+    """프로세스당 1회 백그라운드 헬스 체크 시작 (엔드포인트가 1개면 생략)"""
+    global _health_started
+    with _lock:
+        if _health_started or len(_endpoints) < 2 or HEALTH_INTERVAL_S <= 0:
+            return
+        _health_started = True
+    threading.Thread(target=_health_loop, name="ollama-health", daemon=True).start()
+
+
+def balancer_stats() -> Dict[str, Any]:
+    now = time.time()
+    with _lock:
+        endpoints = [ep.snapshot(now) for ep in _endpoints]
+    return {
+        "hosts": len(endpoints),
+        "available": sum(1 for e in endpoints if not e["ejected"]),
+        "outstanding": sum(e["outstanding"] for e in endpoints),
+        "endpoints": endpoints,
+    }
@@ -0,0 +1,257 @@
+# page_ready.py
+# 고정 페이지 로드 대기(최소 2초/최대 25초) 대신 페이지 준비 상태를 직접 감지한다.
+# 준비 = 문서 로딩 끝 + 네트워크 조용함 + DOM 변경 조용함 (+ 도메인별 ready 선택자가 보임)
+# - 네트워크: 페이지의 request/requestfinished/requestfailed 이벤트로 진행 중 요청 추적
+#   (LONG_REQUEST_S 넘게 열린 요청은 롱폴링/스트리밍으로 보고 추적에서 뺀다)
+# - DOM: MutationObserver 로 마지막 변경 시각 기록
+# - URL 패턴(호스트 + 앞 경로, ID 부분은 *)별 실제 대기 시간을 학습해, 느린 SPA 전환에서 초반의
+#   잠깐 조용한 구간을 준비 완료로 오판하지 않도록 판정을 미룬다
+# 결정적 스텝(navigate/click/fill)과 agent 세션(browser_use DOMWatchdog 의 _wait_for_stable_network 대체)에 쓰이며,
+# 대기마다 실제 대기 시간/판정 근거를 스텝 집계 dict와 page_ready_stats()에 남긴다.
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+import weakref
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+import metrics
+from net_profiles import DEFAULT_PROFILE as _NET_PROFILE
+from browser_support import current_page
+
+# ====== 설정 및 상수 ======
+ADAPTIVE = os.environ.get("PAGE_READY", "adaptive").lower() not in ("0", "off", "false", "fixed")
+QUIET_MS = float(os.environ.get("PAGE_READY_QUIET_MS", "500"))        # 네트워크/DOM 이 이만큼 조용하면 준비
+LONG_REQUEST_S = float(os.environ.get("PAGE_READY_LONG_REQUEST_S", "5"))
+SETTLE_CAP_S = float(os.environ.get("PAGE_READY_SETTLE_CAP_S", "3"))   # 학습값 기반 판정 보류 상한
+POLL_S = 0.1
+LEARN_ALPHA = 0.3
+MAX_RECORDS = 20   # 스텝 집계 dict에 남길 대기 기록 수
+
+# 페이지 로드 대기 (초): 감지기를 쓰면 browser_use 의 고정 최소 대기는 거의 없앤다
+PAGE_MAX_WAIT_S = float(os.environ.get("PAGE_MAX_WAIT_S", "25"))
+FIXED_MIN_WAIT_S = 2.0 if _NET_PROFILE == "off" else 1.0   # 감지기를 못 쓸 때 (요청 차단 시 네트워크가 빨리 조용해짐)
+PAGE_MIN_WAIT_S = float(os.environ.get("PAGE_MIN_WAIT_S", "0.25" if ADAPTIVE else str(FIXED_MIN_WAIT_S)))
+
+# 도메인(접미사) → 준비 판정에 추가로 요구할 CSS 선택자. 예) {"outlook.office.com": "[role=main] [role=listbox]"}
+try:
+    READY_SELECTORS: Dict[str, str] = dict(json.loads(os.environ.get("READY_SELECTORS", "") or "{}"))
+except (ValueError, TypeError):
+    READY_SELECTORS = {}
+
+_IGNORED_TYPES = ("websocket", "eventsource")
+_ID_SEGMENT_RE = re.compile(r"^(?=.*\d)[\w\-.=]{8,}$|^[0-9a-f\-]{16,}$", re.IGNORECASE)
+
+# 페이지에 MutationObserver 를 (없으면) 설치하고 [마지막 변경 후 ms, readyState, 선택자 보임] 반환
+_DOM_PROBE = """(sel) => {
+  if (!window.__wrReady) {
+    window.__wrReady = {last: performance.now()};
+    try {
+      new MutationObserver(() => { window.__wrReady.last = performance.now(); })
+        .observe(document, {subtree: true, childList: true, characterData: true});
+    } catch (e) {}
+  }
+  let found = true;
+  if (sel) {
+    const el = document.querySelector(sel);
+    found = !!el && el.getClientRects().length > 0;
+  }
+  return [performance.now() - window.__wrReady.last, document.readyState, found];
+}"""
+
+
+# ====== 네트워크 추적 ======
+class _NetTracker:
+    def __init__(self, page):
+        self.inflight: Dict[int, float] = {}
+        self.last_activity = time.perf_counter()
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+
+    def _started(self, request) -> None:
+        if getattr(request, "resource_type", "") in _IGNORED_TYPES:
+            return
+        self.inflight[id(request)] = time.perf_counter()
+        self.last_activity = time.perf_counter()
+
+    def _finished(self, request) -> None:
+        if self.inflight.pop(id(request), None) is not None:
+            self.last_activity = time.perf_counter()
+
+    def quiet_s(self) -> float:
+        now = time.perf_counter()
+        # 롱폴링/스트리밍은 끝나지 않을 수 있으므로 오래된 요청은 버린다 (페이지가 살아 있는 동안 무한히 쌓이지 않게)
+        for key in [k for k, t in self.inflight.items() if now - t >= LONG_REQUEST_S]:
+            del self.inflight[key]
+        if self.inflight:
+            return 0.0
+        return now - self.last_activity
+
+
+_trackers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()   # Playwright Page → _NetTracker
+
+
+def track(page) -> Optional[_NetTracker]:
+    """페이지의 요청 추적 시작 (이동/클릭 전에 부르면 그 요청부터 잡힘)"""
+    try:
+        tracker = _trackers.get(page)
+        if tracker is None:
+            tracker = _trackers[page] = _NetTracker(page)
+        return tracker
+    except Exception:
+        return None
+
+
+# ====== URL 패턴 학습 ======
+def url_pattern(url: str) -> str:
+    """호스트 + 앞 2개 경로 조각 (ID처럼 보이는 조각은 *)"""
+    parsed = urlparse(url or "")
+    parts = [p for p in parsed.path.split("/") if p][:2]
+    parts = ["*" if _ID_SEGMENT_RE.match(p) else p for p in parts]
+    return (parsed.hostname or "") + "/" + "/".join(parts)
+
+
+def ready_selector(url: str) -> Optional[str]:
+    host = (urlparse(url or "").hostname or "").lower()
+    for domain, selector in READY_SELECTORS.items():
+        domain = domain.lower()
+        if host == domain or host.endswith("." + domain):
+            return selector
+    return None
+
+
+_lock = threading.Lock()
+_learned: Dict[str, float] = {}
+_stats: Dict[str, Any] = {"waits": 0, "wait_s_total": 0.0, "timeouts": 0, "selector_waits": 0, "unsupported": 0}
+
+_current_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("page_ready_stats", default=None)
+
+
+def use_for_step(stats: Optional[Dict[str, Any]]) -> None:
+    """현재 컨텍스트(= 이 스텝의 agent 실행)의 대기를 stats 에 합산"""
+    _current_stats.set(stats)
+
+
+def _record(pattern: str, waited: float, reason: str, stats: Optional[Dict[str, Any]]) -> None:
+    with _lock:
+        prev = _learned.get(pattern)
+        _learned[pattern] = waited if prev is None else LEARN_ALPHA * waited + (1 - LEARN_ALPHA) * prev
+        _stats["waits"] += 1
+        _stats["wait_s_total"] += waited
+        if reason == "timeout":
+            _stats["timeouts"] += 1
+        elif reason == "selector":
+            _stats["selector_waits"] += 1
+    metrics.PAGE_READY_SECONDS.observe(waited, reason=reason)
+    if stats is not None:
+        stats["ready_waits"] = stats.get("ready_waits", 0) + 1
+        stats["ready_s"] = round(stats.get("ready_s", 0.0) + waited, 3)
+        records = stats.setdefault("ready", [])
+        if len(records) < MAX_RECORDS:
+            records.append({"url": pattern, "s": round(waited, 2), "by": reason})
+
+
+# ====== 준비 대기 ======
+async def wait_ready(page, stats: Optional[Dict[str, Any]] = None, max_s: Optional[float] = None) -> float:
+    """
+    페이지가 준비될 때까지 대기 → 실제 대기 초.
+    stats 를 주지 않으면 use_for_step() 으로 지정한 스텝 집계 dict에 기록한다.
+    """
+    stats = stats if stats is not None else _current_stats.get()
+    tracker = track(page)
+    started = time.perf_counter()
+    limit = PAGE_MAX_WAIT_S if max_s is None else max_s
+    pattern = url_pattern(getattr(page, "url", ""))
+    learned = _learned.get(pattern)
+    # 이 패턴이 전에 오래 걸렸으면 학습값의 절반까지는 조용해도 준비로 보지 않음 (SPA 전환 직후 빈 화면)
+    settle = min(learned * 0.5, SETTLE_CAP_S) if learned else 0.0
+    selector = ready_selector(getattr(page, "url", ""))
+    quiet = QUIET_MS / 1000
+    reason = "timeout"
+    while True:
+        elapsed = time.perf_counter() - started
+        try:
+            since_mutation_ms, state, found = await page.evaluate(_DOM_PROBE, selector)
+        except Exception:
+            # 이동 중이라 실행 컨텍스트가 바뀐 경우
+            since_mutation_ms, state, found = 0.0, "loading", False
+        net_quiet = tracker.quiet_s() >= quiet if tracker is not None else True
+        if (elapsed >= settle and state != "loading" and found and net_quiet
+                and since_mutation_ms >= QUIET_MS):
+            reason = "selector" if selector else "quiet"
+            break
+        if elapsed >= limit:
+            break
+        await asyncio.sleep(POLL_S)
+    waited = time.perf_counter() - started
+    # 이동 후 URL 기준으로 학습 (클릭으로 다른 화면이 열린 경우)
+    _record(url_pattern(getattr(page, "url", "")) or pattern, waited, reason, stats)
+    return waited
+
+
+def adapt_context(context) -> None:
+    """
+    browser_use BrowserSession 의 DOMWatchdog 네트워크 안정 대기(_wait_for_stable_network)를 준비 감지로 교체 (세션당 1회).
+    최소 대기(PAGE_MIN_WAIT_S = 프로필 minimum_wait_page_load_time)는 그대로 먼저 기다린다.
+    교체할 수 없으면 고정 최소 대기로 되돌리고 스텝 로그에 경고를 남긴다.
+    """
+    if not ADAPTIVE or context is None:
+        return
+    watchdog = getattr(context, "_dom_watchdog", None)
+    if watchdog is None or not hasattr(watchdog, "_wait_for_stable_network"):
+        profile = getattr(context, "browser_profile", None)
+        if profile is not None and "PAGE_MIN_WAIT_S" not in os.environ:
+            try:
+                profile.minimum_wait_page_load_time = max(profile.minimum_wait_page_load_time, FIXED_MIN_WAIT_S)
+            except Exception:
+                pass
+        with _lock:
+            _stats["unsupported"] += 1
+        stats = _current_stats.get()
+        if stats is not None:
+            stats["ready_error"] = "browser_use DOMWatchdog 대기를 교체할 수 없어 고정 대기를 사용"
+        return
+    if getattr(watchdog, "_page_ready_adapted", False):
+        return
+    original = watchdog._wait_for_stable_network
+
+    async def _wait_for_stable_network(*args, **kwargs):
+        page = await current_page(context)
+        if page is None:
+            return await original(*args, **kwargs)
+        min_wait = getattr(getattr(context, "browser_profile", None), "minimum_wait_page_load_time", 0) or 0
+        if min_wait > 0:
+            await asyncio.sleep(min_wait)
+        await wait_ready(page)
+
+    # DOMWatchdog 은 pydantic 모델 → 인스턴스 속성으로 메서드를 덮어쓴다 (필드 검증 우회)
+    object.__setattr__(watchdog, "_wait_for_stable_network", _wait_for_stable_network)
+    object.__setattr__(watchdog, "_page_ready_adapted", True)
+
+
+def summarize(stats: Optional[Dict[str, Any]]) -> str:
+    if stats and stats.get("ready_error"):
+        return f"⚠️ 페이지 준비 감지 미적용: {stats['ready_error']}"
+    if not stats or not stats.get("ready_waits"):
+        return ""
+    slowest = max(stats.get("ready", []), key=lambda r: r["s"], default=None)
+    tail = f", 최장 {slowest['s']:.1f}초 {slowest['url']}" if slowest else ""
+    return f"⏱ 페이지 준비 대기 {stats['ready_waits']}회 {stats['ready_s']:.1f}초{tail}"
+
+
+def page_ready_stats() -> Dict[str, Any]:
+    """대기 횟수/평균/시간 초과, 학습한 URL 패턴 중 느린 순 5개"""
+    with _lock:
+        stats = dict(_stats)
+        learned = sorted(_learned.items(), key=lambda kv: kv[1], reverse=True)
+    stats["wait_s_avg"] = round(stats["wait_s_total"] / stats["waits"], 3) if stats["waits"] else 0.0
+    stats["wait_s_total"] = round(stats["wait_s_total"], 3)
+    stats["patterns"] = len(learned)
+    stats["slowest"] = [{"url": p, "s": round(s, 2)} for p, s in learned[:5]]
+    stats["adaptive"] = ADAPTIVE
+    return stats
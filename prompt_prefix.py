@@ -0,0 +1,130 @@
+# prompt_prefix.py
+# 공통 프롬프트 접두부(시스템 프롬프트 + 안전 프리앰블) 재사용.
+# - 안전 프리앰블을 task 앞이 아니라 Agent 시스템 프롬프트 확장 슬롯(extend_system_message)에 넣어
+#   요청의 앞부분이 스텝/세션과 무관하게 byte 단위로 같도록 한다 → Ollama KV 캐시가 그 구간을 다시 계산하지 않음
+# - 같은 시스템 프롬프트 요청은 가능하면 직전에 처리한 엔드포인트로 보내도록 친화도 키 제공 (ollama_balancer)
+# - 엔드포인트/모델별 직전 요청과 공유한 접두부 길이와 Ollama가 보고한 프롬프트 평가 토큰/시간을 집계
+import hashlib
+import inspect
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+# ====== 설정 및 상수 ======
+CHARS_PER_TOKEN = float(os.environ.get("PREFIX_CHARS_PER_TOKEN", "4"))  # 절약 시간 추정용 평균 글자/토큰
+
+_supports_extend: Dict[type, bool] = {}
+
+
+def agent_prompt_kwargs(agent_cls, preamble: str, task: str) -> Dict[str, str]:
+    """
+    Agent(...) 에 넘길 task / extend_system_message.
+    extend_system_message 를 지원하지 않는 browser_use 버전이면 기존처럼 task 앞에 붙인다.
+    """
+    supported = _supports_extend.get(agent_cls)
+    if supported is None:
+        try:
+            supported = "extend_system_message" in inspect.signature(agent_cls.__init__).parameters
+        except (TypeError, ValueError):
+            supported = False
+        _supports_extend[agent_cls] = supported
+    if supported:
+        return {"task": task, "extend_system_message": preamble}
+    return {"task": preamble + "\n\n" + task}
+
+
+# ====== 친화도 키 ======
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(str(getattr(p, "text", "") or "") for p in content)
+    return str(content or "")
+
+
+def affinity_key(messages) -> Optional[str]:
+    """첫 시스템 메시지 해시 (없으면 None)"""
+    if not messages:
+        return None
+    first = messages[0]
+    if getattr(first, "role", None) != "system":
+        return None
+    return hashlib.sha1(_text(getattr(first, "content", "")).encode("utf-8")).hexdigest()[:16]
+
+
+# ====== 접두부 통계 ======
+def _serialize(messages) -> Tuple[str, int]:
+    """Ollama chat 메시지 → (비교용 문자열, 시스템 메시지 길이). 이미지는 해시로 대체"""
+    parts, system_len = [], 0
+    for m in messages or []:
+        get = m.get if isinstance(m, dict) else (lambda k, _m=m: getattr(_m, k, None))
+        role = get("role") or ""
+        images = "".join(
+            "<img:" + hashlib.sha1(str(img).encode("utf-8")).hexdigest()[:12] + ">" for img in (get("images") or [])
+        )
+        chunk = f"<{role}>\n{get('content') or ''}{images}\n"
+        if role == "system" and not parts:
+            system_len = len(chunk)
+        parts.append(chunk)
+    return "".join(parts), system_len
+
+
+def _common_prefix_len(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    # 블록 단위로 먼저 비교 후 남은 구간만 한 글자씩
+    i, step = 0, 256
+    while i + step <= n and a[i:i + step] == b[i:i + step]:
+        i += step
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+_lock = threading.Lock()
+_last_prompt: Dict[Tuple[str, str], str] = {}
+_stats: Dict[str, Any] = {
+    "requests": 0,
+    "prefix_hits": 0,          # 직전 요청과 시스템 프롬프트 전체를 공유
+    "prompt_chars": 0,
+    "shared_chars": 0,
+    "prompt_eval_tokens": 0,   # Ollama가 실제로 평가한 프롬프트 토큰
+    "prompt_eval_s": 0.0,
+    "eval_tokens": 0,
+}
+
+
+def observe(host: str, model: str, messages, response) -> Dict[str, int]:
+    """chat 요청/응답 1건 기록 → {prompt_tokens, completion_tokens} (Ollama 응답 기준)"""
+    text, system_len = _serialize(messages)
+    prompt_tokens = int(getattr(response, "prompt_eval_count", 0) or 0)
+    completion_tokens = int(getattr(response, "eval_count", 0) or 0)
+    eval_s = (getattr(response, "prompt_eval_duration", 0) or 0) / 1e9
+    with _lock:
+        prev = _last_prompt.get((host, model), "")
+        shared = _common_prefix_len(prev, text) if prev else 0
+        _last_prompt[(host, model)] = text
+        _stats["requests"] += 1
+        _stats["prompt_chars"] += len(text)
+        _stats["shared_chars"] += shared
+        if system_len and shared >= system_len:
+            _stats["prefix_hits"] += 1
+        _stats["prompt_eval_tokens"] += prompt_tokens
+        _stats["prompt_eval_s"] += eval_s
+        _stats["eval_tokens"] += completion_tokens
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+def prefix_stats() -> Dict[str, Any]:
+    """
+    접두부 적중률(요청 수/글자 수 기준)과 절약 시간 추정.
+    est_saved_s = 공유 글자 수 / CHARS_PER_TOKEN × 평가 토큰당 평균 시간 (CPU 추론에서의 대략값)
+    """
+    with _lock:
+        stats = dict(_stats)
+    req = stats["requests"]
+    stats["prefix_hit_rate"] = round(stats["prefix_hits"] / req, 4) if req else 0.0
+    stats["shared_char_ratio"] = round(stats["shared_chars"] / stats["prompt_chars"], 4) if stats["prompt_chars"] else 0.0
+    per_token = stats["prompt_eval_s"] / stats["prompt_eval_tokens"] if stats["prompt_eval_tokens"] else 0.0
+    stats["prompt_eval_s"] = round(stats["prompt_eval_s"], 3)
+    stats["est_saved_s"] = round(stats["shared_chars"] / CHARS_PER_TOKEN * per_token, 2)
+    return stats
@@ -2,12 +2,17 @@
 import os
 os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")  # 로컬 Ollama 기본값
 
-import yaml
 from datetime import datetime
 import gradio as gr
 
 # 기본 필수만 확실히 임포트
-from browser_use import Agent, ChatOllama
+from browser_use import Agent
+
+from script_plan import get_plan
+from llm_pool import get_llm
+from model_cascade import cascade_agent
+from prompt_prefix import agent_prompt_kwargs
+from display_mode import DEFAULT_HEADLESS
 
 # 브라우저 설정은 버전에 따라 최상위 export가 없을 수 있으므로 안전 임포트
 Browser = BrowserConfig = BrowserContextConfig = None
@@ -18,10 +23,16 @@ except Exception:
     # 구버전/내보내기 없는 경우엔 내부 기본 브라우저로 자동 폴백
     pass
 
+SAFETY_PREAMBLE = (
+    "안전 정책:\n"
+    "- 절대 비밀번호/MFA를 직접 입력하지 마라.\n"
+    "- 로그인 단계가 필요하면 사용자에게 로그인 완료를 요청하고, 그 단계에서 작업을 종료하라."
+)
+
 # ====== 공통 리소스(세션마다 1개) ======
 def make_llm():
-    # 화면을 "보고" 판단 → 비전 모델 사용
-    return ChatOllama(model="llama3.2-vision")
+    # 화면을 "보고" 판단 → 비전 모델 사용 (프로세스 공유 클라이언트 풀)
+    return get_llm()
 
 def make_browser():
     """
@@ -32,7 +43,7 @@ def make_browser():
         cfg = None
         if BrowserContextConfig:
             cfg = BrowserConfig(
-                headless=False,  # 창 보이게
+                headless=DEFAULT_HEADLESS,  # 데스크톱은 창 보이게, 서버는 헤드리스 (BROWSER_HEADLESS)
                 new_context_config=BrowserContextConfig(
                     allowed_domains=[
                         "office.com", "www.office.com",
@@ -48,23 +59,15 @@ def make_browser():
             )
         else:
             # BrowserContextConfig가 없는 구성에선 최소 설정만
-            cfg = BrowserConfig(headless=False)
+            cfg = BrowserConfig(headless=DEFAULT_HEADLESS)
         return Browser(config=cfg)
     # 폴백: 내부 기본 브라우저 사용
     return None
 
 # ====== 실행 엔진 ======
 def parse_script(yaml_text: str):
-    data = yaml.safe_load(yaml_text) or {}
-    steps = data.get("steps", [])
-    if not isinstance(steps, list) or not steps:
-        raise ValueError("YAML에 steps 리스트가 필요합니다.")
-    for i, s in enumerate(steps):
-        if "type" not in s:
-            raise ValueError(f"{i+1}번째 step에 type 필드가 없습니다.")
-        if s["type"] == "agent" and "task" not in s:
-            raise ValueError(f"{i+1}번째 step(type=agent)에 task가 필요합니다.")
-    return steps
+    # 컴파일된 계획 캐시(script_plan) 공유
+    return [dict(s.raw) for s in get_plan(yaml_text)]
 
 def run_until_wait(script_text, idx, log, waiting, llm, browser):
     """Start/Resume 실행: '사람 액션 필요' 지점까지 자동 진행 후 멈춤"""
@@ -74,46 +77,42 @@ def run_until_wait(script_text, idx, log, waiting, llm, browser):
         browser = make_browser()
 
     try:
-        steps = parse_script(script_text)
+        plan = get_plan(script_text)
     except Exception as e:
         return idx, log + f"\n❌ 스크립트 파싱 오류: {e}", True, "", llm, browser
 
-    n = len(steps)
+    n = len(plan)
     msg_to_user = ""
     waiting_now = False
     today_kr = datetime.now().strftime("%Y-%m-%d")
 
     while idx < n:
-        step = steps[idx]
-        stype = step.get("type")
-        sname = step.get("name", f"step_{idx+1}")
+        step = plan[idx]
+        stype = step.type
+        sname = step.name
 
         if stype == "agent":
-            task = (step.get("task") or "").replace("{today}", today_kr)
-            res = Agent(
-                task=(
-                    "안전 정책:\n"
-                    "- 절대 비밀번호/MFA를 직접 입력하지 마라.\n"
-                    "- 로그인 단계가 필요하면 사용자에게 로그인 완료를 요청하고, 그 단계에서 작업을 종료하라.\n\n"
-                ) + task,
-                llm=llm,
-                use_vision=True,
+            task = step.render_task(today_kr)
+            # 스텝의 vision/model 설정에 따라 모델 선택 (vision: auto 면 텍스트 모델 먼저)
+            res = cascade_agent(lambda agent_llm, use_vision: Agent(
+                # 안전 정책은 시스템 프롬프트 슬롯에 (스텝 간 공통 접두부)
+                **agent_prompt_kwargs(Agent, SAFETY_PREAMBLE, task),
+                llm=agent_llm,
+                use_vision=use_vision,
                 browser=browser,   # None이면 내부 기본 브라우저 사용
-            ).run_sync()
+            ), step.model, llm).run_sync()
 
             log += f"\n\n### ✅ {sname} (agent)\n{res}\n"
             idx += 1
 
             # 결과에 특정 문자열이 있으면 사용자 액션 요청 후 멈춤
-            wfi = step.get("wait_for_user_if")  # {"contains": "...", "message": "..."}
-            if isinstance(wfi, dict) and wfi.get("contains"):
-                if str(wfi["contains"]).lower() in str(res).lower():
-                    msg_to_user = wfi.get("message", "사용자 액션이 필요합니다. 완료 후 '다음 스텝 실행'을 누르세요.")
-                    waiting_now = True
-                    break
+            if step.wait_rule and step.wait_rule.matches(res):
+                msg_to_user = step.wait_rule.message
+                waiting_now = True
+                break
 
         elif stype == "require_user":
-            msg_to_user = step.get("message", "이 단계를 사람이 처리하세요. 완료 후 '다음 스텝 실행'을 누르세요.")
+            msg_to_user = step.message or "이 단계를 사람이 처리하세요. 완료 후 '다음 스텝 실행'을 누르세요."
             log += f"\n\n### ⏸ {sname} (require_user)\n- 안내: {msg_to_user}\n"
             idx += 1
             waiting_now = True
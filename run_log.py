@@ -0,0 +1,171 @@
+# run_log.py
+# 실행 로그를 문자열 누적 대신 구조화된 레코드로 관리한다.
+# - 레코드는 추가 즉시 LOGS_DIR 아래 JSONL 파일에 한 줄씩 기록(flush) → 중간에 죽어도 손실 없음
+# - 레코드별 바이트 오프셋을 .idx 파일에 함께 기록 → 특정 레코드/스텝을 파일 전체를 읽지 않고 조회
+# - 메모리에는 최근 TAIL_SIZE개만 보관하고, UI에는 꼬리(tail) 또는 페이지 단위로만 렌더링
+import os
+import json
+import uuid
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# ====== 설정 및 상수 ======
+LOGS_DIR = Path("./logs")
+TAIL_SIZE = int(os.environ.get("RUN_LOG_TAIL_SIZE", "200"))
+DEFAULT_TAIL_RENDER = 20
+PAGE_SIZE = 20
+
+_KIND_ICONS = {
+    "agent": "✅",
+    "browser": "🧭",
+    "require_user": "⏸",
+    "warning": "⚠️",
+    "error": "❌",
+    "info": "ℹ️",
+    "done": "🎉",
+    "metrics": "📊",
+    "auth": "🔑",
+    "display": "🖥",
+    "foreach": "🔀",
+}
+
+
+def new_session_id() -> str:
+    """세션 ID (시간 + 충돌 방지용 접미사)"""
+    return datetime.now().strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+
+
+def render_record(rec: Dict[str, Any]) -> str:
+    """레코드 1건 → Markdown"""
+    icon = _KIND_ICONS.get(rec.get("kind"), "📝")
+    name = rec.get("name")
+    if name:
+        head = f"### {icon} {name} ({rec.get('kind')})"
+        return f"{head}\n{rec.get('text', '')}"
+    return f"{icon} {rec.get('text', '')}"
+
+
+class RunLog:
+    """세션 하나의 추가 전용(append-only) 실행 로그"""
+
+    def __init__(self, session_id: Optional[str] = None, logs_dir: Path = LOGS_DIR):
+        self.session_id = session_id or new_session_id()
+        logs_dir = Path(logs_dir)
+        logs_dir.mkdir(parents=True, exist_ok=True)
+        self.path = logs_dir / f"session_{self.session_id}.jsonl"
+        self.index_path = logs_dir / f"session_{self.session_id}.idx"
+        self.seq = 0
+        self._tail: deque = deque(maxlen=max(TAIL_SIZE, 1))
+
+    @classmethod
+    def reopen(cls, session_id: str, logs_dir: Path = LOGS_DIR) -> "RunLog":
+        """기존 세션 로그를 이어서 기록 (체크포인트 재개용). 기록 도중 죽어 잘린 마지막 인덱스 줄은 버린다"""
+        log = cls(session_id, logs_dir)
+        log._truncate_partial_index()
+        entries = log._read_index()
+        log.seq = entries[-1][0] + 1 if entries else 0
+        for _, _, offset, length in entries[-log._tail.maxlen:]:
+            log._tail.append(log._read_at(offset, length))
+        return log
+
+    # ---- 기록 ----
+    def append(self, kind: str, text: str = "", name: Optional[str] = None, step: Optional[int] = None, **extra) -> Dict[str, Any]:
+        """레코드 추가 + 즉시 디스크 기록"""
+        rec = {
+            "seq": self.seq,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "kind": kind,
+            "step": step,
+            "name": name,
+            "text": text,
+        }
+        rec.update(extra)
+        line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+
+        # 파일 핸들은 유지하지 않음 (gr.State 복사/직렬화 안전)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(f"{rec['seq']}\t{'' if step is None else step}\t{offset}\t{len(line)}\n")
+
+        self._tail.append(rec)
+        self.seq += 1
+        return rec
+
+    # ---- 조회 ----
+    def tail(self, n: int = DEFAULT_TAIL_RENDER) -> List[Dict[str, Any]]:
+        return list(self._tail)[-n:] if n > 0 else []
+
+    def render_tail(self, n: int = DEFAULT_TAIL_RENDER) -> str:
+        """최근 n건만 Markdown으로 렌더링 (이벤트당 전송량 일정)"""
+        recs = self.tail(n)
+        if not recs:
+            return "실행 로그가 여기에 표시됩니다."
+        head = f"_전체 {self.seq}건 중 최근 {len(recs)}건 · {self.path}_\n\n" if self.seq > len(recs) else ""
+        return head + "\n\n".join(render_record(r) for r in recs)
+
+    def _truncate_partial_index(self) -> None:
+        """줄바꿈으로 끝나지 않은 마지막 인덱스 줄 제거 (다음 append 가 그 뒤에 이어 붙지 않도록)"""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _read_index(self) -> List[List[int]]:
+        """인덱스 항목 목록 (형식이 깨졌거나 로그 파일 범위를 벗어난 줄은 건너뜀)"""
+        entries = []
+        if not self.index_path.exists():
+            return entries
+        size = self.path.stat().st_size if self.path.exists() else 0
+        with open(self.index_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    continue
+                try:
+                    seq, step, offset, length = line.rstrip("\n").split("\t")
+                    entry = [int(seq), int(step) if step else -1, int(offset), int(length)]
+                except ValueError:
+                    continue
+                if entry[2] + entry[3] <= size:
+                    entries.append(entry)
+        return entries
+
+    def _read_at(self, offset: int, length: int) -> Dict[str, Any]:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length).decode("utf-8"))
+
+    def get(self, seq: int) -> Optional[Dict[str, Any]]:
+        """seq 번호로 레코드 1건 조회 (인덱스 → seek)"""
+        for rec in self._tail:
+            if rec["seq"] == seq:
+                return rec
+        entries = self._read_index()
+        # seq는 0부터 연속이므로 인덱스 위치로 바로 접근
+        if 0 <= seq < len(entries) and entries[seq][0] == seq:
+            _, _, offset, length = entries[seq]
+            return self._read_at(offset, length)
+        return None
+
+    def find_step(self, step: int) -> List[Dict[str, Any]]:
+        """스텝 인덱스로 해당 스텝의 레코드 조회"""
+        return [self._read_at(o, l) for _, st, o, l in self._read_index() if st == step]
+
+    def page(self, page: int, page_size: int = PAGE_SIZE) -> List[Dict[str, Any]]:
+        """1부터 시작하는 페이지 단위 조회 (디스크에서 해당 구간만 읽음)"""
+        entries = self._read_index()
+        start = max(page - 1, 0) * page_size
+        return [self._read_at(o, l) for _, _, o, l in entries[start:start + page_size]]
+
+    def render_page(self, page: int, page_size: int = PAGE_SIZE) -> str:
+        recs = self.page(page, page_size)
+        if not recs:
+            return f"_{page} 페이지에 로그가 없습니다._"
+        total_pages = (self.seq + page_size - 1) // page_size
+        return f"_{page}/{total_pages} 페이지_\n\n" + "\n\n".join(render_record(r) for r in recs)
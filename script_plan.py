@@ -0,0 +1,495 @@
+# script_plan.py
+# YAML 스크립트를 한 번만 파싱/검증해 불변 "실행 계획"으로 컴파일하고,
+# 스크립트 본문 해시를 키로 하는 LRU 캐시에 보관한다.
+# web_script_runner_plus.run_until_wait / web_app.run_script_step / run_agent.py 가 공유한다.
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple, Mapping
+
+import yaml
+
+from image_pipeline import ImageOptions, parse_options as parse_image_options
+from model_cascade import ModelChoice, parse_choice as parse_model_choice
+from net_profiles import parse_profile as parse_net_profile
+
+# ====== 설정 및 상수 ======
+PLAN_CACHE_SIZE = int(os.environ.get("PLAN_CACHE_SIZE", "32"))
+
+# LLM 없이 브라우저에서 직접 실행하는 결정적 스텝 (browser_steps.py)
+BROWSER_STEP_TYPES = ("navigate", "click", "fill", "wait_for", "extract")
+# agent를 실행하는 스텝 (foreach: 목록 항목마다 agent, fanout.py)
+AGENT_STEP_TYPES = ("agent", "foreach")
+STEP_TYPES = AGENT_STEP_TYPES + ("require_user",) + BROWSER_STEP_TYPES
+
+# 타입별 템플릿({today}/{prompt}/{item}) 치환 대상 필드
+TEMPLATE_FIELDS = {"agent": "task", "foreach": "task", "navigate": "url", "fill": "value", "click": "text",
+                   "wait_for": "text"}
+
+WAIT_STATES = ("attached", "detached", "visible", "hidden")
+
+# 템플릿 변수: {today}, {prompt}, {item}(foreach 항목)
+_TEMPLATE_VAR_RE = re.compile(r"\{(today|prompt|item)\}")
+
+DEFAULT_FOREACH_MAX_ITEMS = 20
+
+DEFAULT_WAIT_MESSAGE = "사용자 액션이 필요합니다. 완료 후 '다음 스텝 실행'을 누르세요."
+
+# 모델 선택 필드 (스텝 또는 스크립트 최상위)
+MODEL_FIELDS = ("vision", "model", "text_model")
+
+# cache: 블록에서 키로 쓸 수 있는 필드
+CACHE_KEY_FIELDS = ("task", "url", "script", "prompt", "today")
+DEFAULT_CACHE_KEY = ("task", "url", "script")
+DEFAULT_CACHE_TTL = 600
+
+
+# ====== 컴파일된 구성요소 ======
+@dataclass(frozen=True)
+class TaskTemplate:
+    """미리 분할된 task 템플릿 (리터럴과 변수 이름이 번갈아 저장됨)"""
+    parts: Tuple[Tuple[bool, str], ...]  # (is_var, text)
+
+    @classmethod
+    def compile(cls, text: str) -> "TaskTemplate":
+        parts = []
+        pos = 0
+        for m in _TEMPLATE_VAR_RE.finditer(text):
+            if m.start() > pos:
+                parts.append((False, text[pos:m.start()]))
+            parts.append((True, m.group(1)))
+            pos = m.end()
+        if pos < len(text):
+            parts.append((False, text[pos:]))
+        return cls(tuple(parts))
+
+    def render(self, **variables: str) -> str:
+        # 전달되지 않은 변수는 원문 그대로 남김
+        return "".join(variables.get(t, "{" + t + "}") if is_var else t for is_var, t in self.parts)
+
+
+@dataclass(frozen=True)
+class WaitRule:
+    """wait_for_user_if 매처 (대소문자 무시 부분 문자열 비교)"""
+    needle: str
+    message: str
+
+    def matches(self, result: Any) -> bool:
+        return self.needle in str(result).lower()
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    """스텝 결과 메모이제이션 설정 (cache: {ttl, key, expect_url})"""
+    ttl: float
+    key_fields: Tuple[str, ...]
+    expect_url: Optional[str]
+
+
+@dataclass(frozen=True)
+class AuthRule:
+    """로그인 스텝 표시 (auth: {probe, expect_url}) — 저장된 세션이 probe에서 유효하면 스텝 생략 (auth_state.py)"""
+    probe: str
+    expect_url: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ForeachRule:
+    """foreach 스텝의 항목 원본 (앞선 스텝 출력 또는 YAML 리스트)과 상한"""
+    source: Optional[int]           # 항목을 뽑을 앞선 스텝 인덱스 (None: items 리스트)
+    items: Tuple[Any, ...] = ()
+    max_items: int = DEFAULT_FOREACH_MAX_ITEMS
+    max_parallel: Optional[int] = None  # None: 스크립트 max_parallel
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    """검증이 끝난 단일 스텝"""
+    index: int
+    name: str
+    type: str
+    template: Optional[TaskTemplate]
+    wait_rule: Optional[WaitRule]
+    message: Optional[str]
+    deps: Tuple[int, ...]
+    cache_rule: Optional[CacheRule]
+    raw: Mapping[str, Any]
+    replay: bool = False  # 기록된 액션 경로 재생 (trajectory.py)
+    image: Optional[ImageOptions] = None  # 스크린샷 전처리 설정 (image_pipeline.py)
+    llm_cache: bool = True  # LLM 응답 디스크 캐시 사용 (llm_cache.py)
+    dom_diff: Optional[bool] = None  # 요소 목록 변경분만 전송 (dom_diff.py, None: DOM_DIFF 설정을 따름)
+    model: Optional[ModelChoice] = None  # 모델/비전 사용 방식 (model_cascade.py)
+    auth: Optional[AuthRule] = None  # 로그인 스텝 (auth_state.py)
+    network: Optional[str] = None  # 요청 차단 프로필 (net_profiles.py, None: NET_PROFILE)
+    foreach: Optional[ForeachRule] = None  # 목록 팬아웃 (fanout.py)
+
+    @property
+    def batchable(self) -> bool:
+        """병렬 묶음에 넣을 수 있는 스텝 (cache/replay/auth 는 세션 공유 탭에서 순차 실행할 때만 적용되므로 제외)"""
+        return self.type == "agent" and self.cache_rule is None and not self.replay and self.auth is None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """기존 dict 스텝과 동일하게 원본 필드 조회"""
+        return self.raw.get(key, default)
+
+    def render_task(self, today: str, prompt: Optional[str] = None, item: Optional[str] = None) -> str:
+        """템플릿 필드(agent/foreach=task, navigate=url, fill=value, click/wait_for=text) 렌더링"""
+        if not self.template:
+            return ""
+        variables = {"today": today}
+        if prompt is not None:
+            variables["prompt"] = prompt
+        if item is not None:
+            variables["item"] = item
+        return self.template.render(**variables)
+
+
+@dataclass(frozen=True)
+class ScriptPlan:
+    """컴파일된 스크립트 실행 계획"""
+    script_hash: str
+    steps: Tuple[CompiledStep, ...]
+    meta: Mapping[str, Any]
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getitem__(self, idx: int) -> CompiledStep:
+        return self.steps[idx]
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    @property
+    def auth_index(self) -> int:
+        """첫 로그인(auth) 스텝 인덱스 (없으면 -1)"""
+        return next((s.index for s in self.steps if s.auth is not None), -1)
+
+    def ready_batch(self, idx: int) -> List[int]:
+        """
+        idx부터 동시에 실행 가능한 agent 스텝 인덱스 목록.
+        완료된 스텝(< idx)에만 의존하는 연속 agent 스텝(cache/replay/auth 없는)을 한 묶음으로 본다.
+        """
+        if idx >= len(self.steps):
+            return []
+        if not self.steps[idx].batchable:
+            return [idx]
+        batch = [idx]
+        for step in self.steps[idx + 1:]:
+            if not step.batchable or any(d >= idx for d in step.deps):
+                break
+            batch.append(step.index)
+        return batch
+
+
+# ====== 컴파일 ======
+def script_hash(yaml_text: str) -> str:
+    """스크립트 본문 해시 (캐시 키)"""
+    return hashlib.sha256((yaml_text or "").encode("utf-8")).hexdigest()
+
+
+def _step_ref(i: int, field: str, name: Any, names: Dict[str, int]) -> int:
+    """스텝 이름 → 앞선 스텝 인덱스"""
+    j = names.get(str(name))
+    if j is None:
+        raise ValueError(f"{i+1}번째 step의 {field}에 알 수 없는 스텝 '{name}'이(가) 있습니다.")
+    if j < 0:
+        raise ValueError(f"{i+1}번째 step의 {field}이 중복된 스텝 이름 '{name}'을(를) 참조합니다.")
+    if j >= i:
+        raise ValueError(f"{i+1}번째 step은 앞선 스텝에만 의존할 수 있습니다: '{name}'")
+    return j
+
+
+def _resolve_deps(i: int, s: Dict[str, Any], names: Dict[str, int]) -> Tuple[int, ...]:
+    """depends_on → 선행 스텝 인덱스 (미지정 시 바로 앞 스텝에 의존 = 순차 실행)"""
+    if "depends_on" not in s:
+        return (i - 1,) if i > 0 else ()
+    dep = s.get("depends_on") or []
+    if isinstance(dep, str):
+        dep = [dep]
+    if not isinstance(dep, list):
+        raise ValueError(f"{i+1}번째 step의 depends_on은 스텝 이름 목록이어야 합니다.")
+    deps = [_step_ref(i, "depends_on", d, names) for d in dep]
+    return tuple(sorted(set(deps)))
+
+
+def _compile_cache_rule(i: int, s: Dict[str, Any]) -> Optional[CacheRule]:
+    """cache: true | {ttl: 초, key: [필드...], expect_url: "..."}"""
+    spec = s.get("cache")
+    if not spec:
+        return None
+    if s["type"] != "agent":
+        raise ValueError(f"{i+1}번째 step: cache는 agent 스텝에만 사용할 수 있습니다.")
+    if spec is True:
+        spec = {}
+    if not isinstance(spec, dict):
+        raise ValueError(f"{i+1}번째 step의 cache는 true 또는 매핑이어야 합니다.")
+    try:
+        ttl = float(spec.get("ttl", DEFAULT_CACHE_TTL))
+    except (TypeError, ValueError):
+        raise ValueError(f"{i+1}번째 step의 cache.ttl은 초 단위 숫자여야 합니다.")
+    key = spec.get("key", list(DEFAULT_CACHE_KEY))
+    if isinstance(key, str):
+        key = [key]
+    bad = [k for k in key if k not in CACHE_KEY_FIELDS]
+    if bad:
+        raise ValueError(f"{i+1}번째 step의 cache.key에 알 수 없는 필드가 있습니다: {bad} (허용: {list(CACHE_KEY_FIELDS)})")
+    return CacheRule(ttl=ttl, key_fields=tuple(key), expect_url=spec.get("expect_url"))
+
+
+def _compile_replay(i: int, s: Dict[str, Any]) -> bool:
+    """replay: true → 첫 실행의 액션 경로를 기록하고 이후 실행에서 LLM 없이 재생"""
+    if not s.get("replay"):
+        return False
+    if s["type"] != "agent":
+        raise ValueError(f"{i+1}번째 step: replay는 agent 스텝에만 사용할 수 있습니다.")
+    if not isinstance(s["replay"], bool):
+        raise ValueError(f"{i+1}번째 step의 replay는 true/false여야 합니다.")
+    return True
+
+
+def _compile_auth(i: int, s: Dict[str, Any]) -> Optional[AuthRule]:
+    """auth: "https://..." | {probe: URL, expect_url: "..."}"""
+    spec = s.get("auth")
+    if not spec:
+        return None
+    if s["type"] == "require_user":
+        raise ValueError(f"{i+1}번째 step: auth는 require_user 스텝에 사용할 수 없습니다.")
+    if isinstance(spec, str):
+        spec = {"probe": spec}
+    if not isinstance(spec, dict) or not isinstance(spec.get("probe"), str) or "://" not in spec["probe"]:
+        raise ValueError(f"{i+1}번째 step의 auth는 probe URL 또는 {{probe: URL, expect_url: ...}} 매핑이어야 합니다.")
+    expect = spec.get("expect_url")
+    if expect is not None and not isinstance(expect, str):
+        raise ValueError(f"{i+1}번째 step의 auth.expect_url은 문자열이어야 합니다.")
+    return AuthRule(probe=spec["probe"], expect_url=expect or None)
+
+
+def _compile_foreach(i: int, s: Dict[str, Any], names: Dict[str, int]) -> Optional[ForeachRule]:
+    """foreach 스텝: items: 앞선 스텝 이름 | [항목...], max_items, max_parallel"""
+    if s["type"] != "foreach":
+        for key in ("items", "max_items"):
+            if key in s:
+                raise ValueError(f"{i+1}번째 step: {key}는 foreach 스텝에만 사용할 수 있습니다.")
+        return None
+    spec = s.get("items")
+    if isinstance(spec, list):
+        if not spec:
+            raise ValueError(f"{i+1}번째 step(type=foreach)의 items 리스트가 비어 있습니다.")
+        source, items = None, tuple(spec)
+    elif isinstance(spec, str) and spec:
+        source, items = _step_ref(i, "items", spec, names), ()
+    else:
+        raise ValueError(f"{i+1}번째 step(type=foreach)에 items(앞선 스텝 이름 또는 리스트)가 필요합니다.")
+    limits = {}
+    for key in ("max_items", "max_parallel"):
+        if key not in s:
+            continue
+        value = s[key]
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"{i+1}번째 step의 {key}는 1 이상의 정수여야 합니다.")
+        limits[key] = value
+    return ForeachRule(source=source, items=items, **limits)
+
+
+def _compile_flag(i: int, s: Dict[str, Any], key: str, default: Optional[bool]) -> Optional[bool]:
+    value = s.get(key, default)
+    if value is None:
+        return default
+    if not isinstance(value, bool):
+        raise ValueError(f"{i+1}번째 step의 {key}는 true/false여야 합니다.")
+    return value
+
+
+def _compile_image(i: int, s: Dict[str, Any], base: Optional[ImageOptions]) -> Optional[ImageOptions]:
+    """image: 블록 → 스크립트 최상위 설정 위에 덮어쓴 전처리 설정 (agent/foreach 스텝만)"""
+    if s["type"] not in AGENT_STEP_TYPES:
+        if "image" in s:
+            raise ValueError(f"{i+1}번째 step: image는 agent/foreach 스텝에만 사용할 수 있습니다.")
+        return None
+    if "image" not in s:
+        return base
+    try:
+        return parse_image_options(s["image"], base)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{i+1}번째 step: {e}")
+
+
+def _compile_model(i: int, s: Dict[str, Any], base: Optional[ModelChoice]) -> Optional[ModelChoice]:
+    """vision/model/text_model → 스크립트 최상위 설정 위에 덮어쓴 모델 선택 (agent/foreach 스텝만)"""
+    given = [k for k in MODEL_FIELDS if k in s]
+    if s["type"] not in AGENT_STEP_TYPES:
+        if given:
+            raise ValueError(f"{i+1}번째 step: {', '.join(given)}는 agent/foreach 스텝에만 사용할 수 있습니다.")
+        return None
+    if not given:
+        return base
+    try:
+        return parse_model_choice(s, base)
+    except ValueError as e:
+        raise ValueError(f"{i+1}번째 step: {e}")
+
+
+def _compile_network(i: int, s: Dict[str, Any], base: Optional[str]) -> Optional[str]:
+    """network: 프로필 이름 → 스크립트 최상위 설정 위에 덮어씀 (브라우저를 쓰는 스텝만)"""
+    if "network" not in s:
+        return base if s["type"] != "require_user" else None
+    if s["type"] == "require_user":
+        raise ValueError(f"{i+1}번째 step: network는 require_user 스텝에 사용할 수 없습니다.")
+    try:
+        return parse_net_profile(s["network"])
+    except ValueError as e:
+        raise ValueError(f"{i+1}번째 step: {e}")
+
+
+def _validate_browser_step(i: int, s: Dict[str, Any]) -> None:
+    """결정적 스텝의 필수 필드 검사"""
+    stype = s["type"]
+    target = s.get("selector") or s.get("text")
+    if stype == "navigate" and not s.get("url"):
+        raise ValueError(f"{i+1}번째 step(type=navigate)에 url이 필요합니다.")
+    if stype in ("click", "fill") and not target:
+        raise ValueError(f"{i+1}번째 step(type={stype})에 selector 또는 text가 필요합니다.")
+    if stype == "fill" and "value" not in s:
+        raise ValueError(f"{i+1}번째 step(type=fill)에 value가 필요합니다.")
+    if stype == "wait_for":
+        if not (target or s.get("url")):
+            raise ValueError(f"{i+1}번째 step(type=wait_for)에 selector, text, url 중 하나가 필요합니다.")
+        if s.get("state", "visible") not in WAIT_STATES:
+            raise ValueError(f"{i+1}번째 step의 state는 {list(WAIT_STATES)} 중 하나여야 합니다.")
+    if stype == "extract":
+        if not s.get("selector"):
+            raise ValueError(f"{i+1}번째 step(type=extract)에 selector가 필요합니다.")
+        if "fields" in s and not isinstance(s["fields"], dict):
+            raise ValueError(f"{i+1}번째 step의 fields는 {{이름: 선택자}} 매핑이어야 합니다.")
+    for key in ("timeout", "nth", "limit"):
+        if key in s:
+            try:
+                float(s[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{i+1}번째 step의 {key}는 숫자여야 합니다.")
+
+
+def _compile_step(i: int, s: Any, names: Dict[str, int], image_base: Optional[ImageOptions] = None,
+                  model_base: Optional[ModelChoice] = None, network_base: Optional[str] = None) -> CompiledStep:
+    if not isinstance(s, dict):
+        raise ValueError(f"{i+1}번째 step이 매핑 형식이 아닙니다.")
+    if "type" not in s:
+        raise ValueError(f"{i+1}번째 step에 type 필드가 없습니다.")
+    if s["type"] in AGENT_STEP_TYPES and "task" not in s:
+        raise ValueError(f"{i+1}번째 step(type={s['type']})에 task가 필요합니다.")
+    if s["type"] not in STEP_TYPES:
+        raise ValueError(f"{i+1}번째 step의 type은 {', '.join(STEP_TYPES)} 중 하나여야 합니다.")
+    if s["type"] in BROWSER_STEP_TYPES:
+        _validate_browser_step(i, s)
+
+    field = TEMPLATE_FIELDS.get(s["type"])
+    template = TaskTemplate.compile(str(s.get(field) or "")) if field and s.get(field) is not None else None
+
+    wait_rule = None
+    wfi = s.get("wait_for_user_if")  # {"contains": "...", "message": "..."}
+    if isinstance(wfi, dict) and wfi.get("contains"):
+        wait_rule = WaitRule(
+            needle=str(wfi["contains"]).lower(),
+            message=wfi.get("message", DEFAULT_WAIT_MESSAGE),
+        )
+
+    return CompiledStep(
+        index=i,
+        name=s.get("name", f"step_{i+1}"),
+        type=s["type"],
+        template=template,
+        wait_rule=wait_rule,
+        message=s.get("message"),
+        deps=_resolve_deps(i, s, names),
+        cache_rule=_compile_cache_rule(i, s),
+        raw=MappingProxyType(dict(s)),
+        replay=_compile_replay(i, s),
+        image=_compile_image(i, s, image_base),
+        llm_cache=_compile_flag(i, s, "llm_cache", True),
+        dom_diff=_compile_flag(i, s, "dom_diff", None),
+        model=_compile_model(i, s, model_base),
+        auth=_compile_auth(i, s),
+        network=_compile_network(i, s, network_base),
+        foreach=_compile_foreach(i, s, names),
+    )
+
+
+def compile_script(yaml_text: str) -> ScriptPlan:
+    """YAML 스크립트 파싱 + 유효성 검사 + 컴파일 (캐시 미사용)"""
+    try:
+        data = yaml.safe_load(yaml_text) or {}
+        if not isinstance(data, dict):
+            raise ValueError("YAML 최상위는 매핑이어야 합니다.")
+        steps = data.get("steps", [])
+        if not isinstance(steps, list) or not steps:
+            raise ValueError("YAML에 steps 리스트가 필요합니다.")
+
+        names: Dict[str, int] = {}
+        for i, s in enumerate(steps):
+            if isinstance(s, dict) and s.get("name") is not None:
+                # 중복 이름은 depends_on에서 참조할 때만 오류 (-1 = 모호함)
+                names[str(s["name"])] = -1 if str(s["name"]) in names else i
+
+        # 스크립트 최상위 image: 는 모든 agent 스텝의 기본값
+        image_base = parse_image_options(data["image"]) if "image" in data else None
+        # 최상위 vision/model/text_model 도 마찬가지
+        model_base = parse_model_choice(data) if any(k in data for k in MODEL_FIELDS) else None
+        # 최상위 network: 는 모든 브라우저 스텝의 요청 차단 프로필 기본값
+        network_base = parse_net_profile(data["network"]) if "network" in data else None
+        compiled = tuple(_compile_step(i, s, names, image_base, model_base, network_base) for i, s in enumerate(steps))
+        meta = {k: v for k, v in data.items() if k != "steps"}
+        return ScriptPlan(script_hash(yaml_text), compiled, MappingProxyType(meta))
+    except yaml.YAMLError as e:
+        raise ValueError(f"YAML 파싱 오류: {e}")
+    except Exception as e:
+        raise ValueError(f"스크립트 유효성 검사 오류: {e}")
+
+
+# ====== LRU 캐시 ======
+_plan_cache: "OrderedDict[str, ScriptPlan]" = OrderedDict()
+_plan_lock = threading.Lock()
+_plan_stats = {"hits": 0, "misses": 0}
+
+
+def get_plan(yaml_text: str) -> ScriptPlan:
+    """해시 기반 LRU 캐시에서 실행 계획 조회 (없으면 컴파일 후 저장)"""
+    key = script_hash(yaml_text)
+    with _plan_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            _plan_stats["hits"] += 1
+            return plan
+        _plan_stats["misses"] += 1
+
+    # 컴파일은 락 밖에서 수행 (실패 시 예외는 그대로 전달, 캐시하지 않음)
+    plan = compile_script(yaml_text)
+    with _plan_lock:
+        _plan_cache[key] = plan
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > max(PLAN_CACHE_SIZE, 1):
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def plan_cache_stats() -> Dict[str, int]:
+    """캐시 적중/미스 카운터"""
+    with _plan_lock:
+        return {**_plan_stats, "size": len(_plan_cache), "capacity": PLAN_CACHE_SIZE}
+
+
+def clear_plan_cache() -> None:
+    """캐시 및 카운터 초기화"""
+    with _plan_lock:
+        _plan_cache.clear()
+        _plan_stats["hits"] = _plan_stats["misses"] = 0
+
+
+def parse_script(yaml_text: str) -> List[Dict[str, Any]]:
+    """기존 API 호환: 검증된 스텝 dict 목록 반환 (캐시된 계획의 사본)"""
+    return [dict(s.raw) for s in get_plan(yaml_text)]
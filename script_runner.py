@@ -0,0 +1,545 @@
+# script_runner.py
+# YAML 스크립트 실행 엔진 (UI 비의존).
+# web_script_runner_plus.py(Gradio UI)와 batch_runner.py(헤드리스 배치 CLI)가 공유한다.
+import os
+import re
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")  # 로컬 Ollama 기본값
+
+from browser_use import Agent
+
+from script_plan import get_plan, BROWSER_STEP_TYPES
+from step_scheduler import run_agents_parallel, resolve_max_parallel, stream_agent_run
+from async_engine import get_engine
+from run_log import RunLog
+from llm_pool import get_llm
+import model_cascade
+import metrics
+from prompt_prefix import agent_prompt_kwargs
+import step_cache
+import image_pipeline
+import frame_dedup
+import llm_cache
+import trajectory
+import browser_pool
+import auth_state
+import net_profiles
+import page_ready
+import dom_diff
+import fanout
+import display_mode
+from browser_steps import run_browser_step
+import browser_support
+from browser_support import BrowserHandle, shared_context, current_url, load_cookies_file
+from checkpoint import save_checkpoint, load_checkpoint, capture_storage_state
+
+# ====== 설정 및 상수 ======
+# 기본 허용 도메인 (Microsoft 365 + 조직 SSO)
+DEFAULT_ALLOWED_DOMAINS = [
+    "office.com", "www.office.com",
+    "login.microsoftonline.com", "microsoftonline.com",
+    "microsoft.com", "www.microsoft.com",
+    "microsoft365.com", "www.microsoft365.com",
+    "outlook.office.com", "outlook.live.com", "www.outlook.com",
+    "teams.microsoft.com", "www.teams.microsoft.com",
+    "sharepoint.com", "www.sharepoint.com",
+    "onedrive.live.com", "www.onedrive.live.com",
+    # 회사 SSO가 있으면 여기에 추가: "sso.mycompany.com"
+]
+
+# 안전 프리앰블
+SAFETY_PREAMBLE = """안전 정책:
+- 절대 비밀번호/MFA를 직접 입력하지 마라.
+- 로그인 단계가 필요하면 사용자에게 로그인 완료를 요청하고, 그 단계에서 작업을 종료하라.
+- 구매/삭제/전송 등 고위험 동작은 수행하지 말고, 사용자에게 확인을 요청하라.
+- 민감한 개인정보나 금융정보를 입력하지 마라.
+- 보안 토큰이나 API 키를 입력하지 마라.
+"""
+
+# ====== 유틸리티 함수들 ======
+def mask_sensitive_info(text: str) -> str:
+    """민감정보 마스킹"""
+    # 이메일 마스킹
+    text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '***@***.***', text)
+    # 전화번호 마스킹
+    text = re.sub(r'\b\d{3}-\d{4}-\d{4}\b', '***-****-****', text)
+    text = re.sub(r'\b\d{3}-\d{3}-\d{4}\b', '***-***-****', text)
+    # URL 쿼리 토큰 마스킹
+    text = re.sub(r'[?&](token|key|password|pwd|secret)=[^&\s]+', r'\1=***', text)
+    return text
+
+# ====== 공통 리소스(세션마다 1개) ======
+def make_llm():
+    """화면을 "보고" 판단 → 비전 모델 사용 (프로세스 공유 클라이언트 풀)"""
+    return get_llm()
+
+def _profile_settings(allowed_domains: List[str] = None, headless: bool = True) -> Dict[str, Any]:
+    """세션 BrowserProfile 설정 (허용 도메인/표시 모드)"""
+    return {
+        "headless": headless,
+        "allowed_domains": allowed_domains or DEFAULT_ALLOWED_DOMAINS,
+        # Agent 실행이 끝나도 세션을 닫지 않음 → 다음 스텝이 같은 탭/로그인 상태를 이어받음 (닫기는 release_browser)
+        "keep_alive": True,
+        # 페이지 준비는 page_ready 감지기가 판단 (PAGE_READY=off 면 예전 고정 대기)
+        "minimum_wait_page_load_time": page_ready.PAGE_MIN_WAIT_S,
+    }
+
+def _new_browser(settings: Dict[str, Any], state: Optional[Dict[str, Any]] = None):
+    if browser_pool.POOL_ENABLED:
+        return browser_pool.lease(settings, state)
+    return BrowserHandle(settings, state)
+
+def make_browser(allowed_domains: List[str] = None, cookies_file: Optional[str] = None, headless: Optional[bool] = None,
+                 account: Optional[str] = None, handoff: bool = True, storage_state: Optional[Dict[str, Any]] = None):
+    """
+    세션 브라우저(BrowserHandle, BrowserSession 은 처음 쓰일 때 기동).
+    browser_use 가 없는 구성에선 None을 리턴해 Agent가 내부 기본 브라우저를 쓰도록 폴백.
+    cookies_file: 계정 쿠키 파일 (쿠키 목록 또는 storage state JSON, 기동 직후 복원)
+    storage_state: 체크포인트에서 복원한 storage state (재개 시 로그인 상태 유지, cookies_file 보다 우선)
+    headless: None 이면 BROWSER_HEADLESS (auto: 디스플레이 없는 서버에선 헤드리스)
+    account: 저장된 로그인 세션(auth_state)을 찾을 계정 이름 (None: 저장/주입하지 않음)
+    handoff: 헤드리스 세션이 사람 액션 대기에 멈추면 창 표시 브라우저로 옮길지 (배치는 False)
+    브라우저 풀이 켜져 있으면(BROWSER_POOL) 웜 브라우저를 대여한다.
+    """
+    if headless is None:
+        headless = display_mode.DEFAULT_HEADLESS
+    if not browser_support.available():
+        # 폴백: 내부 기본 브라우저 사용
+        return None
+    browser = _new_browser(_profile_settings(allowed_domains, headless), storage_state or load_cookies_file(cookies_file))
+    # 계정 × 허용 도메인 그룹의 저장된 로그인 세션을 첫 실행 때 이 브라우저 세션에 주입
+    auth_state.bind(browser, account, allowed_domains or DEFAULT_ALLOWED_DOMAINS)
+    if not handoff:
+        display_mode.disable_handoff(browser)
+    return browser
+
+def _switched_browser(browser, headless: bool):
+    """같은 세션 설정(허용 도메인)으로 표시 모드만 바꾼 새 브라우저"""
+    return _new_browser({**browser.settings, "headless": headless})
+
+async def _switch_display(browser, headless: bool, log: RunLog):
+    """살아 있는 세션(쿠키/스토리지/현재 URL)을 표시 모드가 다른 브라우저로 인계 → 이후 쓸 브라우저"""
+    new, elapsed = await display_mode.switch(browser, headless, _switched_browser)
+    if elapsed is None:
+        log.append("warning", "브라우저 표시 모드 전환에 실패해 기존 브라우저를 계속 사용합니다.")
+        return browser
+    await auth_state.adopt(browser, new)
+    mode = "헤드리스로 복귀" if headless else "브라우저 창 열기"
+    log.append("display", f"{mode}: 세션 인계 {elapsed:.1f}초")
+    return new
+
+def release_browser(browser) -> None:
+    """세션 브라우저 반납: 풀 대여면 풀로, 아니면 브라우저를 띄운 실행 엔진 루프에서 닫는다"""
+    if isinstance(browser, browser_pool.BrowserLease):
+        browser_pool.release(browser)
+    elif isinstance(browser, BrowserHandle):
+        get_engine().submit(browser.close)
+
+def warm_browsers(headless: Optional[bool] = None) -> None:
+    """브라우저 풀 예열 (실행 엔진 루프에서 BROWSER_POOL_WARM 개 기동, None: BROWSER_HEADLESS)"""
+    if headless is None:
+        headless = display_mode.DEFAULT_HEADLESS
+    if browser_support.available() and browser_pool.POOL_ENABLED:
+        get_engine().submit(browser_pool.warm, _profile_settings(None, headless))
+
+def make_agent_factory(task: str, llm, browser, step=None, llm_stats=None):
+    """
+    Agent 생성기 (스텝 전용 컨텍스트/액션 콜백이 있으면 주입).
+    step/llm_stats: 이 스텝의 LLM 계층 설정(image, llm_cache, dom_diff, model)과 집계 dict.
+    Agent를 실행할 태스크 컨텍스트에 지정되므로 병렬 스텝끼리 섞이지 않는다.
+    반환값은 모델 캐스케이드 실행기(model_cascade.CascadeAgent, Agent와 같은 run() 제공).
+    """
+    def factory(context, on_step=None):
+        image_pipeline.use_options(step.image if step is not None else None, llm_stats)
+        # 변화 대기 중 다시 찍는 화면은 이 Agent 가 조작하는 세션(병렬/foreach 전용 세션 포함)에서
+        frame_dedup.start_step(context, llm_stats)
+        llm_cache.use_for_step(step.llm_cache if step is not None else True, llm_stats)
+        dom_diff.start_step(step.dom_diff if step is not None else None, llm_stats)
+        metrics.use_for_step(llm_stats)
+        page_ready.use_for_step(llm_stats)
+        # 세션의 고정 네트워크 대기를 페이지 준비 감지로 교체 (세션당 1회)
+        page_ready.adapt_context(context)
+        extra = {"browser_session": context} if context is not None else {}
+        # 액션마다 소요 시간/브라우저 액션 계측 후 기존 콜백(UI 상태 갱신) 호출
+        extra["register_new_step_callback"] = metrics.ActionTracker(llm_stats).wrap(on_step)
+
+        def build(agent_llm, use_vision):
+            # 새 Agent(캐스케이드 전환)는 직전 요소 목록을 본 적 없으므로 전체 목록부터
+            dom_diff.reset()
+            # 안전 프리앰블은 시스템 프롬프트 슬롯에 (스텝/세션 간 공통 접두부 → Ollama KV 캐시 재사용)
+            return Agent(
+                **agent_prompt_kwargs(Agent, SAFETY_PREAMBLE, task),
+                llm=agent_llm,
+                use_vision=use_vision,
+                **extra,
+            )
+        return model_cascade.cascade_agent(build, step.model if step is not None else None, llm, llm_stats)
+    return factory
+
+# ====== 실행 엔진 ======
+def parse_script(yaml_text: str) -> List[Dict[str, Any]]:
+    """YAML 스크립트 파싱 및 유효성 검사 (컴파일된 계획 캐시 사용)"""
+    return [dict(s.raw) for s in get_plan(yaml_text)]
+
+STATUS_DONE = "✅ 자동 진행 완료 / 다음 스텝 준비됨"
+
+def _with_llm_summary(text: str, llm_stats) -> str:
+    """로그 본문 끝에 모델 캐스케이드/스크린샷 전처리/중복 화면 건너뛰기/DOM 변경분/응답 캐시/요청 차단/페이지 준비 대기 요약 추가"""
+    cache = ""
+    if llm_stats and llm_stats.get("llm_cache_hits"):
+        cache = f"🗄 LLM 응답 캐시 적중 {llm_stats['llm_cache_hits']}회 / 미스 {llm_stats['llm_cache_misses']}회"
+    lines = [s for s in (model_cascade.summarize(llm_stats), image_pipeline.summarize(llm_stats),
+                         frame_dedup.summarize(llm_stats), dom_diff.summarize(llm_stats), cache, net_profiles.summarize(llm_stats),
+                         page_ready.summarize(llm_stats)) if s]
+    return text + "\n\n" + "\n".join(lines) if lines else text
+
+async def save_progress(log: RunLog, plan, script_text: str, prompt_text: str, idx: int, waiting: bool, msg: str,
+                        outputs: List[Dict[str, Any]], browser, finished: bool = False):
+    """스텝 완료 직후 체크포인트 기록 (실패해도 실행은 계속)"""
+    try:
+        storage_state = await capture_storage_state(browser)
+        if not waiting and 0 <= plan.auth_index < idx:
+            # 로그인 스텝을 지난 뒤의 상태 → 계정별 암호화 저장소 갱신 (REFRESH_S 간격)
+            auth_state.maybe_save(browser, storage_state, await current_url(browser))
+        save_checkpoint(
+            log.session_id,
+            script_text=script_text,
+            script_hash=plan.script_hash,
+            prompt_text=prompt_text,
+            idx=idx,
+            waiting=waiting,
+            msg=msg,
+            outputs=outputs,
+            log_path=str(log.path),
+            storage_state=storage_state,
+            finished=finished,
+        )
+    except Exception:
+        pass
+
+async def iter_until_wait(script_text: str, idx: int, log: Optional[RunLog], waiting: bool, llm, browser, prompt_text: str = ""):
+    """
+    Start/Resume 실행: '사람 액션 필요' 지점까지 자동 진행 후 멈춤.
+    스텝 완료/에이전트 액션마다 (idx, log, waiting, msg, llm, browser, status)를 내보내는 비동기 제너레이터.
+    마지막 항목이 최종 상태다. 로그는 RunLog에 레코드로 추가되며 즉시 JSONL로 기록된다.
+    """
+    if log is None:
+        log = RunLog()
+    if llm is None:
+        llm = make_llm()
+    if browser is None:
+        browser = make_browser()
+
+    try:
+        plan = get_plan(script_text)
+    except Exception as e:
+        log.append("error", f"스크립트 파싱 오류: {e}")
+        yield idx, log, True, "", llm, browser, f"❌ 스크립트 파싱 오류: {e}"
+        return
+
+    n = len(plan)
+    msg_to_user = ""
+    waiting_now = False
+    today_kr = datetime.now().strftime("%Y-%m-%d")
+
+    # 이전 체크포인트의 스텝 결과에 이어서 기록
+    prev = load_checkpoint(log.session_id)
+    outputs: List[Dict[str, Any]] = prev.get("outputs", []) if prev else []
+    # 이번 실행(대기 지점까지)의 스텝별 계측 → 끝에 요약표
+    run_rows: List[Dict[str, Any]] = []
+
+    # 저장된 로그인 세션(쿠키/로컬 스토리지)을 세션 컨텍스트에 주입 (컨텍스트당 1회)
+    try:
+        await auth_state.inject(browser)
+    except Exception:
+        pass
+
+    # 지난 대기를 처리하려고 창 표시로 옮겼던 세션은 다시 헤드리스로 (렌더링 비용 절감)
+    if display_mode.should_return(browser):
+        browser = await _switch_display(browser, True, log)
+
+    while idx < n:
+        step = plan[idx]
+        stype = step.type
+        sname = step.name
+        step_started = time.perf_counter()
+
+        if step.auth is not None:
+            # 로그인 스텝: 저장된 세션이 probe URL에서 아직 유효하면 스텝(및 MFA 대기) 생략
+            yield idx, log, False, "", llm, browser, f"🔑 {sname}: 저장된 로그인 세션 확인 중 ({idx+1}/{n})"
+            try:
+                probe_s = await auth_state.probe(step.auth, browser)
+            except Exception:
+                probe_s = None
+            if probe_s is not None:
+                text = f"저장된 로그인 세션이 유효해 로그인 스텝을 건너뜁니다 (확인 {probe_s:.1f}초)"
+                row = metrics.record_step(stype, "session", time.perf_counter() - step_started)
+                run_rows.append({"name": sname + " 🔑세션", "type": stype, **row})
+                log.append("auth", text, name=sname, step=idx, source="session", metrics=row)
+                outputs.append({"step": idx, "name": sname, "output": text})
+                idx += 1
+                await save_progress(log, plan, script_text, prompt_text, idx, False, "", outputs, browser)
+                yield idx, log, False, "", llm, browser, f"✅ {sname} 생략 — 저장된 로그인 세션 사용 ({idx}/{n})"
+                continue
+
+        if stype == "agent" and len(plan.ready_batch(idx)) > 1:
+            # depends_on 기준으로 서로 독립인 agent 스텝 묶음 → 동시 실행
+            batch = plan.ready_batch(idx)
+            names = ", ".join(plan[j].name for j in batch)
+            yield idx, log, False, "", llm, browser, f"⏩ 병렬 실행 중 ({idx+1}/{n}): {names}"
+
+            llm_stats = [image_pipeline.new_stats() for _ in batch]
+            factories = [
+                make_agent_factory(plan[j].render_task(today_kr, prompt_text), llm, browser, plan[j], stats)
+                for j, stats in zip(batch, llm_stats)
+            ]
+            # 스텝 전용 세션마다 세션 공유 탭의 로그인 상태를 넣고 그 스텝의 요청 차단 프로필 적용
+            prepares = [
+                (lambda ctx, _p=plan[j].network, _s=stats: net_profiles.prepare_context(ctx, _p, _s))
+                for j, stats in zip(batch, llm_stats)
+            ]
+            state = await fanout.session_state(browser)
+            results = await run_agents_parallel(factories, browser, resolve_max_parallel(plan), prepares, state)
+
+            for j, res, stats in zip(batch, results, llm_stats):
+                bstep = plan[j]
+                masked_res = mask_sensitive_info(str(res))
+                # 동시 실행이므로 스텝 시간은 해당 agent 실행 시간(모델 단계 합)
+                row = metrics.record_step("agent", "agent", stats.get("text_s", 0) + stats.get("vision_s", 0), stats)
+                run_rows.append({"name": bstep.name, "type": "agent", **row})
+                log.append("agent", _with_llm_summary(masked_res, stats), name=bstep.name, step=j, parallel=True,
+                           llm=stats, metrics=row)
+                outputs.append({"step": j, "name": bstep.name, "output": masked_res,
+                                "final": mask_sensitive_info(fanout.final_text(res))})
+                if not waiting_now and bstep.wait_rule and bstep.wait_rule.matches(res):
+                    msg_to_user = bstep.wait_rule.message
+                    waiting_now = True
+            idx = batch[-1] + 1
+            await save_progress(log, plan, script_text, prompt_text, idx, waiting_now, msg_to_user, outputs, browser)
+            if waiting_now:
+                break
+            yield idx, log, False, "", llm, browser, f"✅ {names} 완료 ({idx}/{n})"
+
+        elif stype == "agent":
+            task = step.render_task(today_kr, prompt_text)
+            yield idx, log, False, "", llm, browser, f"▶ {sname} 실행 중 ({idx+1}/{n})"
+
+            # cache: 블록이 있으면 같은 task/페이지/스크립트의 최근 결과 재사용
+            cache_key, cached = None, None
+            if step.cache_rule:
+                cache_key, cached = await step_cache.lookup(
+                    step.cache_rule, browser, task=task, script_hash=plan.script_hash,
+                    prompt=prompt_text, today=today_kr,
+                )
+
+            # replay: true 면 기록된 액션 경로를 LLM 없이 재생 (어긋나면 그 지점부터 agent)
+            traj_path = trajectory.trajectory_path(sname, task) if step.replay else None
+            replayed = None
+            llm_stats = image_pipeline.new_stats()
+            if cached is None:
+                await net_profiles.use_for_step(browser, step.network, llm_stats)
+            if cached is None and traj_path is not None:
+                replayed = await trajectory.replay(traj_path, browser, llm_stats)
+                if replayed is not None and not replayed.completed:
+                    yield idx, log, False, "", llm, browser, f"↪ {sname} 경로 재생 {len(replayed.replayed)}개 후 어긋남 → agent로 이어서 실행 ({replayed.reason})"
+
+            if cached is not None:
+                res = cached.output
+            elif replayed is not None and replayed.completed:
+                res = replayed.result
+            else:
+                # 안전 프리앰블은 make_agent_factory에서 시스템 프롬프트로 추가, 액션마다 상태 갱신
+                # 순차 스텝은 세션 공유 컨텍스트를 써서 결정적 스텝과 같은 탭을 이어받음
+                agent_task = trajectory.resume_task(task, replayed) if replayed is not None else task
+                factory = make_agent_factory(agent_task, llm, browser, step, llm_stats)
+                res = None
+                try:
+                    context = await shared_context(browser)
+                except Exception as e:
+                    # 세션 브라우저를 배정받지 못하면(풀 대기 시간 초과 등) Agent 기본 브라우저로 대신 실행하지 않음
+                    context, res = None, f"❌ 실행 오류: 브라우저 세션을 열지 못했습니다 ({e})"
+                if res is None:
+                    async for kind, payload in stream_agent_run(lambda on_step: factory(context, on_step), sname):
+                        if kind == "action":
+                            yield idx, log, False, "", llm, browser, payload
+                        else:
+                            res = payload
+                if traj_path is not None:
+                    await trajectory.record(traj_path, sname, task, res, browser,
+                                            prefix=replayed.replayed if replayed is not None else None)
+            if step.cache_rule and cached is None:
+                await step_cache.store(step.cache_rule, cache_key, browser, res)
+
+            # 민감정보 마스킹
+            masked_res = mask_sensitive_info(str(res))
+            source = "cache" if cached is not None else "replay" if replayed is not None and replayed.completed else "agent"
+            label = {"cache": " 💾캐시", "replay": " 🔁재생", "agent": ""}[source]
+            row = metrics.record_step("agent", source, time.perf_counter() - step_started, llm_stats)
+            run_rows.append({"name": sname + label, "type": "agent", **row})
+            log.append("agent", _with_llm_summary(masked_res, llm_stats), name=sname + label, step=idx,
+                       cached=cached is not None, source=source, llm=llm_stats, metrics=row)
+            outputs.append({"step": idx, "name": sname, "output": masked_res,
+                            "final": mask_sensitive_info(fanout.final_text(res))})
+            idx += 1
+
+            # 결과에 특정 문자열이 있으면 사용자 액션 요청 후 멈춤
+            if step.wait_rule and step.wait_rule.matches(res):
+                msg_to_user = step.wait_rule.message
+                waiting_now = True
+            await save_progress(log, plan, script_text, prompt_text, idx, waiting_now, msg_to_user, outputs, browser)
+            if waiting_now:
+                break
+            yield idx, log, False, "", llm, browser, f"✅ {sname} 완료 ({idx}/{n})"
+
+        elif stype == "foreach":
+            # 앞선 스텝 출력의 목록 항목마다 같은 로그인 상태의 탭에서 agent 실행 (동시 실행 상한), 결과는 항목 순서대로
+            items = fanout.resolve_items(step.foreach, outputs)
+            max_parallel = step.foreach.max_parallel or resolve_max_parallel(plan)
+            if not items:
+                res = "처리할 항목이 없습니다."
+                log.append("warning", f"foreach: {res} (원본 스텝 출력에서 목록을 찾지 못함)", name=sname, step=idx)
+                outputs.append({"step": idx, "name": sname, "output": res})
+                idx += 1
+                await save_progress(log, plan, script_text, prompt_text, idx, False, "", outputs, browser)
+                yield idx, log, False, "", llm, browser, f"⚠️ {sname}: 처리할 항목 없음 ({idx}/{n})"
+                continue
+            yield idx, log, False, "", llm, browser, f"🔀 {sname} 실행 중 ({idx+1}/{n}): 항목 {len(items)}개, 동시 {max_parallel}개"
+
+            base_url = await current_url(browser)
+            state = await fanout.session_state(browser)
+            llm_stats = [image_pipeline.new_stats() for _ in items]
+            factories = [
+                make_agent_factory(step.render_task(today_kr, prompt_text, fanout.item_text(item)), llm, browser, step, stats)
+                for item, stats in zip(items, llm_stats)
+            ]
+            prepares = [
+                (lambda ctx, _u=fanout.item_url(item, base_url), _s=stats: fanout.prepare_item(ctx, _u, step.network, _s))
+                for item, stats in zip(items, llm_stats)
+            ]
+            results = await run_agents_parallel(factories, browser, max_parallel, prepares, state)
+
+            masked = [mask_sensitive_info(fanout.final_text(r)) for r in results]
+            failed = sum(1 for r in results if not step_cache.result_succeeded(r))
+            wall_s = time.perf_counter() - step_started
+            item_s = sum(s.get("text_s", 0) + s.get("vision_s", 0) for s in llm_stats)
+            fanout.record(len(items), failed, wall_s, item_s)
+            res = fanout.merge(items, masked)
+            total = fanout.combine(llm_stats)
+            row = metrics.record_step("foreach", "agent", wall_s, total)
+            run_rows.append({"name": f"{sname} ×{len(items)}", "type": "foreach", **row})
+            summary = fanout.summarize(len(items), failed, wall_s, item_s, max_parallel)
+            log.append("foreach", _with_llm_summary(res + "\n\n" + summary, total), name=sname, step=idx,
+                       items=len(items), failed=failed, llm=total, metrics=row)
+            outputs.append({"step": idx, "name": sname, "output": res})
+            idx += 1
+
+            if step.wait_rule and step.wait_rule.matches(res):
+                msg_to_user = step.wait_rule.message
+                waiting_now = True
+            await save_progress(log, plan, script_text, prompt_text, idx, waiting_now, msg_to_user, outputs, browser)
+            if waiting_now:
+                break
+            yield idx, log, False, "", llm, browser, f"✅ {sname} 완료 — 항목 {len(items)}개 ({idx}/{n})"
+
+        elif stype in BROWSER_STEP_TYPES:
+            # LLM 호출 없이 Playwright 페이지에서 직접 실행
+            yield idx, log, False, "", llm, browser, f"▶ {sname} 실행 중 ({idx+1}/{n})"
+            page_stats: Dict[str, Any] = {}
+            await net_profiles.use_for_step(browser, step.network, page_stats)
+            try:
+                res = await run_browser_step(step, browser, step.render_task(today_kr, prompt_text), page_stats)
+                failed = False
+            except Exception as e:
+                res = f"❌ {stype} 실패: {str(e).splitlines()[0] if str(e) else type(e).__name__}"
+                failed = True
+
+            masked_res = mask_sensitive_info(str(res))
+            row = metrics.record_step(stype, "error" if failed else "browser", time.perf_counter() - step_started, page_stats)
+            run_rows.append({"name": sname, "type": stype, **row})
+            blocked = net_profiles.summarize(page_stats)
+            log.append("error" if failed else "browser", masked_res + ("\n\n" + blocked if blocked else ""), name=sname,
+                       step=idx, step_type=stype, metrics=row, **({"page": page_stats} if page_stats else {}))
+            outputs.append({"step": idx, "name": sname, "output": masked_res})
+            idx += 1
+
+            if failed:
+                # 이후 스텝이 이 화면 상태를 전제로 하므로 사람에게 넘김
+                msg_to_user = f"'{sname}' 자동 스텝이 실패했습니다. 브라우저에서 직접 처리한 뒤 '다음 스텝 실행'을 누르세요."
+                waiting_now = True
+            elif step.wait_rule and step.wait_rule.matches(res):
+                msg_to_user = step.wait_rule.message
+                waiting_now = True
+            await save_progress(log, plan, script_text, prompt_text, idx, waiting_now, msg_to_user, outputs, browser)
+            if waiting_now:
+                break
+            yield idx, log, False, "", llm, browser, f"✅ {sname} 완료 ({idx}/{n})"
+
+        elif stype == "require_user":
+            msg_to_user = step.message or "이 단계를 사람이 처리하세요. 완료 후 '다음 스텝 실행'을 누르세요."
+            log.append("require_user", f"- 안내: {msg_to_user}", name=sname, step=idx)
+            idx += 1
+            waiting_now = True
+            await save_progress(log, plan, script_text, prompt_text, idx, waiting_now, msg_to_user, outputs, browser)
+            break
+
+        else:
+            log.append("warning", f"알 수 없는 type: {stype} (건너뜀)", name=sname, step=idx)
+            idx += 1
+
+    if run_rows:
+        log.append("metrics", metrics.summary_table(run_rows), name="실행 계측")
+
+    if idx >= n and not waiting_now:
+        # 레코드는 이미 스텝마다 파일에 기록되어 있음
+        log.append("done", f"모든 스텝이 완료되었습니다. 📁 실행 로그: {log.path}")
+        await save_progress(log, plan, script_text, prompt_text, idx, False, "", outputs, browser, finished=True)
+    
+    if waiting_now and display_mode.should_show(browser):
+        # 헤드리스 세션이 사람 액션 대기에 멈춤 → 같은 세션을 창 표시 브라우저로 인계
+        yield idx, log, waiting_now, msg_to_user, llm, browser, "🖥 브라우저 창을 여는 중..."
+        browser = await _switch_display(browser, False, log)
+        hint = display_mode.viewer_hint()
+        if hint and not display_mode.is_headless(browser):
+            msg_to_user = f"{msg_to_user} ({hint})"
+
+    status = ("⏸ 사용자 액션 필요: " + msg_to_user) if waiting_now else STATUS_DONE
+    yield idx, log, waiting_now, msg_to_user, llm, browser, status
+
+async def run_until_wait_async(script_text: str, idx: int, log: Optional[RunLog], waiting: bool, llm, browser, prompt_text: str = ""):
+    """스트리밍 없이 최종 상태만 반환 (실행 엔진 루프에서 await)"""
+    final = None
+    async for final in iter_until_wait(script_text, idx, log, waiting, llm, browser, prompt_text):
+        pass
+    return final[:6]
+
+def run_until_wait(script_text: str, idx: int, log: Optional[RunLog], waiting: bool, llm, browser, prompt_text: str = ""):
+    """동기 호출부 호환: 실행 엔진에 제출 후 완료까지 대기"""
+    return get_engine().run(run_until_wait_async, script_text, idx, log, waiting, llm, browser, prompt_text)
+
+def resume_session(run_id: str):
+    """
+    체크포인트에서 세션 복원 → (script_text, prompt_text, idx, log, waiting, msg, llm, browser)
+    완료된 스텝은 다시 실행하지 않고 저장된 인덱스부터 이어간다.
+    """
+    cp = load_checkpoint(run_id)
+    if not cp:
+        raise ValueError(f"체크포인트를 찾을 수 없습니다: {run_id}")
+    # 저장된 storage state로 새 브라우저를 열어 로그인 상태 복원
+    state = cp.get("storage_state")
+    if cp.get("waiting") and display_mode.can_show():
+        # 사람 액션 대기 중이던 실행 → 처리할 수 있게 창 표시로 열고, 다음 실행에서 헤드리스 복귀
+        browser = make_browser(storage_state=state, headless=False)
+        display_mode.mark_shown(browser)
+    else:
+        browser = make_browser(storage_state=state)
+    log = RunLog.reopen(run_id)
+    log.append("info", f"체크포인트에서 재개: {cp['idx']+1}번째 스텝부터 (완료된 스텝 {len(cp.get('outputs', []))}개)")
+    return cp["script_text"], cp.get("prompt_text", ""), cp["idx"], log, cp.get("waiting", False), cp.get("msg", ""), None, browser
+
+def reset_session(browser=None):
+    """세션 초기화 (새 실행 로그는 다음 실행 시 생성). 이전 브라우저 대여는 풀로 반납"""
+    release_browser(browser)
+    return 0, None, False, "", None, None
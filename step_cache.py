@@ -0,0 +1,127 @@
+# step_cache.py
+# cache: 블록이 있는 agent 스텝의 결과를 TTL 동안 재사용하는 프로세스 전역 캐시.
+# 키는 렌더링된 task 텍스트, 실행 직전 페이지 URL, 스크립트 해시(선택 필드)와 브라우저 세션의 계정/도메인 그룹
+# (항상 포함: 다른 계정의 메일/일정 결과를 재사용하지 않도록)으로 만든다. 계정이 없는 세션은 캐시를 쓰지 않는다.
+# 적중 시 agent 호출 없이, 브라우저가 기대 페이지에 있는지만 확인(필요하면 기록된 URL로 이동)한다.
+import os
+import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+
+import auth_state
+from browser_support import current_url, goto, same_page
+
+# ====== 설정 및 상수 ======
+STEP_CACHE_SIZE = int(os.environ.get("STEP_CACHE_SIZE", "256"))
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    output: str
+    url_after: str
+    stored_at: float
+    expires_at: float
+
+
+_cache: "OrderedDict[str, CachedResult]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "verify_failed": 0, "stores": 0}
+
+
+def make_key(rule, *, task: str, url: str, script_hash: str, prompt: str = "", today: str = "",
+             account: Optional[Tuple[str, str]] = None) -> str:
+    """rule.key_fields에 지정된 필드 + 계정/도메인 그룹(auth_state.binding)으로 키 생성"""
+    values = {"task": task, "url": url, "script": script_hash, "prompt": prompt, "today": today}
+    material = {k: values[k] for k in rule.key_fields}
+    material["account"] = list(account) if account else None
+    return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[CachedResult]:
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry.expires_at < now:
+            if entry is not None:
+                _cache.pop(key, None)
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        return entry
+
+
+def put(key: str, output: str, url_after: str, ttl: float) -> None:
+    now = time.time()
+    with _lock:
+        _cache[key] = CachedResult(output, url_after, now, now + ttl)
+        _cache.move_to_end(key)
+        _stats["stores"] += 1
+        while len(_cache) > max(STEP_CACHE_SIZE, 1):
+            _cache.popitem(last=False)
+
+
+def invalidate(key: str) -> None:
+    with _lock:
+        _cache.pop(key, None)
+
+
+def step_cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "size": len(_cache)}
+
+
+async def lookup(rule, browser, *, task: str, script_hash: str, prompt: str = "", today: str = ""):
+    """
+    캐시 조회 → (key, CachedResult 또는 None).
+    계정이 연결되지 않은 세션(make_browser(account=...) 없음, UI)이나 현재 URL을 알 수 없으면(브라우저 폴백)
+    캐시를 쓰지 않는다(key=None) → 다른 사용자의 결과를 재사용하지 않음.
+    적중 시 기대 페이지(expect_url 또는 기록된 실행 후 URL)에 있는지 확인하고,
+    아니면 기록된 URL로 이동해 재확인한다. 확인 실패 시 항목을 버리고 None.
+    """
+    account = auth_state.binding(browser)
+    if account is None:
+        return None, None
+    url = await current_url(browser)
+    if not url:
+        return None, None
+    key = make_key(rule, task=task, url=url, script_hash=script_hash, prompt=prompt, today=today,
+                   account=account)
+    entry = get(key)
+    if entry is None:
+        return key, None
+
+    expected = rule.expect_url or entry.url_after
+    if same_page(url, expected):
+        return key, entry
+    if entry.url_after and same_page(await goto(browser, entry.url_after), expected):
+        return key, entry
+
+    invalidate(key)
+    with _lock:
+        _stats["verify_failed"] += 1
+    return key, None
+
+
+def result_succeeded(result: Any) -> bool:
+    """agent 결과가 성공인지 ("❌" 오류 문자열 또는 is_successful()=False 면 실패)"""
+    if str(result).startswith("❌"):
+        return False
+    is_successful = getattr(result, "is_successful", None)  # AgentHistoryList
+    if callable(is_successful):
+        try:
+            return is_successful() is not False
+        except Exception:
+            return True
+    return True
+
+
+async def store(rule, key: Optional[str], browser, result: Any) -> None:
+    """agent 실행 성공 후 결과 저장 (오류/실패 결과는 저장하지 않음)"""
+    if key is None or not result_succeeded(result):
+        return
+    put(key, str(result), await current_url(browser), rule.ttl)
@@ -0,0 +1,131 @@
+# step_scheduler.py
+# depends_on 으로 서로 독립인 agent 스텝들을 동시에 실행하는 스케줄러.
+# 동시 실행되는 스텝마다 별도 브라우저 세션(BrowserSession)을 열고, 동시 실행 수는 상한으로 제한한다.
+import os
+import asyncio
+from typing import List, Dict, Any, Callable, AsyncIterator, Tuple, Optional, Awaitable
+
+from browser_support import playwright_context, restore_storage_state
+
+# ====== 설정 및 상수 ======
+MAX_PARALLEL_STEPS = int(os.environ.get("MAX_PARALLEL_STEPS", "2"))
+
+# (browser_session 또는 None) -> Agent
+AgentFactory = Callable[[Any], Any]
+
+
+def resolve_max_parallel(plan) -> int:
+    """스크립트 최상위 max_parallel 값 우선, 없으면 환경변수 기본값"""
+    try:
+        value = int(plan.meta.get("max_parallel") or MAX_PARALLEL_STEPS)
+    except (TypeError, ValueError):
+        value = MAX_PARALLEL_STEPS
+    return max(value, 1)
+
+
+async def _open_context(browser, state: Optional[Dict[str, Any]] = None):
+    """
+    스텝 전용 BrowserSession 생성 (세션 브라우저가 없는 폴백 구성이면 None → Agent 기본 동작).
+    state: 세션 공유 탭의 storage state → 전용 세션도 같은 로그인 상태로 시작
+    세션을 열지 못하면(풀 대기 시간 초과 등) 예외를 그대로 올린다: 허용 도메인/로그인/요청 차단 프로필이
+    없는 Agent 기본 브라우저로 대신 실행하지 않고 스텝을 실패 처리한다.
+    """
+    if browser is None or not hasattr(browser, "new_context"):
+        return None
+    context = await browser.new_context()
+    if state:
+        try:
+            await restore_storage_state(await playwright_context(context), state)
+        except Exception:
+            pass
+    return context
+
+
+async def _close_context(browser, context) -> None:
+    try:
+        await browser.close_context(context)
+    except Exception:
+        pass
+
+
+async def _run_one(sem: asyncio.Semaphore, make_agent: AgentFactory, browser,
+                   prepare: Optional[Callable[[Any], Awaitable[None]]] = None,
+                   state: Optional[Dict[str, Any]] = None) -> Any:
+    async with sem:
+        context = None
+        try:
+            context = await _open_context(browser, state)
+            if prepare is not None and context is not None:
+                await prepare(context)
+            agent = make_agent(context)
+            return await agent.run()
+        except Exception as e:
+            return f"❌ 실행 오류: {str(e)}"
+        finally:
+            if context is not None:
+                await _close_context(browser, context)
+
+
+async def run_agents_parallel(factories: List[AgentFactory], browser, max_parallel: int,
+                              prepares: Optional[List[Callable[[Any], Awaitable[None]]]] = None,
+                              state: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """
+    여러 agent 스텝을 동시 실행하고 입력 순서대로 결과 반환.
+    prepares: 스텝별로 전용 세션을 연 직후 호출할 코루틴 함수 (요청 차단 프로필 적용 등)
+    state: 전용 세션마다 복원할 storage state (세션 공유 탭의 로그인 상태)
+    """
+    sem = asyncio.Semaphore(max(max_parallel, 1))
+    prepares = prepares or [None] * len(factories)
+    return list(await asyncio.gather(*(_run_one(sem, f, browser, p, state) for f, p in zip(factories, prepares))))
+
+
+
+def describe_actions(model_output) -> str:
+    """Agent 출력의 액션 이름 요약 (예: 'go_to_url, click_element')"""
+    try:
+        names = []
+        for action in getattr(model_output, "action", None) or []:
+            data = action.model_dump(exclude_none=True, exclude_unset=True)
+            names.extend(data.keys())
+        return ", ".join(names) or "생각 중"
+    except Exception:
+        return "진행 중"
+
+
+async def stream_agent_run(make_agent: Callable[..., Any], label: str) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Agent를 실행하면서 액션마다 ("action", 상태문구)를 내보내고,
+    마지막에 ("result", 결과)를 내보내는 비동기 제너레이터.
+    make_agent(on_step) 는 register_new_step_callback 으로 on_step 을 연결한 Agent를 반환해야 한다.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_step(state, model_output, step_number):
+        events.put_nowait(f"🔄 {label} — 액션 {step_number}: {describe_actions(model_output)}")
+
+    try:
+        run_task = asyncio.ensure_future(make_agent(on_step).run())
+    except Exception as e:
+        yield "result", f"❌ 실행 오류: {str(e)}"
+        return
+
+    try:
+        while not run_task.done():
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({run_task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield "action", getter.result()
+            else:
+                getter.cancel()
+        while not events.empty():
+            yield "action", events.get_nowait()
+    finally:
+        # 소비자가 중간에 닫으면 실행 중인 Agent도 취소
+        if not run_task.done():
+            run_task.cancel()
+
+    try:
+        res = run_task.result()
+    except Exception as e:
+        res = f"❌ 실행 오류: {str(e)}"
+    yield "result", res
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# 저장소 루트의 평면 모듈(run_log, script_plan, ...)을 그대로 임포트할 수 있게 경로 추가
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
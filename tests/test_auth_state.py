@@ -0,0 +1,24 @@
+# tests/test_auth_state.py
+import asyncio
+
+import auth_state
+
+
+class _Browser:
+    pass
+
+
+def test_bind_without_account_leaves_session_unbound():
+    browser = _Browser()
+    auth_state.bind(browser, None, ["outlook.office.com"])
+    assert auth_state.binding(browser) is None
+    assert asyncio.run(auth_state.inject(browser)) is False
+    assert auth_state.maybe_save(browser, {"cookies": [{"name": "a"}]}, "https://outlook.office.com/") is False
+
+
+def test_bind_records_account_and_domain_group():
+    browser = _Browser()
+    auth_state.bind(browser, "alice", ["www.Outlook.office.com", "teams.microsoft.com"])
+    account, group = auth_state.binding(browser)
+    assert account == "alice"
+    assert group == auth_state.domain_group(["teams.microsoft.com", "outlook.office.com"])
@@ -0,0 +1,76 @@
+# tests/test_dom_diff.py
+import os
+import contextvars
+
+import pytest
+
+import dom_diff
+
+
+def _elements(n, start=1, changed=None):
+    lines = []
+    for i in range(n):
+        text = changed.get(i, f"메일 제목 {i}") if changed else f"메일 제목 {i}"
+        lines.append(f"[{start + i}]<a href=/mail/{i}>{text}</a>")
+    return lines
+
+
+def test_unchanged_run_is_collapsed_with_labels():
+    previous = _elements(10)
+    current = _elements(10, start=101, changed={9: "새 메일"})
+    text, runs = dom_diff.render_diff(previous, current)
+    lines = text.split("\n")
+    assert runs == 1
+    # 구간 앞뒤 한 줄은 원문, 가운데는 안내 + 요소별 라벨 (현재 번호)
+    assert lines[0] == current[0]
+    assert "7 elements unchanged" in lines[1]
+    assert lines[2] == "[102]<a> 메일 제목 1"
+    assert lines[8] == "[108]<a> 메일 제목 7"
+    assert lines[9] == current[8]
+    assert lines[10] == current[9]
+
+
+def test_short_runs_are_sent_in_full():
+    previous = _elements(dom_diff.DOM_DIFF_MIN_RUN - 1)
+    current = list(previous)
+    text, runs = dom_diff.render_diff(previous, current)
+    assert runs == 0
+    assert text == "\n".join(current)
+
+
+def test_deleted_lines_are_dropped_and_inserts_kept():
+    previous = ["[1]<button>삭제됨</button>", "[2]<button>유지</button>"]
+    current = ["[1]<button>유지</button>", "[2]<input placeholder=검색 />"]
+    text, runs = dom_diff.render_diff(previous, current)
+    assert runs == 0
+    assert text.split("\n") == current
+
+
+def test_label_falls_back_to_next_text_line_and_truncates(monkeypatch):
+    monkeypatch.setattr(dom_diff, "DOM_DIFF_LABEL_CHARS", 10)
+    lines = ["\t[5]<div role=button />", "\t아주 긴 설명 텍스트가 이어집니다", "\t[6]<span>" + "가" * 30 + "</span>"]
+    assert dom_diff._label(lines, 0) == "[5]<div> 아주 긴 설명 텍…"
+    assert dom_diff._label(lines, 2) == "[6]<span> " + "가" * 9 + "…"
+
+
+def test_key_ignores_index_and_new_marker():
+    assert dom_diff._key("*[12]<a>x</a>") == dom_diff._key("[3]<a>x</a>")
+
+
+@pytest.mark.skipif("DOM_DIFF" in os.environ, reason="DOM_DIFF 가 설정된 환경")
+def test_disabled_by_default():
+    assert dom_diff.DOM_DIFF_ENABLED is False
+
+
+def test_step_flag_overrides_global(monkeypatch):
+    def enabled(flag):
+        ctx = contextvars.copy_context()
+        ctx.run(dom_diff.start_step, flag, {})
+        return ctx.run(dom_diff._state.get)["enabled"]
+
+    monkeypatch.setattr(dom_diff, "DOM_DIFF_ENABLED", False)
+    assert enabled(None) is False
+    assert enabled(True) is True
+    monkeypatch.setattr(dom_diff, "DOM_DIFF_ENABLED", True)
+    assert enabled(None) is True
+    assert enabled(False) is False
@@ -0,0 +1,69 @@
+# tests/test_fanout.py
+from types import SimpleNamespace
+
+import fanout
+from script_plan import ForeachRule
+
+
+def test_extract_items_prefers_json_array():
+    text = '찾은 메일:\n```json\n[{"subject": "A", "url": "/mail/1"}, {"subject": "B"}]\n```'
+    assert fanout.extract_items(text) == [{"subject": "A", "url": "/mail/1"}, {"subject": "B"}]
+
+
+def test_extract_items_bullets_urls_lines():
+    assert fanout.extract_items("목록\n- 첫째\n2) 둘째\n* 셋째") == ["첫째", "둘째", "셋째"]
+    # 문장 부호는 떼고, 중복 URL 은 한 번만
+    assert fanout.extract_items("https://a.example/x 와 https://b.example/y, 다시 https://a.example/x.") == [
+        "https://a.example/x", "https://b.example/y"
+    ]
+    assert fanout.extract_items("하나\n\n  둘  \n") == ["하나", "둘"]
+    assert fanout.extract_items("") == []
+
+
+def test_resolve_items_uses_latest_output_and_limit():
+    rule = ForeachRule(source=1, max_items=2)
+    outputs = [
+        {"step": 1, "output": "- old"},
+        {"step": 1, "output": "- a\n- b\n- c", "final": "- x\n- y\n- z"},
+    ]
+    assert fanout.resolve_items(rule, outputs) == ["x", "y"]
+    assert fanout.resolve_items(ForeachRule(source=3), outputs) == []
+    assert fanout.resolve_items(ForeachRule(source=None, items=("p", "q")), []) == ["p", "q"]
+
+
+def test_item_url():
+    base = "https://outlook.office.com/mail/inbox"
+    assert fanout.item_url({"subject": "A", "href": "/mail/id/1"}, base) == "https://outlook.office.com/mail/id/1"
+    assert fanout.item_url({"webUrl": "https://x.example/a"}) == "https://x.example/a"
+    assert fanout.item_url({"subject": "링크 https://y.example/b."}) == "https://y.example/b"
+    assert fanout.item_url("참고: https://z.example/c;") == "https://z.example/c"
+    assert fanout.item_url("URL 없음") is None
+
+
+def test_item_text_and_merge():
+    items = [{"subject": "A", "from": "kim", "empty": ""}, "두번째"]
+    assert fanout.item_text(items[0]) == "subject: A, from: kim"
+    merged = fanout.merge(items, ["요약1", "요약2"])
+    assert merged == "### [1] subject: A, from: kim\n요약1\n\n### [2] 두번째\n요약2"
+
+
+def test_final_text():
+    assert fanout.final_text(SimpleNamespace(final_result=lambda: "답")) == "답"
+    assert fanout.final_text("❌ 실행 오류") == "❌ 실행 오류"
+
+
+def test_combine():
+    total = fanout.combine([
+        {"llm_calls": 2, "image_bytes": 10.5, "models": ["a"], "net_profile": "light", "vision": True},
+        {"llm_calls": 3, "models": ["b"], "net_profile": "strict", "network_error": "x"},
+    ])
+    assert total == {"llm_calls": 5, "image_bytes": 10.5, "models": ["a", "b"],
+                     "net_profile": "light", "network_error": "x"}
+
+
+def test_allowed_domains():
+    ctx = SimpleNamespace(browser_profile=SimpleNamespace(allowed_domains=["office.com", "*.sharepoint.com"]))
+    assert fanout._allowed(ctx, "https://outlook.office.com/mail")
+    assert fanout._allowed(ctx, "https://contoso.sharepoint.com/x")
+    assert not fanout._allowed(ctx, "https://evil.example/office.com")
+    assert fanout._allowed(SimpleNamespace(), "https://anything.example/")
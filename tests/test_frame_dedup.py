@@ -0,0 +1,83 @@
+# tests/test_frame_dedup.py
+import io
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+import frame_dedup
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _png(color) -> bytes:
+    buf = io.BytesIO()
+    img = Image.new("L", (36, 32), 0)
+    for x in range(18):
+        for y in range(32):
+            img.putpixel((x, y), color)
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _messages(png: bytes):
+    url = "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+    return [SimpleNamespace(content=[SimpleNamespace(image_url=SimpleNamespace(url=url))])]
+
+
+class _Page:
+    def __init__(self, png):
+        self.png = png
+        self.shots = 0
+
+    async def screenshot(self, type="png"):
+        self.shots += 1
+        return self.png
+
+
+def test_dhash_distance():
+    assert frame_dedup.distance(frame_dedup.dhash(_png(255)), frame_dedup.dhash(_png(255))) == 0
+    assert frame_dedup.distance(frame_dedup.dhash(_png(255)), frame_dedup.dhash(_png(0))) > frame_dedup.FRAME_DEDUP_DISTANCE
+
+
+def test_wait_rescreenshots_the_step_session(monkeypatch):
+    # 병렬/foreach 스텝의 전용 세션을 넘기면 그 세션의 탭을 다시 찍어야 한다 (세션 공유 탭이 아니라)
+    monkeypatch.setattr(frame_dedup, "FRAME_DEDUP_MODE", "auto")
+    monkeypatch.setattr(frame_dedup, "FRAME_DEDUP_WAIT_S", 0.05)
+    monkeypatch.setattr(frame_dedup, "POLL_INTERVAL_S", 0.0)
+    png = _png(255)
+    page = _Page(png)
+    asked = []
+
+    async def current_page(browser):
+        asked.append(browser)
+        return page
+    monkeypatch.setattr(frame_dedup, "current_page", current_page)
+
+    async def scenario():
+        stats = {}
+        frame_dedup.start_step("step-context", stats)
+        await frame_dedup.before_inference(_messages(png))
+        frame_dedup.after_inference(SimpleNamespace(completion=SimpleNamespace(action=[])), 1.0)
+        messages, reused = await frame_dedup.before_inference(_messages(png))
+        return stats, reused
+
+    stats, reused = asyncio.run(scenario())
+    assert reused is None
+    assert asked == ["step-context"]
+    assert page.shots > 0
+    assert stats["dedup_similar"] == 1 and stats["dedup_waited"] == 1
+
+
+def test_agent_factory_passes_step_context(monkeypatch):
+    pytest.importorskip("browser_use")
+    import script_runner
+
+    seen = []
+    monkeypatch.setattr(script_runner.frame_dedup, "start_step", lambda browser, stats=None: seen.append(browser))
+    monkeypatch.setattr(script_runner.page_ready, "adapt_context", lambda context: None)
+    monkeypatch.setattr(script_runner.model_cascade, "cascade_agent", lambda build, choice, llm, stats: build)
+    factory = script_runner.make_agent_factory("task", None, "session-browser", None, {})
+    factory("step-context")
+    assert seen == ["step-context"]
@@ -0,0 +1,94 @@
+# tests/test_llm_cache.py
+import os
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """임시 디렉터리의 SQLite 저장소 (응답 객체는 browser_use 없이 단순 객체로)"""
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    monkeypatch.setattr(llm_cache, "ChatInvokeCompletion",
+                        lambda completion, usage: SimpleNamespace(completion=completion, usage=usage))
+    monkeypatch.setattr(llm_cache, "_stats", {k: 0 for k in llm_cache._stats})
+    yield llm_cache
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+
+
+def _msg(role, content):
+    return SimpleNamespace(role=role, content=content)
+
+
+def _image(data: bytes):
+    url = "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+    return SimpleNamespace(image_url=SimpleNamespace(url=url))
+
+
+@pytest.mark.skipif("LLM_CACHE" in os.environ, reason="LLM_CACHE 가 설정된 환경")
+def test_disabled_by_default():
+    assert llm_cache.LLM_CACHE_ENABLED is False
+    assert not llm_cache.active()
+
+
+def test_cache_key_normalizes_text():
+    a = llm_cache.cache_key("m", [_msg("user", "  안녕  \n세계   ")])
+    b = llm_cache.cache_key("m", [_msg("user", "안녕\n세계")])
+    assert a == b
+    assert a != llm_cache.cache_key("other", [_msg("user", "안녕\n세계")])
+    assert a != llm_cache.cache_key("m", [_msg("system", "안녕\n세계")])
+
+
+def test_cache_key_hashes_image_bytes():
+    text = SimpleNamespace(text="화면")
+    same = llm_cache.cache_key("m", [_msg("user", [text, _image(b"png-1")])])
+    assert same == llm_cache.cache_key("m", [_msg("user", [text, _image(b"png-1")])])
+    assert same != llm_cache.cache_key("m", [_msg("user", [text, _image(b"png-2")])])
+
+
+def test_put_get_roundtrip(cache):
+    key = cache.cache_key("m", [_msg("user", "q")])
+    assert cache.get(key) is None
+    cache.put(key, "m", SimpleNamespace(completion="답"))
+    hit = cache.get(key)
+    assert hit.completion == "답" and hit.usage is None
+    stats = cache.llm_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 1, 1, 1)
+
+
+def test_step_stats_counted(cache):
+    step = {}
+    cache.use_for_step(True, step)
+    try:
+        cache.get("missing")
+    finally:
+        cache.use_for_step(True, None)
+    assert step == {"llm_cache_hits": 0, "llm_cache_misses": 1}
+
+
+def test_evicts_least_recently_used(cache, monkeypatch):
+    # 항목 하나가 약 40바이트 → 상한 100바이트면 2개만 남음 (90%까지 줄임)
+    monkeypatch.setattr(cache, "LLM_CACHE_MAX_MB", 100 / (1024 * 1024))
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, "m", SimpleNamespace(completion=f"value-{i}"))
+        cache._db().execute("UPDATE responses SET last_used = ? WHERE key = ?", (i, key))
+    cache.put("d", "m", SimpleNamespace(completion="value-3"))
+    keys = {row[0] for row in cache._db().execute("SELECT key FROM responses")}
+    assert "a" not in keys and "d" in keys
+    assert cache.llm_cache_stats()["evictions"] >= 1
+
+
+def test_stats_do_not_create_store_when_disabled(cache, monkeypatch, tmp_path):
+    store = tmp_path / "store"
+    monkeypatch.setattr(cache, "LLM_CACHE_DIR", store)
+    monkeypatch.setattr(cache, "LLM_CACHE_ENABLED", False)
+    stats = cache.llm_cache_stats()
+    assert stats["entries"] == 0 and stats["size_bytes"] == 0 and stats["enabled"] is False
+    assert not store.exists()
+    assert cache._conn is None
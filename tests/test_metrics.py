@@ -0,0 +1,80 @@
+# tests/test_metrics.py
+import os
+import re
+
+import pytest
+
+import metrics
+
+# Prometheus 텍스트 형식 0.0.4 의 샘플 줄: 이름{라벨="값",...} 값
+_SAMPLE_RE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*")*\})?'
+    r' (-?[0-9.eE+-]+|\+Inf|-Inf|NaN)$'
+)
+
+
+def test_counter_render():
+    c = metrics.Counter("t_requests_total", "요청 수", ("path",))
+    c.inc(path="/a")
+    c.inc(2, path='/b"q')
+    assert c.render() == [
+        "# HELP t_requests_total 요청 수",
+        "# TYPE t_requests_total counter",
+        't_requests_total{path="/a"} 1',
+        't_requests_total{path="/b\\"q"} 2',
+    ]
+
+
+def test_histogram_render_is_cumulative():
+    h = metrics.Histogram("t_seconds", "지연", buckets=(1, 5))
+    for v in (0.5, 2.0, 10.0):
+        h.observe(v)
+    assert h.render()[2:] == [
+        't_seconds_bucket{le="1"} 1',
+        't_seconds_bucket{le="5"} 2',
+        't_seconds_bucket{le="+Inf"} 3',
+        "t_seconds_sum 12.5",
+        "t_seconds_count 3",
+    ]
+
+
+def test_render_lines_are_valid_exposition_format(monkeypatch):
+    monkeypatch.setattr(metrics, "_stats_sources", lambda: {
+        "plan_cache": lambda: {"hits": 3, "hit-rate": 0.5, "enabled": True, "mode": "x"},
+    })
+    metrics.STEP_SECONDS.observe(1.2, type="agent", source="llm")
+    metrics.LLM_TOKENS.inc(10, model="llava:7b", kind="prompt")
+    text = metrics.render()
+    assert text.endswith("\n")
+    names = set()
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) [a-zA-Z_:][a-zA-Z0-9_:]* ", line), line
+            continue
+        assert _SAMPLE_RE.match(line), line
+        names.add(re.match(r"[^{ ]+", line).group(0))
+    assert "webrunner_step_seconds_count" in names
+    assert "webrunner_llm_tokens_total" in names
+    assert "webrunner_plan_cache_hits" in names
+    assert "webrunner_plan_cache_hit_rate" in names
+    assert "webrunner_plan_cache_enabled" not in names
+
+
+def test_record_step_row_and_summary_table():
+    stats = {}
+    metrics.use_for_step(stats)
+    try:
+        metrics.record_llm("m", 0.5)
+        metrics.record_tokens("m", 100, 20)
+    finally:
+        metrics.use_for_step(None)
+    row = metrics.record_step("agent", "llm", 1.234, {**stats, "bytes_after": 2048})
+    assert row["llm_calls"] == 1 and row["prompt_tokens"] == 100 and row["image_kb"] == 2.0
+    table = metrics.summary_table([{"name": "a", "type": "agent", **row}])
+    assert table.splitlines()[-1].startswith("| **합계** |")
+
+
+@pytest.mark.skipif("METRICS_HOST" in os.environ, reason="METRICS_HOST 가 설정된 환경")
+def test_server_binds_localhost_by_default():
+    assert metrics.METRICS_HOST == "127.0.0.1"
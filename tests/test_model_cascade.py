@@ -0,0 +1,52 @@
+# tests/test_model_cascade.py
+import threading
+
+import model_cascade
+from model_cascade import CascadeAgent, ModelChoice
+
+
+class _FakeAgent:
+    def __init__(self, llm, use_vision, result):
+        self.llm = llm
+        self.use_vision = use_vision
+        self.result = result
+
+    async def run(self, max_steps=100):
+        return self.result(self)
+
+
+def _cascade(choice, result, stats=None):
+    built = []
+
+    def build(llm, use_vision):
+        agent = _FakeAgent(llm, use_vision, result)
+        built.append(agent)
+        return agent
+    return CascadeAgent(build, choice, "text-llm", "vision-llm", stats), built
+
+
+def test_run_sync_from_worker_thread():
+    # Gradio 작업 스레드처럼 현재 이벤트 루프가 없는 스레드에서 호출
+    cascade, _ = _cascade(ModelChoice(vision="on"), lambda a: f"ok:{a.llm}")
+    out = {}
+    worker = threading.Thread(target=lambda: out.update(res=cascade.run_sync(max_steps=3)))
+    worker.start()
+    worker.join(timeout=10)
+    assert out["res"] == "ok:vision-llm"
+
+
+def test_auto_escalates_failed_text_result_to_vision():
+    stats = {}
+    cascade, built = _cascade(ModelChoice(vision="auto"),
+                              lambda a: "❌ 실행 오류" if a.llm == "text-llm" else "done", stats)
+    assert cascade.run_sync() == "done"
+    assert [a.use_vision for a in built] == [False, True]
+    assert stats["model_tier"] == "text→vision"
+    assert stats["escalation_reason"] == "실패"
+
+
+def test_auto_keeps_successful_text_result():
+    cascade, built = _cascade(ModelChoice(vision="auto"), lambda a: "메일 3건 요약")
+    assert cascade.run_sync() == "메일 3건 요약"
+    assert len(built) == 1
+    assert model_cascade.escalation_reason("메일 3건 요약") is None
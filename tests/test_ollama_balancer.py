@@ -0,0 +1,112 @@
+# tests/test_ollama_balancer.py
+import pytest
+
+import ollama_balancer as ob
+
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    eps = [ob.Endpoint("http://a:11434"), ob.Endpoint("http://b:11434")]
+    monkeypatch.setattr(ob, "_endpoints", eps)
+    return eps
+
+
+def test_parse_hosts(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOSTS", "a:11434, http://b:11434/ ,a:11434,")
+    assert ob._parse_hosts() == ["http://a:11434", "http://b:11434"]
+    monkeypatch.delenv("OLLAMA_HOSTS")
+    monkeypatch.setenv("OLLAMA_HOST", "http://c:11434")
+    assert ob._parse_hosts() == ["http://c:11434"]
+
+
+def test_pick_least_outstanding(endpoints):
+    first = ob.pick()
+    second = ob.pick()
+    assert {first.url, second.url} == {"http://a:11434", "http://b:11434"}
+    ob.release(first, True, 0.1)
+    assert ob.pick() is first
+
+
+def test_consecutive_failures_eject(endpoints, monkeypatch):
+    a, b = endpoints
+    for _ in range(ob.MAX_FAILURES):
+        a.outstanding += 1
+        ob.release(a, False, 0.0, "ConnectError")
+    assert a.ejections == 1 and a.reason.startswith("연속 실패")
+    # 제외된 동안은 진행 중 요청이 더 많아도 b 로
+    b.outstanding = 5
+    assert ob.pick() is b
+    # EJECT_S 가 지나면 복귀
+    later = ob.time.time() + ob.EJECT_S + 1
+    monkeypatch.setattr(ob.time, "time", lambda: later)
+    b.outstanding = 5
+    assert ob.pick() is a
+
+
+def test_success_resets_failures(endpoints):
+    a, _ = endpoints
+    for _ in range(ob.MAX_FAILURES - 1):
+        a.outstanding += 1
+        ob.release(a, False, 0.0)
+    a.outstanding += 1
+    ob.release(a, True, 0.2)
+    assert a.failures == 0 and a.ejections == 0
+
+
+def test_slow_endpoint_ejected(endpoints):
+    a, b = endpoints
+    for _ in range(ob.SLOW_MIN_SAMPLES):
+        b.outstanding += 1
+        ob.release(b, True, 1.0)
+    for _ in range(ob.SLOW_MIN_SAMPLES):
+        a.outstanding += 1
+        ob.release(a, True, 1.0 * ob.SLOW_FACTOR * 2)
+    assert a.ejections == 1 and a.reason.startswith("느림")
+    assert a.latency_ewma is None and a.requests == 0
+    assert b.ejections == 0
+
+
+def test_model_and_affinity_routing(endpoints):
+    a, b = endpoints
+    a.models = {"llava:7b"}
+    b.models = {"llama3.2-vision:latest"}
+    ep = ob.pick("llama3.2-vision")
+    assert ep is b
+    ob.release(ep, True, 0.1)
+    a.models = b.models = None
+    ep = ob.pick(affinity="sys-1")
+    ob.release(ep, True, 0.1)
+    assert ob.pick(affinity="sys-1") is ep
+
+
+def test_routed_records_connection_errors_only(endpoints):
+    a, b = endpoints
+    with pytest.raises(ConnectionError):
+        with ob.routed() as ep:
+            raise ConnectionError("refused")
+    assert ep.errors == 1 and ep.outstanding == 0
+    with pytest.raises(ValueError):
+        with ob.routed() as ep2:
+            raise ValueError("bad output")
+    assert ep2.failures == 0 and ep2.outstanding == 0
+
+
+def test_is_connection_error_follows_cause():
+    class ConnectTimeout(Exception):
+        pass
+
+    try:
+        try:
+            raise ConnectTimeout()
+        except ConnectTimeout as inner:
+            raise RuntimeError("wrapped") from inner
+    except RuntimeError as e:
+        assert ob.is_connection_error(e)
+    assert not ob.is_connection_error(ValueError("x"))
+
+
+def test_balancer_stats(endpoints):
+    endpoints[0].ejected_until = ob.time.time() + 10
+    stats = ob.balancer_stats()
+    assert stats["hosts"] == 2 and stats["available"] == 1
+    assert stats["endpoints"][0]["ejected"] is True
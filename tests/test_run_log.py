@@ -0,0 +1,55 @@
+# tests/test_run_log.py
+from run_log import RunLog
+
+
+def test_append_and_reopen(tmp_path):
+    log = RunLog("s1", logs_dir=tmp_path)
+    log.append("info", "시작")
+    log.append("step", "결과", name="open", step=0)
+    log.append("step", "결과2", name="read", step=1)
+
+    again = RunLog.reopen("s1", logs_dir=tmp_path)
+    assert again.seq == 3
+    assert [r["text"] for r in again.tail(3)] == ["시작", "결과", "결과2"]
+    assert again.get(1)["name"] == "open"
+    assert [r["name"] for r in again.find_step(1)] == ["read"]
+
+    again.append("info", "재개")
+    assert RunLog.reopen("s1", logs_dir=tmp_path).seq == 4
+
+
+def test_reopen_skips_truncated_index_line(tmp_path):
+    log = RunLog("s2", logs_dir=tmp_path)
+    log.append("info", "a")
+    log.append("info", "b")
+    # 인덱스 줄을 쓰는 도중 죽은 경우
+    with open(log.index_path, "a", encoding="utf-8") as f:
+        f.write("2\t\t99")
+
+    again = RunLog.reopen("s2", logs_dir=tmp_path)
+    assert again.seq == 2
+    assert [r["text"] for r in again.tail(5)] == ["a", "b"]
+
+    # 잘린 줄은 제거되어 다음 기록이 온전한 줄로 남는다
+    again.append("info", "c")
+    third = RunLog.reopen("s2", logs_dir=tmp_path)
+    assert third.seq == 3
+    assert third.get(2)["text"] == "c"
+
+
+def test_reopen_skips_index_past_end_of_log(tmp_path):
+    log = RunLog("s3", logs_dir=tmp_path)
+    log.append("info", "a")
+    with open(log.index_path, "a", encoding="utf-8") as f:
+        f.write("1\t\t100000\t50\n")
+        f.write("garbage line\n")
+
+    again = RunLog.reopen("s3", logs_dir=tmp_path)
+    assert again.seq == 1
+    assert [r["text"] for r in again.tail(5)] == ["a"]
+
+
+def test_reopen_missing_session(tmp_path):
+    log = RunLog.reopen("none", logs_dir=tmp_path)
+    assert log.seq == 0
+    assert log.tail() == []
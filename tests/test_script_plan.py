@@ -0,0 +1,91 @@
+# tests/test_script_plan.py
+import pytest
+
+import script_plan
+from script_plan import compile_script, get_plan, parse_script, clear_plan_cache, plan_cache_stats
+
+SCRIPT = """
+steps:
+  - name: open
+    type: navigate
+    url: https://outlook.office.com/mail/
+  - name: read
+    type: agent
+    task: "{today} 받은 편지함에서 {prompt} 관련 메일 요약"
+    wait_for_user_if:
+      contains: "로그인"
+      message: "로그인해 주세요"
+  - name: confirm
+    type: require_user
+    message: 확인
+"""
+
+
+def test_compile_steps():
+    plan = compile_script(SCRIPT)
+    assert len(plan) == 3
+    assert [s.type for s in plan] == ["navigate", "agent", "require_user"]
+    assert [s.deps for s in plan] == [(), (0,), (1,)]
+    read = plan[1]
+    assert read.render_task("2026-01-02", prompt="회의") == "2026-01-02 받은 편지함에서 회의 관련 메일 요약"
+    # 전달되지 않은 변수는 그대로 남음
+    assert read.render_task("2026-01-02") == "2026-01-02 받은 편지함에서 {prompt} 관련 메일 요약"
+    assert read.wait_rule.matches("다시 로그인이 필요합니다")
+    assert not read.wait_rule.matches("완료")
+    assert plan[2].message == "확인"
+
+
+def test_parse_script_returns_raw_dicts():
+    steps = parse_script(SCRIPT)
+    assert steps[1]["name"] == "read"
+    steps[1]["name"] = "changed"  # 사본이므로 캐시된 계획에 영향 없음
+    assert get_plan(SCRIPT)[1].name == "read"
+
+
+@pytest.mark.parametrize("text, message", [
+    ("steps: []", "steps 리스트"),
+    ("- a\n- b", "최상위는 매핑"),
+    ("steps:\n  - {name: a, type: agnet, task: x}", "type은"),
+    ("steps:\n  - {name: a, type: agent}", "task가 필요"),
+    ("steps:\n  - {name: a, task: x}", "type 필드"),
+    ("steps:\n  - {name: a, type: agent, task: x, depends_on: [b]}\n  - {name: b, type: agent, task: y}",
+     "앞선 스텝에만"),
+    ("steps:\n  - {name: a, type: agent, task: x, cache: {key: [nope]}}", "cache.key"),
+    ("steps: [", "YAML 파싱 오류"),
+])
+def test_invalid_scripts(text, message):
+    with pytest.raises(ValueError, match=message):
+        compile_script(text)
+
+
+def test_cache_rule_defaults():
+    plan = compile_script("steps:\n  - {name: a, type: agent, task: x, cache: true}")
+    rule = plan[0].cache_rule
+    assert rule.ttl == script_plan.DEFAULT_CACHE_TTL
+    assert rule.key_fields == tuple(script_plan.DEFAULT_CACHE_KEY)
+
+
+def test_get_plan_cache_hits():
+    clear_plan_cache()
+    first = get_plan(SCRIPT)
+    assert get_plan(SCRIPT) is first
+    stats = plan_cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["size"] == 1
+
+
+def test_get_plan_does_not_cache_failures():
+    clear_plan_cache()
+    with pytest.raises(ValueError):
+        get_plan("steps: []")
+    assert plan_cache_stats()["size"] == 0
+
+
+def test_dom_diff_flag_inherits_by_default():
+    plan = compile_script("""
+steps:
+  - {type: agent, task: a}
+  - {type: agent, task: b, dom_diff: true}
+  - {type: agent, task: c, dom_diff: false}
+""")
+    assert [s.dom_diff for s in plan] == [None, True, False]
+    assert plan[0].llm_cache is True
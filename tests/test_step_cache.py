@@ -0,0 +1,102 @@
+# tests/test_step_cache.py
+import asyncio
+
+import pytest
+
+import auth_state
+import step_cache
+from script_plan import CacheRule
+
+
+@pytest.fixture(autouse=True)
+def _clear():
+    step_cache._cache.clear()
+    yield
+    step_cache._cache.clear()
+
+
+def _rule(*fields, ttl=60.0):
+    return CacheRule(ttl=ttl, key_fields=fields or ("task", "url", "script"), expect_url=None)
+
+
+def test_make_key_uses_only_selected_fields():
+    rule = _rule("task", "url")
+    a = step_cache.make_key(rule, task="t", url="u", script_hash="s1", prompt="p1")
+    b = step_cache.make_key(rule, task="t", url="u", script_hash="s2", prompt="p2")
+    c = step_cache.make_key(rule, task="t", url="other", script_hash="s1")
+    assert a == b
+    assert a != c
+
+
+def test_make_key_separates_accounts():
+    rule = _rule()
+    alice = step_cache.make_key(rule, task="t", url="u", script_hash="s", account=("alice", "g"))
+    bob = step_cache.make_key(rule, task="t", url="u", script_hash="s", account=("bob", "g"))
+    other_group = step_cache.make_key(rule, task="t", url="u", script_hash="s", account=("alice", "g2"))
+    unbound = step_cache.make_key(rule, task="t", url="u", script_hash="s")
+    assert len({alice, bob, other_group, unbound}) == 4
+
+
+def test_put_get_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(step_cache.time, "time", lambda: now[0])
+    step_cache.put("k", "결과", "https://x/after", ttl=10)
+    entry = step_cache.get("k")
+    assert entry.output == "결과" and entry.url_after == "https://x/after"
+    now[0] += 11
+    assert step_cache.get("k") is None
+    assert "k" not in step_cache._cache
+
+
+def test_lru_bound(monkeypatch):
+    monkeypatch.setattr(step_cache, "STEP_CACHE_SIZE", 2)
+    for k in ("a", "b"):
+        step_cache.put(k, k, "", ttl=60)
+    step_cache.get("a")          # a 를 최근 사용으로
+    step_cache.put("c", "c", "", ttl=60)
+    assert set(step_cache._cache) == {"a", "c"}
+
+
+def test_result_succeeded():
+    class _History:
+        def __init__(self, ok):
+            self.ok = ok
+
+        def is_successful(self):
+            return self.ok
+
+    assert step_cache.result_succeeded("완료")
+    assert not step_cache.result_succeeded("❌ 실행 오류: x")
+    assert not step_cache.result_succeeded(_History(False))
+    assert step_cache.result_succeeded(_History(None))
+
+
+class _Browser:
+    pass
+
+
+def test_lookup_skips_sessions_without_account(monkeypatch):
+    async def current_url(browser):
+        return "https://outlook.office.com/mail/"
+    monkeypatch.setattr(step_cache, "current_url", current_url)
+    rule = _rule()
+    unbound, alice = _Browser(), _Browser()
+    auth_state.bind(unbound, None, ["outlook.office.com"])
+    auth_state.bind(alice, "alice", ["outlook.office.com"])
+    assert asyncio.run(step_cache.lookup(rule, unbound, task="메일 요약", script_hash="s")) == (None, None)
+    key, entry = asyncio.run(step_cache.lookup(rule, alice, task="메일 요약", script_hash="s"))
+    assert key is not None and entry is None
+
+
+def test_ui_browser_without_account_does_not_cache(monkeypatch):
+    pytest.importorskip("browser_use")
+    import script_runner
+
+    browser = script_runner.make_browser()
+    if browser is None:
+        pytest.skip("세션 브라우저를 쓸 수 없는 구성")
+    try:
+        assert auth_state.binding(browser) is None
+        assert asyncio.run(step_cache.lookup(_rule(), browser, task="메일 요약", script_hash="s")) == (None, None)
+    finally:
+        script_runner.release_browser(browser)
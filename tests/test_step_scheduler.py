@@ -0,0 +1,120 @@
+# tests/test_step_scheduler.py
+import asyncio
+
+from script_plan import compile_script
+from step_scheduler import run_agents_parallel, resolve_max_parallel
+
+PARALLEL = """
+max_parallel: 3
+steps:
+  - {name: login, type: agent, task: 로그인}
+  - {name: mail, type: agent, task: 메일, depends_on: [login]}
+  - {name: calendar, type: agent, task: 일정, depends_on: [login]}
+  - {name: teams, type: agent, task: 팀즈, depends_on: [login], cache: true}
+  - {name: files, type: agent, task: 파일, depends_on: [login]}
+  - {name: report, type: agent, task: 보고, depends_on: [mail, calendar]}
+"""
+
+
+def test_ready_batch_groups_independent_steps():
+    plan = compile_script(PARALLEL)
+    assert plan.ready_batch(0) == [0]
+    # mail, calendar 는 완료된 login 에만 의존 → 한 묶음. cache 가 있는 teams 에서 끊김
+    assert plan.ready_batch(1) == [1, 2]
+    assert plan.ready_batch(3) == [3]
+    # report 의 선행(mail, calendar)은 이미 끝났으므로 files 와 함께 묶임
+    assert plan.ready_batch(4) == [4, 5]
+    assert plan.ready_batch(5) == [5]
+    assert plan.ready_batch(6) == []
+
+
+def test_ready_batch_keeps_replay_and_auth_sequential():
+    plan = compile_script("""
+steps:
+  - {name: a, type: agent, task: x, depends_on: []}
+  - {name: b, type: agent, task: y, depends_on: [], replay: true}
+  - {name: c, type: agent, task: z, depends_on: [], auth: "https://example.com/"}
+  - {name: d, type: agent, task: w, depends_on: []}
+  - {name: e, type: agent, task: v, depends_on: []}
+""")
+    assert plan.ready_batch(0) == [0]
+    assert plan.ready_batch(1) == [1]
+    assert plan.ready_batch(2) == [2]
+    assert plan.ready_batch(3) == [3, 4]
+
+
+def test_ready_batch_sequential_by_default():
+    plan = compile_script("steps:\n  - {type: agent, task: a}\n  - {type: agent, task: b}")
+    assert plan.ready_batch(0) == [0]
+    assert plan.ready_batch(1) == [1]
+
+
+def test_resolve_max_parallel():
+    assert resolve_max_parallel(compile_script(PARALLEL)) == 3
+
+
+class _Agent:
+    def __init__(self, name, delay, running, peak):
+        self.name, self.delay, self.running, self.peak = name, delay, running, peak
+
+    async def run(self):
+        self.running.append(self.name)
+        self.peak.append(len(self.running))
+        await asyncio.sleep(self.delay)
+        self.running.remove(self.name)
+        return self.name
+
+
+class _Browser:
+    def __init__(self):
+        self.opened, self.closed = 0, 0
+
+    async def new_context(self):
+        self.opened += 1
+        return f"ctx{self.opened}"
+
+    async def close_context(self, context):
+        self.closed += 1
+
+
+def test_run_agents_parallel_keeps_order_and_limit():
+    running, peak, seen = [], [], []
+    browser = _Browser()
+    delays = {"a": 0.03, "b": 0.01, "c": 0.02, "d": 0.0}
+
+    def factory(name):
+        def make(context):
+            seen.append(context)
+            return _Agent(name, delays[name], running, peak)
+        return make
+
+    results = asyncio.run(run_agents_parallel([factory(n) for n in "abcd"], browser, 2))
+    assert results == ["a", "b", "c", "d"]
+    assert max(peak) == 2
+    assert browser.opened == browser.closed == 4
+    assert sorted(seen) == ["ctx1", "ctx2", "ctx3", "ctx4"]
+
+
+def test_run_agents_parallel_reports_errors_in_place():
+    class _Failing:
+        async def run(self):
+            raise RuntimeError("boom")
+
+    results = asyncio.run(run_agents_parallel(
+        [lambda ctx: _Failing(), lambda ctx: _Agent("ok", 0, [], [])], None, 2))
+    assert results[0].startswith("❌") and "boom" in results[0]
+    assert results[1] == "ok"
+
+
+def test_run_agents_parallel_fails_step_without_session():
+    # 풀이 가득 차 전용 세션을 못 열면 기본 브라우저로 돌지 않고 스텝 실패
+    class _FullPool(_Browser):
+        async def new_context(self):
+            raise RuntimeError("브라우저 풀이 가득 찼습니다")
+
+    made = []
+    browser = _FullPool()
+    results = asyncio.run(run_agents_parallel(
+        [lambda ctx: made.append(ctx) or _Agent("a", 0, [], [])], browser, 1))
+    assert results[0].startswith("❌") and "풀" in results[0]
+    assert made == [] and browser.closed == 0
@@ -0,0 +1,274 @@
+# trajectory.py
+# agent 스텝이 실제로 실행한 브라우저 액션 경로(trajectory)를 기록하고, 다음 실행에서 LLM 없이 재생한다.
+# - 기록: Agent 실행 결과(AgentHistoryList)의 액션 + 상호작용한 요소 서명(xpath/css/속성) + 액션 직전 URL
+# - 재생: 액션마다 페이지 상태(URL, 요소가 유일하게 찾아지는지)를 확인하며 직접 실행
+# - 어긋나면(divergence) 그 지점부터만 live agent로 이어서 실행하고, 새 경로로 다시 기록
+# 파일: trajectories/<스텝이름>_<task 해시>.json (format/revision 필드로 버전 관리, 권한 0600)
+import os
+import json
+import asyncio
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlparse
+
+from browser_support import step_page, current_url
+from checkpoint import atomic_write_json
+from step_cache import result_succeeded
+import page_ready
+
+# ====== 설정 및 상수 ======
+TRAJECTORIES_DIR = Path(os.environ.get("TRAJECTORIES_DIR", "./trajectories"))
+# replay: 기록 + 재생 / record: 기록만 (항상 LLM 실행) / off: 사용 안 함
+TRAJECTORY_MODE = os.environ.get("TRAJECTORY_MODE", "replay").lower()
+ACTION_TIMEOUT_MS = int(os.environ.get("TRAJECTORY_ACTION_TIMEOUT_MS", "10000"))
+
+FORMAT_VERSION = 1
+
+# 요소 서명에 남길 (비교적 안정적인) 속성
+_SIGNATURE_ATTRS = ("id", "name", "data-testid", "aria-label", "role", "type", "placeholder", "title", "href")
+
+_stats = {"replayed": 0, "diverged": 0, "recorded": 0}
+_stats_lock = threading.Lock()
+
+
+class Diverged(Exception):
+    """재생 중 페이지 상태가 기록과 다름"""
+
+
+@dataclass
+class ReplayOutcome:
+    completed: bool
+    result: str = ""
+    replayed: List[Dict[str, Any]] = field(default_factory=list)  # 재생에 성공한 액션
+    diverged_at: Optional[int] = None
+    reason: str = ""
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def trajectory_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ====== 파일 ======
+def trajectory_path(step_name: str, task: str) -> Path:
+    """스텝 이름 + 렌더링된 task 기준 (task가 바뀌면 새 경로)"""
+    digest = hashlib.sha256(f"{step_name}\n{task}".encode("utf-8")).hexdigest()[:16]
+    safe = re.sub(r"[^a-zA-Z0-9_-]", "_", step_name)[:40]
+    return TRAJECTORIES_DIR / f"{safe}_{digest}.json"
+
+
+def load(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if data.get("format") != FORMAT_VERSION or not data.get("actions"):
+        return None
+    return data
+
+
+# ====== 기록 ======
+def _element_signature(el) -> Optional[Dict[str, Any]]:
+    if el is None:
+        return None
+    attrs = getattr(el, "attributes", None) or {}
+    return {
+        "tag": getattr(el, "tag_name", None),
+        "xpath": getattr(el, "xpath", None),
+        "css": getattr(el, "css_selector", None),
+        "attributes": {k: attrs[k] for k in _SIGNATURE_ATTRS if attrs.get(k)},
+    }
+
+
+def actions_from_history(history) -> List[Dict[str, Any]]:
+    """AgentHistoryList → [{type, params, url, element}] (url은 각 agent 스텝 첫 액션 직전 URL)"""
+    actions = []
+    for item in getattr(history, "history", None) or []:
+        out = getattr(item, "model_output", None)
+        if out is None:
+            continue
+        state = getattr(item, "state", None)
+        url = getattr(state, "url", "") or ""
+        elements = list(getattr(state, "interacted_element", None) or [])
+        for i, action in enumerate(getattr(out, "action", None) or []):
+            try:
+                data = action.model_dump(exclude_none=True, exclude_unset=True)
+            except Exception:
+                continue
+            if not data:
+                continue
+            name, params = next(iter(data.items()))
+            actions.append({
+                "type": name,
+                "params": params or {},
+                # 한 agent 스텝의 두 번째 액션부터는 직전 액션으로 URL이 바뀌었을 수 있어 검사하지 않음
+                "url": url if i == 0 else "",
+                "element": _element_signature(elements[i] if i < len(elements) else None),
+            })
+    return actions
+
+
+async def record(path: Path, step_name: str, task: str, history, browser,
+                 prefix: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """성공한 agent 실행의 경로 저장 (prefix: 재생으로 이미 수행한 앞부분)"""
+    if TRAJECTORY_MODE == "off" or not result_succeeded(history):
+        return False
+    actions = list(prefix or []) + actions_from_history(history)
+    if not actions:
+        return False
+    final = getattr(history, "final_result", None)
+    prev = load(path)
+    data = {
+        "format": FORMAT_VERSION,
+        "revision": (prev or {}).get("revision", 0) + 1,
+        "step": step_name,
+        "task_sha": hashlib.sha256(task.encode("utf-8")).hexdigest(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "final_result": str(final() if callable(final) else history),
+        "url_after": await current_url(browser),
+        "actions": actions,
+    }
+    # input_text 값이 들어 있으므로 소유자만 읽기 가능
+    atomic_write_json(path, data, private=True)
+    _count("recorded")
+    return True
+
+
+# ====== 재생 ======
+def _same_stage(url: str, expected: str) -> bool:
+    """호스트 + 경로 앞 두 단계 비교 (메일 ID 등 가변 경로/쿼리는 무시)"""
+    cur, exp = urlparse(url or ""), urlparse(expected or "")
+    if exp.scheme not in ("http", "https"):
+        return True  # about:blank 등은 검사하지 않음
+    seg = lambda p: [s for s in p.path.split("/") if s][:2]
+    return cur.netloc.lower() == exp.netloc.lower() and seg(cur) == seg(exp)
+
+
+def _quote(value: str) -> str:
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+async def _locate(page, el: Optional[Dict[str, Any]]):
+    """요소 서명 → 페이지에서 정확히 1개로 찾아지는 locator (없으면 Diverged)"""
+    if not el:
+        raise Diverged("기록된 요소 정보 없음")
+    tag = el.get("tag") or ""
+    attrs = el.get("attributes") or {}
+    candidates = []
+    if attrs.get("id"):
+        candidates.append(f"[id={_quote(attrs['id'])}]")
+    for a in ("data-testid", "aria-label", "name", "placeholder", "title"):
+        if attrs.get(a):
+            candidates.append(f"{tag}[{a}={_quote(attrs[a])}]")
+    if el.get("css"):
+        candidates.append(el["css"])
+    if el.get("xpath"):
+        candidates.append("xpath=/" + el["xpath"].lstrip("/"))
+
+    for sel in candidates:
+        try:
+            loc = page.locator(sel)
+            if await loc.count() == 1:
+                return loc
+        except Exception:
+            continue
+    raise Diverged(f"요소를 찾을 수 없음: {tag} {attrs}")
+
+
+async def _apply(page, action: Dict[str, Any], stats: Optional[Dict[str, Any]] = None):
+    """액션 1개 실행 → 이후 조작할 페이지"""
+    t, p = action["type"], action.get("params") or {}
+    page_ready.track(page)
+    if t == "go_to_url":
+        await page.goto(p["url"], wait_until="domcontentloaded", timeout=ACTION_TIMEOUT_MS)
+    elif t == "open_tab":
+        page = await page.context.new_page()
+        await page.goto(p["url"], wait_until="domcontentloaded", timeout=ACTION_TIMEOUT_MS)
+    elif t == "go_back":
+        await page.go_back(timeout=ACTION_TIMEOUT_MS)
+    elif t in ("click_element", "click_element_by_index"):
+        await (await _locate(page, action.get("element"))).click(timeout=ACTION_TIMEOUT_MS)
+    elif t == "input_text":
+        await (await _locate(page, action.get("element"))).fill(str(p.get("text", "")), timeout=ACTION_TIMEOUT_MS)
+    elif t == "send_keys":
+        await page.keyboard.press(str(p.get("keys", "")))
+    elif t in ("scroll_down", "scroll_up"):
+        amount = int(p.get("amount") or 600)
+        await page.mouse.wheel(0, amount if t == "scroll_down" else -amount)
+    elif t == "wait":
+        await asyncio.sleep(min(float(p.get("seconds", 1)), 10))
+    else:
+        # extract_content 등 LLM이 필요한 액션은 재생 불가 → 여기서부터 agent
+        raise Diverged(f"재생할 수 없는 액션: {t}")
+    if page_ready.ADAPTIVE and t != "wait":
+        # SPA 전환이 끝날 때까지 (다음 요소를 반쯤 그려진 화면에서 찾지 않도록)
+        await page_ready.wait_ready(page, stats, max_s=ACTION_TIMEOUT_MS / 1000)
+        return page
+    try:
+        await page.wait_for_load_state("domcontentloaded", timeout=ACTION_TIMEOUT_MS)
+    except Exception:
+        pass
+    return page
+
+
+async def replay(path: Path, browser, stats: Optional[Dict[str, Any]] = None) -> Optional[ReplayOutcome]:
+    """기록된 경로 재생 (기록 없음/재생 불가 구성이면 None). stats: 페이지 준비 대기를 기록할 스텝 집계 dict"""
+    if TRAJECTORY_MODE != "replay":
+        return None
+    data = load(path)
+    if data is None:
+        return None
+    page = await step_page(browser)
+    if page is None:
+        return None
+
+    done: List[Dict[str, Any]] = []
+    for i, action in enumerate(data["actions"]):
+        if action["type"] == "done":
+            break
+        try:
+            if action.get("url") and not _same_stage(page.url, action["url"]):
+                raise Diverged(f"페이지 불일치: {page.url} (기록: {action['url']})")
+            page = await _apply(page, action, stats)
+        except Exception as e:
+            _count("diverged")
+            return ReplayOutcome(False, replayed=done, diverged_at=i, reason=str(e).splitlines()[0] if str(e) else type(e).__name__)
+        done.append(action)
+
+    if not _same_stage(page.url, data.get("url_after", "")):
+        _count("diverged")
+        return ReplayOutcome(False, replayed=done, diverged_at=len(done), reason=f"최종 페이지 불일치: {page.url}")
+    _count("replayed")
+    return ReplayOutcome(True, result=data.get("final_result", ""), replayed=done)
+
+
+def _describe(action: Dict[str, Any]) -> str:
+    el = action.get("element") or {}
+    attrs = el.get("attributes") or {}
+    target = attrs.get("aria-label") or attrs.get("title") or attrs.get("name") or el.get("tag") or ""
+    params = {k: v for k, v in (action.get("params") or {}).items() if k in ("url", "keys")}
+    return " ".join(str(x) for x in (action["type"], target, params or "") if x)
+
+
+def resume_task(task: str, outcome: ReplayOutcome) -> str:
+    """어긋난 지점부터 agent가 이어받도록 이미 수행한 동작을 task에 덧붙임"""
+    if not outcome.replayed:
+        return task
+    lines = "\n".join(f"- {_describe(a)}" for a in outcome.replayed)
+    return (
+        f"{task}\n\n"
+        f"(참고: 아래 동작은 이미 수행되었다. 처음부터 다시 하지 말고 현재 화면에서 이어서 작업을 완료하라.)\n{lines}"
+    )
@@ -11,10 +11,11 @@ from typing import List, Dict, Any, Optional, Tuple
 # 환경 변수 설정
 os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")
 
-import yaml
 import streamlit as st
 from browser_use import Agent, ChatOllama
 
+from script_plan import get_plan
+
 # 브라우저 설정
 Browser = BrowserConfig = BrowserContextConfig = None
 try:
@@ -92,55 +93,36 @@ def load_prompt(name: str) -> str:
 
 # ====== 실행 엔진 ======
 def parse_script(yaml_text: str) -> List[Dict[str, Any]]:
-    """YAML 스크립트 파싱 및 유효성 검사"""
-    try:
-        data = yaml.safe_load(yaml_text) or {}
-        steps = data.get("steps", [])
-        if not isinstance(steps, list) or not steps:
-            raise ValueError("YAML에 steps 리스트가 필요합니다.")
-        
-        for i, s in enumerate(steps):
-            if "type" not in s:
-                raise ValueError(f"{i+1}번째 step에 type 필드가 없습니다.")
-            if s["type"] == "agent" and "task" not in s:
-                raise ValueError(f"{i+1}번째 step(type=agent)에 task가 필요합니다.")
-            if s["type"] not in ["agent", "require_user"]:
-                raise ValueError(f"{i+1}번째 step의 type은 'agent' 또는 'require_user'여야 합니다.")
-        
-        return steps
-    except yaml.YAMLError as e:
-        raise ValueError(f"YAML 파싱 오류: {e}")
-    except Exception as e:
-        raise ValueError(f"스크립트 유효성 검사 오류: {e}")
+    """YAML 스크립트 파싱 및 유효성 검사 (컴파일된 계획 캐시 사용)"""
+    return [dict(s.raw) for s in get_plan(yaml_text)]
 
 def run_script_step(script_text: str, step_idx: int, prompt_text: str = "") -> Tuple[str, bool, str]:
     """단일 스텝 실행"""
     try:
-        steps = parse_script(script_text)
-        if step_idx >= len(steps):
+        # 스텝마다 전체 YAML을 다시 파싱하지 않도록 캐시된 계획 사용
+        plan = get_plan(script_text)
+        if step_idx >= len(plan):
             return "모든 스텝이 완료되었습니다.", False, ""
         
-        step = steps[step_idx]
-        stype = step.get("type")
-        sname = step.get("name", f"step_{step_idx+1}")
+        step = plan[step_idx]
+        stype = step.type
+        sname = step.name
         
         if stype == "agent":
-            task = (step.get("task") or "").replace("{today}", datetime.now().strftime("%Y-%m-%d")).replace("{prompt}", prompt_text)
+            task = step.render_task(datetime.now().strftime("%Y-%m-%d"), prompt_text)
             full_task = SAFETY_PREAMBLE + "\n\n" + task
             
             # 실제 실행 대신 시뮬레이션 (웹 환경에서는 제한적)
             result = f"✅ {sname} 실행 완료\n\n작업: {task[:100]}...\n\n결과: 시뮬레이션 모드에서 실행됨"
             
             # 대기 조건 확인
-            wfi = step.get("wait_for_user_if")
-            if isinstance(wfi, dict) and wfi.get("contains"):
-                if str(wfi["contains"]).lower() in result.lower():
-                    return result, True, wfi.get("message", "사용자 액션이 필요합니다.")
+            if step.wait_rule and step.wait_rule.matches(result):
+                return result, True, step.wait_rule.message
             
             return result, False, ""
             
         elif stype == "require_user":
-            message = step.get("message", "이 단계를 사람이 처리하세요.")
+            message = step.message or "이 단계를 사람이 처리하세요."
             return f"⏸ {sname}: {message}", True, message
             
         else:
@@ -2,25 +2,20 @@
 import os
 import re
 import subprocess
-import json
-from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List
 
 os.environ.setdefault("OLLAMA_HOST", "http://127.0.0.1:11434")  # 로컬 Ollama 기본값
 
-import yaml
 import gradio as gr
-from browser_use import Agent, ChatOllama
 
-# 브라우저 설정은 버전에 따라 최상위 export가 없을 수 있으므로 안전 임포트
-Browser = BrowserConfig = BrowserContextConfig = None
-try:
-    from browser_use import Browser as _Browser, BrowserConfig as _BrowserConfig, BrowserContextConfig as _BrowserContextConfig
-    Browser, BrowserConfig, BrowserContextConfig = _Browser, _BrowserConfig, _BrowserContextConfig
-except Exception:
-    # 구버전/내보내기 없는 경우엔 내부 기본 브라우저로 자동 폴백
-    pass
+from async_engine import get_engine
+from run_log import RunLog
+from checkpoint import list_checkpoints
+from llm_pool import start_warmup
+from metrics import start_metrics_server
+# 실행 엔진은 script_runner에 있음
+from script_runner import iter_until_wait, resume_session, reset_session, release_browser, warm_browsers
 
 # ====== 설정 및 상수 ======
 PROMPTS_DIR = Path("./prompts")
@@ -28,50 +23,7 @@ LOGS_DIR = Path("./logs")
 PROMPTS_DIR.mkdir(exist_ok=True)
 LOGS_DIR.mkdir(exist_ok=True)
 
-# 기본 허용 도메인 (Microsoft 365 + 조직 SSO)
-DEFAULT_ALLOWED_DOMAINS = [
-    "office.com", "www.office.com",
-    "login.microsoftonline.com", "microsoftonline.com",
-    "microsoft.com", "www.microsoft.com",
-    "microsoft365.com", "www.microsoft365.com",
-    "outlook.office.com", "outlook.live.com", "www.outlook.com",
-    "teams.microsoft.com", "www.teams.microsoft.com",
-    "sharepoint.com", "www.sharepoint.com",
-    "onedrive.live.com", "www.onedrive.live.com",
-    # 회사 SSO가 있으면 여기에 추가: "sso.mycompany.com"
-]
-
-# 안전 프리앰블
-SAFETY_PREAMBLE = """안전 정책:
-- 절대 비밀번호/MFA를 직접 입력하지 마라.
-- 로그인 단계가 필요하면 사용자에게 로그인 완료를 요청하고, 그 단계에서 작업을 종료하라.
-- 구매/삭제/전송 등 고위험 동작은 수행하지 말고, 사용자에게 확인을 요청하라.
-- 민감한 개인정보나 금융정보를 입력하지 마라.
-- 보안 토큰이나 API 키를 입력하지 마라.
-"""
-
 # ====== 유틸리티 함수들 ======
-def mask_sensitive_info(text: str) -> str:
-    """민감정보 마스킹"""
-    # 이메일 마스킹
-    text = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '***@***.***', text)
-    # 전화번호 마스킹
-    text = re.sub(r'\b\d{3}-\d{4}-\d{4}\b', '***-****-****', text)
-    text = re.sub(r'\b\d{3}-\d{3}-\d{4}\b', '***-***-****', text)
-    # URL 쿼리 토큰 마스킹
-    text = re.sub(r'[?&](token|key|password|pwd|secret)=[^&\s]+', r'\1=***', text)
-    return text
-
-def save_log_to_file(log_content: str, session_id: str = None) -> str:
-    """로그를 파일로 저장"""
-    if not session_id:
-        session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    log_file = LOGS_DIR / f"session_{session_id}.log"
-    with open(log_file, 'w', encoding='utf-8') as f:
-        f.write(log_content)
-    return str(log_file)
-
 def get_prompt_files() -> List[str]:
     """저장된 프롬프트 파일 목록 반환"""
     if not PROMPTS_DIR.exists():
@@ -115,142 +67,15 @@ def open_prompt_in_notepad(name: str) -> bool:
     except Exception:
         return False
 
-# ====== 공통 리소스(세션마다 1개) ======
-def make_llm():
-    """화면을 "보고" 판단 → 비전 모델 사용"""
-    return ChatOllama(model="llama3.2-vision")
-
-def make_browser(allowed_domains: List[str] = None):
-    """
-    최신 버전에선 명시 설정 사용,
-    구버전에선 None을 리턴해 Agent가 내부 기본 브라우저를 쓰도록 폴백.
-    """
-    if Browser and BrowserConfig:
-        cfg = None
-        if BrowserContextConfig:
-            domains = allowed_domains or DEFAULT_ALLOWED_DOMAINS
-            cfg = BrowserConfig(
-                headless=False,  # 창 보이게
-                new_context_config=BrowserContextConfig(
-                    allowed_domains=domains,
-                    minimum_wait_page_load_time=2,
-                    maximum_wait_page_load_time=25,
-                ),
-            )
-        else:
-            # BrowserContextConfig가 없는 구성에선 최소 설정만
-            cfg = BrowserConfig(headless=False)
-        return Browser(config=cfg)
-    # 폴백: 내부 기본 브라우저 사용
-    return None
-
-# ====== 실행 엔진 ======
-def parse_script(yaml_text: str) -> List[Dict[str, Any]]:
-    """YAML 스크립트 파싱 및 유효성 검사"""
-    try:
-        data = yaml.safe_load(yaml_text) or {}
-        steps = data.get("steps", [])
-        if not isinstance(steps, list) or not steps:
-            raise ValueError("YAML에 steps 리스트가 필요합니다.")
-        
-        for i, s in enumerate(steps):
-            if "type" not in s:
-                raise ValueError(f"{i+1}번째 step에 type 필드가 없습니다.")
-            if s["type"] == "agent" and "task" not in s:
-                raise ValueError(f"{i+1}번째 step(type=agent)에 task가 필요합니다.")
-            if s["type"] not in ["agent", "require_user"]:
-                raise ValueError(f"{i+1}번째 step의 type은 'agent' 또는 'require_user'여야 합니다.")
-        
-        return steps
-    except yaml.YAMLError as e:
-        raise ValueError(f"YAML 파싱 오류: {e}")
-    except Exception as e:
-        raise ValueError(f"스크립트 유효성 검사 오류: {e}")
-
-def run_until_wait(script_text: str, idx: int, log: str, waiting: bool, llm, browser, prompt_text: str = ""):
-    """Start/Resume 실행: '사람 액션 필요' 지점까지 자동 진행 후 멈춤"""
-    if llm is None:
-        llm = make_llm()
-    if browser is None:
-        browser = make_browser()
-
-    try:
-        steps = parse_script(script_text)
-    except Exception as e:
-        return idx, log + f"\n❌ 스크립트 파싱 오류: {e}", True, "", llm, browser
-
-    n = len(steps)
-    msg_to_user = ""
-    waiting_now = False
-    today_kr = datetime.now().strftime("%Y-%m-%d")
-
-    while idx < n:
-        step = steps[idx]
-        stype = step.get("type")
-        sname = step.get("name", f"step_{idx+1}")
-
-        if stype == "agent":
-            task = (step.get("task") or "").replace("{today}", today_kr).replace("{prompt}", prompt_text)
-            
-            # 안전 프리앰블 추가
-            full_task = SAFETY_PREAMBLE + "\n\n" + task
-            
-            try:
-                res = Agent(
-                    task=full_task,
-                    llm=llm,
-                    use_vision=True,
-                    browser=browser,   # None이면 내부 기본 브라우저 사용
-                ).run_sync()
-            except Exception as e:
-                res = f"❌ 실행 오류: {str(e)}"
-
-            # 민감정보 마스킹
-            masked_res = mask_sensitive_info(str(res))
-            log += f"\n\n### ✅ {sname} (agent)\n{masked_res}\n"
-            idx += 1
-
-            # 결과에 특정 문자열이 있으면 사용자 액션 요청 후 멈춤
-            wfi = step.get("wait_for_user_if")  # {"contains": "...", "message": "..."}
-            if isinstance(wfi, dict) and wfi.get("contains"):
-                if str(wfi["contains"]).lower() in str(res).lower():
-                    msg_to_user = wfi.get("message", "사용자 액션이 필요합니다. 완료 후 '다음 스텝 실행'을 누르세요.")
-                    waiting_now = True
-                    break
-
-        elif stype == "require_user":
-            msg_to_user = step.get("message", "이 단계를 사람이 처리하세요. 완료 후 '다음 스텝 실행'을 누르세요.")
-            log += f"\n\n### ⏸ {sname} (require_user)\n- 안내: {msg_to_user}\n"
-            idx += 1
-            waiting_now = True
-            break
-
-        else:
-            log += f"\n\n### ⚠️ {sname}\n알 수 없는 type: {stype} (건너뜀)"
-            idx += 1
-
-    if idx >= n and not waiting_now:
-        log += "\n\n🎉 모든 스텝이 완료되었습니다."
-        
-        # 로그 파일 저장
-        try:
-            log_file = save_log_to_file(log)
-            log += f"\n\n📁 실행 로그가 저장되었습니다: {log_file}"
-        except Exception:
-            pass
-    
-    return idx, log, waiting_now, msg_to_user, llm, browser
-
-def reset_session():
-    """세션 초기화"""
-    return 0, "세션이 초기화되었습니다.", False, "", None, None
-
 # ====== 기본 예시 스크립트 ======
 DEFAULT_SCRIPT = """\
 # YAML 스크립트 예시
-# type: agent | require_user
+# type: agent | require_user | navigate | click | fill | wait_for | extract
 # - agent 스텝의 task가 실행되고, 결과에 특정 키워드가 포함되면 사용자 액션을 유도하고 멈춥니다.
 #   완료 후 '다음 스텝 실행'을 누르면 이후 스텝이 자동 진행됩니다.
+# - depends_on: [스텝이름, ...] 을 지정하면 서로 독립인 연속 agent 스텝을 동시에 실행합니다.
+#   (미지정 시 바로 앞 스텝에 의존 = 순차 실행, 동시 실행 상한은 최상위 max_parallel)
+# - navigate/click/fill/wait_for/extract 는 LLM 없이 브라우저에서 바로 실행됩니다.
 
 steps:
   - name: reach_login
@@ -311,6 +136,16 @@ with gr.Blocks(title="웹 스크립트 런너 Plus (browser-use + Ollama Vision)
                 btn_start = gr.Button("▶ 시작/재개", variant="primary", size="lg")
                 btn_next = gr.Button("➡ 다음 스텝 실행", size="lg")
                 btn_reset = gr.Button("⟲ 세션 초기화", size="lg")
+            
+            # 체크포인트 재개 (새로고침/서버 재시작 후 이어서 실행)
+            with gr.Row():
+                run_dropdown = gr.Dropdown(
+                    label="저장된 실행(체크포인트)",
+                    choices=list_checkpoints(),
+                    interactive=True
+                )
+                btn_resume = gr.Button("⏯ 체크포인트에서 재개", size="sm")
+                btn_refresh_runs = gr.Button("🔄", size="sm")
         
         # 우측: 프롬프트 관리 및 로그
         with gr.Column(scale=1):
@@ -346,34 +181,70 @@ with gr.Blocks(title="웹 스크립트 런너 Plus (browser-use + Ollama Vision)
             
             gr.Markdown("### 📋 실행 로그")
             log_md = gr.Markdown("실행 로그가 여기에 표시됩니다.")
+            
+            with gr.Row():
+                log_page = gr.Number(label="로그 페이지", value=1, precision=0, minimum=1)
+                btn_log_page = gr.Button("📄 페이지 보기", size="sm")
+                btn_log_tail = gr.Button("⏬ 최근 로그", size="sm")
 
     # 상태 (세션별 유지)
     s_idx = gr.State(0)
-    s_log = gr.State("세션이 시작되었습니다.")
+    s_log = gr.State(None)  # RunLog (첫 실행 시 생성)
     s_waiting = gr.State(False)
     s_msg = gr.State("")
     s_llm = gr.State(None)
-    s_browser = gr.State(None)
-    s_session_id = gr.State(datetime.now().strftime("%Y%m%d_%H%M%S"))
+    s_browser = gr.State(None, delete_callback=release_browser)  # 탭 종료 시 브라우저 대여 반납
 
     # ====== 이벤트 핸들러 ======
-    def on_start(script_text, idx, log, waiting, llm, browser, prompt_text):
-        idx, log, waiting, msg, llm, browser = run_until_wait(
-            script_text, idx, log, waiting, llm, browser, prompt_text
-        )
-        status = ("⏸ 사용자 액션 필요: " + msg) if waiting else "✅ 자동 진행 완료 / 다음 스텝 준비됨"
-        return idx, log, waiting, msg, llm, browser, status, log
-
-    def on_next(script_text, idx, log, waiting, llm, browser, msg, prompt_text):
-        idx, log, waiting, msg, llm, browser = run_until_wait(
-            script_text, idx, log, False, llm, browser, prompt_text
-        )
-        status = ("⏸ 사용자 액션 필요: " + msg) if waiting else "✅ 자동 진행 완료 / 다음 스텝 준비됨"
-        return idx, log, waiting, msg, llm, browser, status, log
-
-    def on_reset():
-        i, l, w, m, llm, br = reset_session()
-        return i, l, w, m, llm, br, "세션이 초기화되었습니다.", l, datetime.now().strftime("%Y%m%d_%H%M%S")
+    # 핸들러는 실행 엔진의 스트림을 소비하는 async 제너레이터 → 스텝/액션마다 Gradio 큐로 상태 전송
+    async def _stream_run(script_text, idx, log, waiting, llm, browser, prompt_text, label):
+        if log is None:
+            log = RunLog()
+        yield gr.skip(), log, gr.skip(), gr.skip(), gr.skip(), gr.skip(), f"{label} (실행 ID: `{log.session_id}`)", gr.skip()
+        last_seq = log.seq
+        async for idx, log, waiting, msg, llm, browser, status in get_engine().stream(
+            iter_until_wait, script_text, idx, log, waiting, llm, browser, prompt_text
+        ):
+            # 새 레코드가 있을 때만 최근 로그(tail)를 렌더링해 전송, 액션 단위 갱신은 상태 문구만
+            log_out = gr.skip() if log.seq == last_seq else log.render_tail()
+            last_seq = log.seq
+            yield idx, log, waiting, msg, llm, browser, status, log_out
+
+    async def on_start(script_text, idx, log, waiting, llm, browser, prompt_text):
+        async for update in _stream_run(script_text, idx, log, waiting, llm, browser, prompt_text, "▶ 실행을 시작합니다..."):
+            yield update
+
+    async def on_next(script_text, idx, log, waiting, llm, browser, msg, prompt_text):
+        async for update in _stream_run(script_text, idx, log, False, llm, browser, prompt_text, "▶ 다음 스텝을 실행합니다..."):
+            yield update
+
+    def on_resume(run_id, current_browser):
+        if not run_id:
+            return (gr.skip(),) * 8 + ("❌ 재개할 실행 ID를 선택하세요.", gr.skip())
+        try:
+            script_text, prompt_text, idx, log, waiting, msg, llm, browser = resume_session(run_id)
+        except Exception as e:
+            return (gr.skip(),) * 8 + (f"❌ 재개 실패: {e}", gr.skip())
+        release_browser(current_browser)
+        status = ("⏸ 사용자 액션 필요: " + msg) if waiting else f"⏯ `{run_id}` 재개 준비됨 — '다음 스텝 실행'을 누르세요."
+        return script_text, prompt_text, idx, log, waiting, msg, llm, browser, status, log.render_tail()
+
+    def on_refresh_runs():
+        return gr.update(choices=list_checkpoints())
+
+    def on_reset(browser):
+        i, l, w, m, llm, br = reset_session(browser)
+        return i, l, w, m, llm, br, "세션이 초기화되었습니다.", "세션이 초기화되었습니다."
+
+    def on_log_page(log, page):
+        if log is None:
+            return "실행 로그가 없습니다."
+        return log.render_page(int(page or 1))
+
+    def on_log_tail(log):
+        if log is None:
+            return "실행 로그가 없습니다."
+        return log.render_tail()
 
     def on_save_prompt(name, content):
         if not name or not content:
@@ -414,8 +285,32 @@ with gr.Blocks(title="웹 스크립트 런너 Plus (browser-use + Ollama Vision)
 
     btn_reset.click(
         fn=on_reset,
+        inputs=[s_browser],
+        outputs=[s_idx, s_log, s_waiting, s_msg, s_llm, s_browser, status_md, log_md],
+    )
+
+    btn_resume.click(
+        fn=on_resume,
+        inputs=[run_dropdown, s_browser],
+        outputs=[script_box, prompt_input, s_idx, s_log, s_waiting, s_msg, s_llm, s_browser, status_md, log_md],
+    )
+
+    btn_refresh_runs.click(
+        fn=on_refresh_runs,
         inputs=[],
-        outputs=[s_idx, s_log, s_waiting, s_msg, s_llm, s_browser, status_md, log_md, s_session_id],
+        outputs=[run_dropdown],
+    )
+
+    btn_log_page.click(
+        fn=on_log_page,
+        inputs=[s_log, log_page],
+        outputs=[log_md],
+    )
+
+    btn_log_tail.click(
+        fn=on_log_tail,
+        inputs=[s_log],
+        outputs=[log_md],
     )
 
     btn_save_prompt.click(
@@ -444,5 +339,13 @@ with gr.Blocks(title="웹 스크립트 런너 Plus (browser-use + Ollama Vision)
     )
 
 if __name__ == "__main__":
+    # 첫 실행의 모델 로딩 지연을 없애기 위해 백그라운드에서 미리 로드
+    start_warmup()
+    # 첫 세션이 브라우저 기동을 기다리지 않도록 풀 브라우저 예열
+    warm_browsers()
+    # Prometheus 스크레이프용 /metrics (기본 http://127.0.0.1:9464/metrics, METRICS_PORT=0 이면 끔)
+    start_metrics_server()
+    # 스트리밍 핸들러는 큐를 통해 전송됨. 핸들러가 실행 엔진을 await 하므로 동시 처리 수 제한 없음
+    demo.queue(default_concurrency_limit=None)
     # http://127.0.0.1:7860 에서 열림
     demo.launch()